@@ -24,6 +24,8 @@ class Agent(ABC):
 All agent should inherit from this class
 '''
 
+  vectorised_training = False  # Whether _train accepts a VectorEnvironment
+
   # region Private
 
   def __init__(self, config=None, environment=None, use_cuda=False, verbose=False, *args, **kwargs):
@@ -38,6 +40,8 @@ All agent should inherit from this class
         'cuda:0' if torch.cuda.is_available() and self._use_cuda else 'cpu'
         )
     self._environment = environment
+    self._inference_input_buffer = None
+    self._prefetch_depth = 0  # Replay batches sampled ahead on a background thread, 0 samples in update
 
     self._verbose = verbose
 
@@ -123,6 +127,12 @@ All agent should inherit from this class
   def stop_training(self) -> None:
     self._end_training = True
 
+  def close(self) -> None:
+    '''Releases what the agent holds beyond the process, eg. flushes a disk backed replay memory.'''
+    memory = getattr(self, '_memory', None)
+    if hasattr(memory, 'close'):
+      memory.close()
+
   def build(self, env, device, **kwargs) -> None:
     self._environment = env
     self._infer_input_output_sizes(env)
@@ -160,6 +170,91 @@ All agent should inherit from this class
     else:
       raise HasNoEnvError
 
+  def _inference_input(self, state) -> torch.Tensor:
+    '''
+Copies a single state into a preallocated batch of one on the model device, instead of building a new
+tensor from a list on every action. Call it inside the `torch.inference_mode()` block using the batch.
+
+:param state: A single state
+:return: The [1, *state_shape] input batch
+'''
+    state = torch.as_tensor(state)
+    buffer = self._inference_input_buffer
+    if buffer is None or buffer.shape[1:] != state.shape:
+      buffer = torch.empty((1, *state.shape), dtype=self._state_type, device=self._device)
+      self._inference_input_buffer = buffer
+    buffer[0].copy_(state)
+    return buffer
+
+  @staticmethod
+  def _flatten_parameters(*models) -> None:
+    '''
+Lays out the parameters of every `Architecture` among `models` in one flat buffer, so target updates and
+gradient clamping run as single tensor operations, see `Architecture.flatten_parameters`. Call it after
+the models have been moved to their device.
+'''
+    for model in models:
+      if isinstance(model, U.Architecture):
+        model.flatten_parameters()
+
+  def _prefetch_replay_batches(self) -> None:
+    '''
+Wraps the replay memory in a `PrefetchingSampler` of `_prefetch_depth` batches of `_batch_size`, unless
+the depth is 0. Prioritised memories are left as they are, prefetched batches can not carry their
+indices and importance weights.
+'''
+    memory = getattr(self, '_memory', None)
+    if not self._prefetch_depth or memory is None or isinstance(memory, U.PrefetchingSampler):
+      return
+    if getattr(memory, 'samples_weights', False):
+      warn(f'Batches of the prioritised {type(memory).__name__} are not prefetched')
+      return
+
+    device = torch.device(self._device)
+    self._memory = U.PrefetchingSampler(memory,
+                                        self._batch_size,
+                                        depth=self._prefetch_depth,
+                                        device=device,
+                                        pin_memory=device.type == 'cuda')
+
+  def _reset_environment(self, environment):
+    '''
+Resets the environment of a new episode, through the replay memory when it records episodes by their seed,
+eg. `TrajectoryStore`.
+'''
+    reset_episode = getattr(getattr(self, '_memory', None), 'reset_episode', None)
+    if reset_episode is not None:
+      return reset_episode(environment)
+    return environment.reset()
+
+  def _remember_vector_step(self, states, actions, signals, successor_states, terminated, infos) -> None:
+    '''
+Adds the transitions of one step of a `VectorEnvironment` to the replay memory. The pool has reset the
+environments that terminated, their successors are the last observations kept in their infos, and like in
+`rollout` episodes cut off by a time limit bootstrap from them. Memories keeping state per environment,
+eg. `NStepTransitionBuffer`, are told which environment each transition is from.
+'''
+    memory = self._memory.memory if isinstance(self._memory, U.PrefetchingSampler) else self._memory
+    if isinstance(memory, U.FrameTransitionBuffer):
+      raise ValueError('FrameTransitionBuffer deduplicates the frames of a single environment')
+    per_environment = isinstance(memory, U.NStepTransitionBuffer)
+
+    for i, info in enumerate(infos):
+      environment = {'env_id':i} if per_environment else {}
+      successor_state, truncated = successor_states[i], False
+      if terminated[i]:
+        truncated = bool(info.get('TimeLimit.truncated', False))
+        successor_state = info['terminal_observation'] if truncated else None
+
+      self._memory.add_transition(states[i],
+                                  actions[i],
+                                  signals[i],
+                                  successor_state,
+                                  not terminated[i] or truncated,
+                                  **environment)
+      if truncated and hasattr(self._memory, 'end_episode'):
+        self._memory.end_episode(successor_state, **environment)
+
   def _infer_input_output_sizes(self, env, *args, **kwargs) -> None:
     '''
 Tries to infer input and output size from env if either _input_size or _output_size, is None or -1 (int)
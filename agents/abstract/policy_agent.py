@@ -89,8 +89,10 @@ All policy iteration agents should inherit from this class
 
     self._policy_arch_params = U.ConciseArchSpecification(**di)
 
-  def _train(self, *args, **kwargs):
-    return self.train_episodically(*args, **kwargs)
+  def _train(self, environment, *args, **kwargs):
+    if isinstance(environment, U.VectorEnvironment):
+      return self.train_step_batched(environment, *args, **kwargs)
+    return self.train_episodically(environment, *args, **kwargs)
 
   # endregion
 
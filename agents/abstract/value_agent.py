@@ -7,7 +7,6 @@ from tqdm import tqdm
 
 __author__ = 'cnheider'
 
-import math
 import random
 
 import numpy as np
@@ -51,6 +50,24 @@ All value iteration agents should inherit from this class
       print('Sampling from random process')
     return self.sample_random_process()
 
+  def sample_actions(self, states, **kwargs):
+    '''
+Batched `sample_action` for N parallel environments, one row of `states` per environment. Exploration is
+decided for every environment on its own and the exploiting rows share one forward pass of the model.
+'''
+    states = np.asarray(states)
+    steps_taken = self._step_i + np.arange(1, len(states) + 1)
+    self._step_i += len(states)
+
+    exploit = (np.random.random_sample(len(states)) > self.epsilon_threshold(steps_taken)) \
+              & (steps_taken > self._initial_observation_period)
+
+    actions = np.empty(len(states), dtype=np.int64)
+    actions[~exploit] = np.random.randint(self._output_size[0], size=len(states) - int(exploit.sum()))
+    if exploit.any():
+      actions[exploit] = self._sample_model_batch(states[exploit])
+    return actions
+
   def sample_random_process(self):
     sample = np.random.choice(self._output_size[0])
     return sample
@@ -60,22 +77,29 @@ All value iteration agents should inherit from this class
 :param steps_taken:
 :return:
 '''
-    assert 0 <= self._eps_end <= self._eps_start
-
     if steps_taken == 0:
       return False
 
     sample = random.random()
-
-    a = self._eps_start - self._eps_end
-
-    b = math.exp(-1. * steps_taken / (self._eps_decay + self._divide_by_zero_safety))
-    eps_threshold = self._eps_end + a * b
+    eps_threshold = self.epsilon_threshold(steps_taken)
 
     if self._verbose:
-      print(f'{sample} > {eps_threshold} = {sample > eps_threshold}, where a ={a} and b={b}')
+      print(f'{sample} > {eps_threshold} = {sample > eps_threshold}')
     return sample > eps_threshold
 
+  def epsilon_threshold(self, steps_taken):
+    '''
+Probability of acting randomly after `steps_taken` steps, decaying exponentially from `_eps_start` to
+`_eps_end`.
+
+:param steps_taken: Number of steps, or an array of them
+'''
+    assert 0 <= self._eps_end <= self._eps_start
+
+    a = self._eps_start - self._eps_end
+    b = np.exp(-1. * np.asarray(steps_taken) / (self._eps_decay + self._divide_by_zero_safety))
+    return self._eps_end + a * b
+
   def save(self, C):
     U.save_model(self._value_model, C)
 
@@ -121,7 +145,7 @@ All value iteration agents should inherit from this class
     E = tqdm(E, leave=False)
 
     for episode_i in E:
-      initial_state = _environment.reset()
+      initial_state = self._reset_environment(_environment)
 
       if episode_i % stat_frequency == 0:
         U.styled_term_plot_stats_shared_x(stats, printer=E.write)
@@ -154,11 +178,16 @@ All value iteration agents should inherit from this class
   def _sample_model(self, state, *args, **kwargs) -> Any:
     raise NotImplementedError
 
+  def _sample_model_batch(self, states, *args, **kwargs) -> Any:
+    raise NotImplementedError
+
   # endregion
 
   # region Protected
 
-  def _train(self, *args, **kwargs):
-    return self.train_episodically(*args, **kwargs)
+  def _train(self, environment, *args, **kwargs):
+    if isinstance(environment, U.VectorEnvironment):
+      return self.train_step_batched(environment, *args, **kwargs)
+    return self.train_episodically(environment, *args, **kwargs)
 
   # endregion
@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 
 __author__ = 'cnheider'
+import copy
 from itertools import count
 
 import numpy as np
@@ -37,6 +38,8 @@ Parameters
         The update rate that target networks slowly track the learned networks.
 '''
 
+  vectorised_training = True
+
   def save(self, C):
     U.save_model(self._actor, C, 'actor')
     U.save_model(self._critic, C, 'policy')
@@ -66,6 +69,10 @@ Parameters
   def sample_action(self, state, **kwargs):
     return self._sample_model(state)
 
+  def sample_actions(self, states, **kwargs):
+    '''Batched `sample_action` for N parallel environments, one forward pass of the actor for all rows.'''
+    return self._sample_model_batch(states)
+
   def evaluate(
       self,
       state_batch,
@@ -108,40 +115,71 @@ Parameters
 
     return td_error, states
 
-  def update(self):
+  def update(self, num_steps=1):
     '''
-Update the target networks
+Takes `num_steps` gradient steps of the critic and actor, each followed by an update of the target
+networks. The batches of all steps are sampled at once and moved to the device as one tensor per field,
+so only the forward and backward passes run per step.
+
+Memories such as `TransitionBuffer` sample without replacement, so at most `len(memory) // _batch_size`
+steps are taken.
 
-:return:
-:rtype:
+:param num_steps: Number of gradient steps, each on its own batch of `_batch_size` transitions
+:type num_steps: int
+:return: The td error and actor loss of the last step
+:rtype: tuple
 '''
-    if len(self._memory) < self._batch_size:
+    num_steps = min(num_steps, len(self._memory) // self._batch_size)
+    if num_steps < 1:
       return
 
-    batch = self._memory.sample_transitions(self._batch_size)
-    td_error, state_batch_var = self.evaluate(*batch)
-    loss = self._optimise_wrt(td_error, state_batch_var)
+    types = (self._state_type, self._action_type, self._value_type, self._state_type, torch.float)
+    if isinstance(self._memory, U.PrefetchingSampler):  # Dequeue one ready tensor batch per step
+      batches = [self._memory.sample_transitions(self._batch_size) for _ in range(num_steps)]
+    else:
+      batch = self._memory.sample_transitions(num_steps * self._batch_size)
+      batch = [U.to_tensor(_as_columns(values), device=self._device, dtype=dtype)
+               for values, dtype in zip(batch, types)]
+      batches = [[values[step * self._batch_size:(step + 1) * self._batch_size] for values in batch]
+                 for step in range(num_steps)]
+
+    td_error, loss = None, None
+    for batch in batches:
+      batch = [U.to_tensor(values, device=self._device, dtype=dtype) for values, dtype in zip(batch, types)]
+      td_error, state_batch_var = self.evaluate(*batch)
+      loss = self._optimise_wrt(td_error, state_batch_var)
 
     return td_error, loss
 
+  def _scheduled_gradient_steps(self):
+    '''
+Number of gradient steps owed at the current step, `_update_to_data_ratio` steps per environment step
+taken every `_learning_frequency` steps once the `_initial_observation_period` is over. Fractions of a
+step, and steps the memory can not yet supply distinct batches for, are carried over to later calls. No
+credit is accrued before the memory holds a first full batch.
+'''
+    if self._step_i <= self._initial_observation_period or self._step_i % self._learning_frequency:
+      return 0
+    if len(self._memory) < self._batch_size:
+      return 0
+
+    self._gradient_step_credit += self._update_to_data_ratio * self._learning_frequency
+    num_steps = min(int(self._gradient_step_credit), len(self._memory) // self._batch_size)
+    self._gradient_step_credit -= num_steps
+    return num_steps
+
   def optimise_critic_wrt(self, error):
-    self._critic_optimiser.zero_grad()
+    self._critic.zero_grad()
     error.backward()
     self._critic_optimiser.step()  # Optimize the critic
 
   def optimise_actor_wrt(self, loss):
-    self._actor_optimiser.zero_grad()
+    self._actor.zero_grad()
     loss.backward()
     self._actor_optimiser.step()  # Optimize the actor
 
   def update_target(self, target_model, model):
-    for target_param, param in zip(target_model.parameters(), model.parameters()):
-      target_param.data.copy_(
-          self._target_update_tau
-          * param.data
-          + (1 - self._target_update_tau)
-          * target_param.data
-          )
+    U.soft_update(target_model, model, self._target_update_tau)
 
   def rollout(self, initial_state, environment, render=False, train=True, **kwargs):
     self._rollout_i += 1
@@ -180,7 +218,8 @@ Update the target networks
           )
       state = next_state
 
-      self.update()
+      if train:
+        self.update(self._scheduled_gradient_steps())
       episode_signal += signal
 
       if terminated:
@@ -189,6 +228,86 @@ Update the target networks
 
     return episode_signal, episode_length
 
+  def vector_rollout(self, initial_states, environment, n=100, render=False, train=True, **kwargs):
+    '''
+`rollout` for a `VectorEnvironment`, `n` steps of all of its environments acting for them with one forward
+pass of the actor per step. Every environment explores with its own copy of the random process, reset
+when its episode ends, and gradient steps are owed per environment step as in `rollout`.
+
+:return: The states to continue from and the signal accumulated over the steps
+'''
+    states = initial_states
+    accumulated_signal = 0
+
+    if len(self._random_processes) != len(states):
+      self._random_processes = [copy.deepcopy(self._random_process) for _ in range(len(states))]
+      for random_process in self._random_processes:
+        random_process.reset()
+
+    T = tqdm(range(1, n + 1), f'Step #{self._step_i}', leave=False)
+    for t in T:
+      actions = self.sample_actions(states)
+      actions += np.stack([random_process.sample() for random_process in self._random_processes])
+
+      if self._action_clipping:
+        actions = np.clip(actions, -1.0, 1.0)
+
+      next_states, signals, terminated, infos = environment.step(actions)
+
+      if render:
+        environment.render()
+
+      if self._signal_clipping:
+        signals = np.clip(signals, -1.0, 1.0)
+
+      for i in np.flatnonzero(terminated):
+        self._random_processes[i].reset()
+
+      if train:
+        self._remember_vector_step(states, actions, signals, next_states, terminated, infos)
+
+        num_steps = 0
+        for _ in range(len(states)):
+          self._step_i += 1
+          num_steps += self._scheduled_gradient_steps()
+        self.update(num_steps)
+      else:
+        self._step_i += len(states)
+
+      accumulated_signal += signals.sum()
+      states = next_states
+
+    return states, accumulated_signal
+
+  def train_step_batched(self,
+                         environment,
+                         num_batches=10000,
+                         render=False,
+                         render_frequency=100,
+                         stat_frequency=10,
+                         batch_length=100,
+                         **kwargs):
+    '''Trains on a `VectorEnvironment` in batches of `batch_length` steps of all of its environments.'''
+    stats = U.StatisticCollection(stats=('signal',))
+
+    states = environment.reset()
+
+    B = tqdm(range(1, num_batches + 1), leave=False)
+    for batch_i in B:
+      if batch_i % stat_frequency == 0:
+        B.set_description(f'Batch {batch_i}, Last signal: {stats.signal[-1]}')
+
+      states, signal = self.vector_rollout(states,
+                                           environment,
+                                           n=batch_length,
+                                           render=render and batch_i % render_frequency == 0)
+      stats.append(signal)
+
+      if self._end_training:
+        break
+
+    return (self._actor, self._critic), stats
+
   def _optimise_wrt(self, td_error, state_batch, *args, **kwargs):
     '''
 
@@ -221,9 +340,10 @@ Update the target networks
 
     self._random_process = OrnsteinUhlenbeckProcess(theta=0.15, sigma=0.2)
     # Adds noise for exploration
+    self._random_processes = []  # Copies of the random process per environment of a VectorEnvironment
 
     # self._memory = U.PrioritisedReplayMemory(config.REPLAY_MEMORY_SIZE)  # Cuda trouble
-    self._memory = U.TransitionBuffer(1000000)
+    self._memory = U.ArrayTransitionBuffer(1000000)
     self._evaluation_function = F.smooth_l1_loss
 
     self._actor_arch = U.ActorArchitecture
@@ -248,6 +368,8 @@ Update the target networks
     self._action_clipping = False
     self._initial_observation_period = 10000
     self._learning_frequency = 4
+    self._update_to_data_ratio = 1.0  # Gradient steps per environment step
+    self._gradient_step_credit = 0.0
     self._sync_target_model_frequency = 10000
     self._state_type = torch.float
     self._value_type = torch.float
@@ -274,6 +396,7 @@ Update the target networks
     self._output_size = None
 
   def _build(self, **kwargs) -> None:
+    self._prefetch_replay_batches()
 
     self._actor_arch_parameters['input_size'] = self._input_size
     self._actor_arch_parameters['output_size'] = self._output_size
@@ -289,6 +412,7 @@ Update the target networks
     target_critic = self._critic_arch(**self._critic_arch_parameters).to(
         self._device
         ).eval()
+    self._flatten_parameters(actor, target_actor, critic, target_critic)
 
     # Construct the optimizers for actor and critic
     actor_optimizer = self._actor_optimiser_spec.constructor(
@@ -302,11 +426,15 @@ Update the target networks
     self._critic_optimiser = actor, target_actor, critic, target_critic, actor_optimizer, critic_optimizer
 
   def _sample_model(self, state, **kwargs):
-    state = U.to_tensor([state], device=self._device, dtype=self._state_type)
+    with torch.inference_mode():
+      action = self._actor(self._inference_input(state))
+      return action[0].to('cpu').numpy()
+
+  def _sample_model_batch(self, states, **kwargs):
+    states = U.to_tensor(states, device=self._device, dtype=self._state_type)
     with torch.no_grad():
-      action = self._actor(state)
-    a = action.to('cpu').numpy()
-    return a[0]
+      action = self._actor(states)
+    return action.to('cpu').numpy()
 
   def _train(
       self, env, rollouts=1000, render=False, render_frequency=10, stat_frequency=10
@@ -325,13 +453,16 @@ The Deep Deterministic Policy Gradient algorithm.
 :param stat_frequency:
 :type stat_frequency:
 '''
+    if isinstance(env, U.VectorEnvironment):
+      return self.train_step_batched(env, rollouts, render, render_frequency, stat_frequency)
+
     stats = U.StatisticCollection(stats=('signal', 'duration'))
 
     E = range(1, rollouts)
     E = tqdm(E, desc='', leave=False)
 
     for episode_i in E:
-      state = env.reset()
+      state = self._reset_environment(env)
       self._random_process.reset()
 
       if episode_i % stat_frequency == 0:
@@ -353,6 +484,12 @@ The Deep Deterministic Policy Gradient algorithm.
     return (self._actor, self._critic), stats
 
 
+def _as_columns(values):
+  if isinstance(values, (np.ndarray, torch.Tensor)):
+    return values
+  return np.asarray(values)  # Row-wise batches, eg. of TransitionBuffer, stacked in one conversion
+
+
 def test_ddpg_agent(config):
   '''
 
@@ -377,6 +514,7 @@ def test_ddpg_agent(config):
         )
   finally:
     listener.stop()
+    agent.close()
 
   U.save_model(actor_model, config, name='actor')
   U.save_model(critic_model, config, name='critic')
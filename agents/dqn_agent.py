@@ -7,6 +7,7 @@ from utilities.visualisation.statistics_plot import plot_durations
 
 __author__ = 'cnheider'
 from itertools import count
+from warnings import warn
 
 import numpy as np
 import torch
@@ -23,11 +24,24 @@ class DQNAgent(ValueAgent):
 
 '''
 
+  vectorised_training = True
+
   # region Protected
 
   def __defaults__(self) -> None:
-    self._memory = U.ReplayBuffer3(10000)
-    # self._memory = U.PrioritisedReplayMemory(config.REPLAY_MEMORY_SIZE)  # Cuda trouble
+    self._replay_memory_size = 10000
+    self._memory = U.ArrayTransitionBuffer(self._replay_memory_size)
+
+    # With a directory the memory is a MemoryMappedTransitionBuffer of _replay_memory_size built in _build
+    self._replay_memory_directory = None
+    self._replay_memory_resume = False
+    self._replay_memory_ram_budget = 0
+    self._replay_memory_flush_interval = None
+
+    # Builds a TensorPrioritisedReplayBuffer of _replay_memory_size unless the memory is already prioritised
+    self._prioritised_replay = False
+    self._prioritised_replay_alpha = 0.6
+    self._prioritised_replay_beta = 0.4
 
     self._use_cuda = False
 
@@ -45,6 +59,7 @@ class DQNAgent(ValueAgent):
     self._batch_size = 128
 
     self._discount_factor = 0.99
+    self._n_steps = 1  # Above 1 builds an NStepTransitionBuffer of _replay_memory_size
     self._learning_frequency = 1
     self._initial_observation_period = 0
     self._sync_target_model_frequency = 1000
@@ -72,6 +87,31 @@ class DQNAgent(ValueAgent):
     self._optimiser_momentum = 0.0
 
   def _build(self, **kwargs) -> None:
+    if self._replay_memory_directory is not None:
+      self._memory = U.MemoryMappedTransitionBuffer(self._replay_memory_size,
+                                                    self._replay_memory_directory,
+                                                    ram_budget=self._replay_memory_ram_budget,
+                                                    resume=self._replay_memory_resume,
+                                                    flush_interval=self._replay_memory_flush_interval)
+
+    if self._n_steps > 1 and not isinstance(self._memory, U.NStepTransitionBuffer):
+      self._memory = U.NStepTransitionBuffer(self._replay_memory_size,
+                                             n_steps=self._n_steps,
+                                             discount_factor=self._discount_factor)
+    memory_discount_factor = getattr(self._memory, 'discount_factor', self._discount_factor)
+    assert memory_discount_factor == self._discount_factor, \
+      f'The memory discounts by {memory_discount_factor}, the agent by {self._discount_factor}'
+
+    if self._prioritised_replay and not getattr(self._memory, 'samples_weights', False):
+      warn(f'Prioritised replay replaces the configured {type(self._memory).__name__} with a '
+           f'TensorPrioritisedReplayBuffer of REPLAY_MEMORY_SIZE {self._replay_memory_size}')
+      self._memory = U.TensorPrioritisedReplayBuffer(self._replay_memory_size,
+                                                     alpha=self._prioritised_replay_alpha,
+                                                     beta=self._prioritised_replay_beta,
+                                                     device=self._device)
+
+    self._prefetch_replay_batches()
+
     self._value_arch_parameters['input_size'] = self._input_size
     self._value_arch_parameters['output_size'] = self._output_size
 
@@ -80,6 +120,7 @@ class DQNAgent(ValueAgent):
       ).to(self._device)
 
     target_value_model = self._value_arch(**self._value_arch_parameters).to(self._device)
+    self._flatten_parameters(value_model, target_value_model)
     target_value_model = U.copy_state(target_value_model, value_model)
     target_value_model.eval()
 
@@ -100,29 +141,35 @@ class DQNAgent(ValueAgent):
 :type error:
 :return:
 '''
-    self._optimiser.zero_grad()
+    self._value_model.zero_grad()
     error.backward()
     if self._clamp_gradient:
-      for params in self._value_model.parameters():
-        params.grad.data.clamp_(-1, 1)
+      U.clamp_gradients(self._value_model, -1, 1)
     self._optimiser.step()
 
   def _sample_model(self, state, **kwargs):
-    model_input = U.to_tensor([state], device=self._device, dtype=self._state_type)
+    with torch.inference_mode():
+      action_value_estimates = self._value_model(self._inference_input(state))
+      max_value_action_idx = action_value_estimates[0].argmax().item()
+    return max_value_action_idx
+
+  def _sample_model_batch(self, states, **kwargs):
+    model_input = U.to_tensor(states, device=self._device, dtype=self._state_type)
 
     with torch.no_grad():
       action_value_estimates = self._value_model(model_input)
-    max_value_action_idx = action_value_estimates.max(1)[1].item()
-    return max_value_action_idx
+    return action_value_estimates.max(1)[1].to('cpu').numpy()
 
   # region Public
 
-  def evaluate(self, batch, *args, **kwargs):
+  def evaluate(self, batch, weights=None, *args, **kwargs):
     '''
 
 :param batch:
 :type batch:
-:return:
+:param weights: Importance sampling weights of a prioritised batch
+:type weights: torch.Tensor
+:return: The loss, and the per sample absolute TD errors when weights are given
 :rtype:
 '''
     states = U.to_tensor(batch.state, dtype=self._state_type, device=self._device) \
@@ -132,50 +179,70 @@ class DQNAgent(ValueAgent):
       .view(-1, 1)
     true_signals = U.to_tensor(batch.signal, dtype=self._value_type, device=self._device).view(-1, 1)
 
-    non_terminal_mask = U.to_tensor(batch.non_terminal, dtype=torch.uint8, device=self._device)
-    nts = [state for (state, non_terminal_mask) in zip(batch.successor_state, batch.non_terminal) if
-           non_terminal_mask]
-    non_terminal_successors = U.to_tensor(nts, dtype=self._state_type, device=self._device) \
-      .view(-1, *self._input_size)
+    non_terminal_mask = U.to_tensor(batch.non_terminal, dtype=torch.bool, device=self._device).view(-1)
+    successors = U.to_tensor(self._stack_successors(batch.successor_state), dtype=self._state_type,
+                             device=self._device).view(-1, *self._input_size)
 
-    if not len(non_terminal_successors) > 0:
-      return 0  # Nothing to be learned, all states are terminal
+    # States and successors share one forward pass of the online model
+    Q = self._value_model(torch.cat([states, successors]))
+    Q_state = Q[:len(states)].gather(1, action_indices)
+    Q_successors = Q[len(states):].detach()
 
-    # Calculate Q of successors
-    with torch.no_grad():
-      Q_successors = self._value_model(non_terminal_successors)
     Q_successors_max_action_indices = Q_successors.max(1)[1].view(-1, 1)
     if self._use_double_dqn:
       with torch.no_grad():
-        Q_successors = self._target_value_model(non_terminal_successors)
-    Q_max_successor = torch.zeros(
-      self._batch_size, dtype=self._value_type, device=self._device
-      )
-    Q_max_successor[non_terminal_mask] = Q_successors.gather(
-      1, Q_successors_max_action_indices
-      ).squeeze()
-
-    # Integrate with the true signal
-    Q_expected = true_signals + (self._discount_factor * Q_max_successor).view(
+        Q_successors = self._target_value_model(successors)
+    Q_max_successor = Q_successors.gather(1, Q_successors_max_action_indices).view(-1)
+    Q_max_successor = torch.where(non_terminal_mask, Q_max_successor, torch.zeros_like(Q_max_successor))
+
+    # Integrate with the true signal, n-step memories carry the discount of their bootstrap state
+    discount = self._discount_factor
+    if hasattr(batch, 'discount'):
+      discount = U.to_tensor(batch.discount, dtype=self._value_type, device=self._device)
+    Q_expected = true_signals + (discount * Q_max_successor).view(
       -1, 1
       )
 
-    # Calculate Q of state
-    Q_state = self._value_model(states).gather(1, action_indices)
+    if weights is None:
+      return self._evaluation_function(Q_state, Q_expected)
+
+    weights = U.to_tensor(weights, dtype=self._value_type, device=self._device)
+    errors = self._evaluation_function(Q_state, Q_expected, reduction='none').view(-1)
+    td_errors = (Q_expected - Q_state).detach().abs().view(-1)
+    return (weights * errors).mean(), td_errors
 
-    return self._evaluation_function(Q_state, Q_expected)
+  def _stack_successors(self, successor_states):
+    '''
+Stacks the successor states of a batch, terminal successors stored as None become zero-filled
+placeholders that the non terminal mask cancels. Columnar batches are already stacked this way.
+'''
+    if isinstance(successor_states, (np.ndarray, torch.Tensor)):
+      return successor_states
+
+    placeholder = np.zeros(self._input_size, dtype=np.float32)
+    return np.stack([placeholder if state is None else np.asarray(state, dtype=np.float32)
+                     for state in successor_states])
 
   def update(self):
     error = 0
     if self._batch_size < len(self._memory):
-      # indices, transitions = self._memory.sample_transitions(self.C.BATCH_SIZE)
-      transitions = self._memory.sample_transitions(self._batch_size)
+      if getattr(self._memory, 'samples_weights', False):
+        indices, transitions, weights = self._memory.sample_transitions(self._batch_size)
+        td_error, td_errors = self.evaluate(transitions, weights=weights)
+        self._memory.batch_update(indices, td_errors)
+      elif getattr(self._memory, 'evicts_by_priority', False):
+        # Uniform sampling, but the eviction policy keeps the transitions with the largest TD errors
+        indices = self._memory.sample_indices(self._batch_size)
+        transitions = self._memory.get_transitions(indices)
+        td_error, td_errors = self.evaluate(transitions, weights=np.ones(len(indices), dtype=np.float32))
+        self._memory.update_priorities(indices, td_errors)
+      else:
+        transitions = self._memory.sample_transitions(self._batch_size)
+        td_error = self.evaluate(transitions)
 
-      td_error = self.evaluate(transitions)
       self._optimise_wrt(td_error)
 
       error = td_error.item()
-      # self._memory.batch_update(indices, errors.tolist())  # Cuda trouble
 
     return error
 
@@ -202,13 +269,18 @@ class DQNAgent(ValueAgent):
       if self._signal_clipping:
         signal = np.clip(signal, -1.0, 1.0)
 
+      # Episodes cut off by a time limit did not terminate, they bootstrap from their last state
+      truncated = terminated and isinstance(info, dict) and info.get('TimeLimit.truncated', False)
+
       successor_state = None
-      if not terminated:  # If environment terminated then there is no successor state
+      if not terminated or truncated:  # If environment terminated then there is no successor state
         successor_state = next_state
 
       self._memory.add_transition(
-        state, action, signal, successor_state, not terminated
+        state, action, signal, successor_state, not terminated or truncated
         )
+      if truncated and hasattr(self._memory, 'end_episode'):
+        self._memory.end_episode(successor_state)
 
       td_error = 0
 
@@ -241,6 +313,76 @@ class DQNAgent(ValueAgent):
 
     return episode_signal, episode_length, episode_td_error
 
+  def vector_rollout(self, initial_states, environment, n=100, render=False, train=True, **kwargs):
+    '''
+`rollout` for a `VectorEnvironment`, `n` steps of all of its environments acting for them with one forward
+pass per step. Updates and target syncs are due as often per environment step as in `rollout`.
+
+:return: The states to continue from, and the signal and TD error accumulated over the steps
+'''
+    states = initial_states
+    accumulated_signal = 0
+    accumulated_td_error = 0
+
+    T = tqdm(range(1, n + 1), f'Step #{self._step_i}', leave=False)
+    for t in T:
+      steps_taken = self._step_i
+      actions = self.sample_actions(states)
+      next_states, signals, terminated, infos = environment.step(actions)
+
+      if render:
+        environment.render()
+
+      if self._signal_clipping:
+        signals = np.clip(signals, -1.0, 1.0)
+
+      if train:
+        self._remember_vector_step(states, actions, signals, next_states, terminated, infos)
+
+        if len(self._memory) >= self._batch_size and self._step_i > self._initial_observation_period:
+          for _ in range(self._step_i // self._learning_frequency - steps_taken // self._learning_frequency):
+            accumulated_td_error += self.update()
+
+        if self._use_double_dqn and (self._step_i // self._sync_target_model_frequency
+                                     > steps_taken // self._sync_target_model_frequency):
+          self._target_value_model = U.copy_state(self._target_value_model, self._value_model)
+
+      accumulated_signal += signals.sum()
+      states = next_states
+
+    return states, accumulated_signal, accumulated_td_error
+
+  def train_step_batched(self,
+                         environment,
+                         num_batches=10000,
+                         render=False,
+                         render_frequency=100,
+                         stat_frequency=10,
+                         batch_length=100,
+                         **kwargs):
+    '''Trains on a `VectorEnvironment` in batches of `batch_length` steps of all of its environments.'''
+    stats = U.StatisticCollection(stats=('signal', 'td_error'))
+
+    states = environment.reset()
+
+    B = tqdm(range(1, num_batches + 1), leave=False)
+    for batch_i in B:
+      if batch_i % stat_frequency == 0:
+        B.set_description(f'Batch {batch_i}, '
+                          f'Running Signal: {stats.signal.running_value[-1]}, '
+                          f'TD Error: {stats.td_error.running_value[-1]}')
+
+      states, signal, td_error = self.vector_rollout(states,
+                                                     environment,
+                                                     n=batch_length,
+                                                     render=render and batch_i % render_frequency == 0)
+      stats.append(signal, td_error)
+
+      if self._end_training:
+        break
+
+    return self._value_model, stats
+
   def infer(self, state, **kwargs):
     model_input = U.to_tensor([state], device=self._device, dtype=self._state_type)
     with torch.no_grad():
@@ -4,10 +4,10 @@ from itertools import count
 
 __author__ = 'cnheider'
 
+import numpy as np
 import torch
 import torch.nn.functional as F
 from torch import nn
-from torch.distributions import Categorical
 from tqdm import tqdm
 
 import utilities as U
@@ -18,6 +18,8 @@ class PPOAgent(JointACAgent):
   '''
 '''
 
+  vectorised_training = True
+
   # region Private
 
   def __defaults__(self) -> None:
@@ -27,12 +29,14 @@ class PPOAgent(JointACAgent):
     self._gae_tau = 0.95
     self._reached_horizon_penalty = -10.
 
-    self._experience_buffer = U.ExpandableCircularBuffer()
+    self._rollout_storage = None
     self._critic_loss = nn.MSELoss
     self._actor_critic_lr = 3e-4
     self._entropy_reg_coef = 0.1
     self._value_reg_coef = 1.
     self._batch_size = 2048
+    self._mini_batch_size = 64
+    self._ppo_epochs = 4
     self._initial_observation_period = 0
     self._target_update_tau = 1.0
     self._update_target_interval = 1000
@@ -90,6 +94,10 @@ class PPOAgent(JointACAgent):
     self._actor_critic, self._actor_critic_target, self._optimiser = (
       actor_critic, actor_critic_target, optimiser)
 
+    self._rollout_storage = U.RolloutStorage(self._steps,
+                                             num_envs=getattr(self._environment, 'num_envs', 1),
+                                             device=self._device)
+
   def _optimise_wrt(self, cost, **kwargs):
     self._optimiser.zero_grad()
     cost.backward()
@@ -114,33 +122,49 @@ continuous
 :rtype:
 '''
 
-    model_input = U.to_tensor([state], device=self._device, dtype=self._state_type)
+    with torch.inference_mode():
+      model_input = self._inference_input(state)
 
-    if continuous:
-      with torch.no_grad():
+      if continuous:
         action_mean, action_log_std, value_estimate = self._actor_critic(model_input)
 
         action_log_std = action_log_std.expand_as(action_mean)
-        action_std = torch.exp(action_log_std)
-        action = torch.normal(action_mean, action_std)
+        action = torch.normal(action_mean, torch.exp(action_log_std))
+        return action[0].to('cpu').numpy(), value_estimate, action_log_std
+
+      action_logits, value_estimate = self._actor_critic(model_input)
+      action = U.gumbel_max_sample(action_logits)
+      log_prob = action_logits.log_softmax(-1).gather(1, action[:, None])[:, 0]
+      return action.item(), value_estimate, log_prob
+
+  def _sample_model_batch(self, states, continuous=True, **kwargs):
+    '''
+Batched `_sample_model`, one row of `states` per environment.
 
-        a = action.to('cpu').numpy()[0]
-      return a, value_estimate, action_log_std
-    else:
+:return: actions [N, ...], value estimates [N, 1] and log stds or log probabilities of the actions
+'''
+    with torch.inference_mode():
+      model_input = U.to_tensor(states, device=self._device, dtype=self._state_type)
+
+      if continuous:
+        action_mean, action_log_std, value_estimate = self._actor_critic(model_input)
 
-      softmax_probs, value_estimate = self._actor_critic(model_input)
-      # action = torch.multinomial(softmax_probs)
-      m = Categorical(softmax_probs)
-      action = m.sample()
-      a = action.to('cpu').data.numpy()[0]
-      return a, value_estimate, m.log_prob(action)
+        action_log_std = action_log_std.expand_as(action_mean)
+        action = torch.normal(action_mean, torch.exp(action_log_std))
+        return action.to('cpu').numpy(), value_estimate, action_log_std
+
+      action_logits, value_estimate = self._actor_critic(model_input)
+      action = U.gumbel_max_sample(action_logits)
+      log_prob = action_logits.log_softmax(-1).gather(1, action[:, None])[:, 0]
+      return action.to('cpu').numpy(), value_estimate, log_prob
 
-  def _train(self, *args, **kwargs):
+  def _train(self, env, *args, **kwargs):
 
     # num_updates = int(args.num_frames) // args.num_steps // args.num_processes
 
-    return self.train_episodic(*args, **kwargs)
-    # return self.train_step_batched(*args, **kwargs)
+    if isinstance(env, U.VectorEnvironment):
+      return self.train_step_batched(env, *args, **kwargs)
+    return self.train_episodically(env, *args, **kwargs)
 
   # endregion
 
@@ -156,7 +180,7 @@ continuous
 
     accumulated_signal = 0
 
-    transitions = []
+    successor_state = None
     terminated = False
     T = tqdm(range(1, n + 1), f'Step #{self._step_i} - {0}/{n}', leave=False)
     for t in T:
@@ -173,17 +197,7 @@ continuous
       if not terminated:  # If environment terminated then there is no successor state
         successor_state = next_state
 
-      transitions.append(
-          U.ValuedTransition(
-              state,
-              action,
-              action_prob,
-              value_estimates,
-              signal,
-              successor_state,
-              not terminated,
-              )
-          )
+      self._rollout_storage.insert([state], [action], action_prob, value_estimates, signal, not terminated)
 
       state = next_state
 
@@ -193,7 +207,44 @@ continuous
         state = environment.reset()
         self._rollout_i += 1
 
-    return transitions, accumulated_signal, terminated, state
+    return successor_state, accumulated_signal, terminated, state
+
+  def take_n_vector_steps(self,
+                          initial_states,
+                          environment,
+                          n=100,
+                          render=False,
+                          render_frequency=100):
+    '''
+`take_n_steps` for a `VectorEnvironment`, acting for all of its environments with one forward pass per
+step. The pool resets terminated environments itself, so the returned states are both the states to
+continue from and the successors to bootstrap from, the done masks cancel the bootstrap where an
+environment terminated.
+'''
+    states = initial_states
+
+    accumulated_signal = np.zeros(environment.num_envs)
+
+    terminated = np.zeros(environment.num_envs, dtype=np.bool_)
+    T = tqdm(range(1, n + 1), f'Step #{self._step_i} - {0}/{n}', leave=False)
+    for t in T:
+      self._step_i += environment.num_envs
+      actions, value_estimates, action_probs = self.sample_actions(states)
+
+      next_states, signals, terminated, _ = environment.step(actions)
+
+      if render and self._rollout_i % render_frequency == 0:
+        environment.render()
+
+      self._rollout_storage.insert(states, actions, action_probs, value_estimates, signals, ~terminated)
+
+      states = next_states
+
+      accumulated_signal += signals
+
+      self._rollout_i += int(terminated.sum())
+
+    return states, accumulated_signal, terminated, states
 
   def rollout(self,
               initial_state,
@@ -206,7 +257,7 @@ continuous
     episode_signal = 0
     terminated = False
     episode_length = 0
-    transitions = []
+    successor_state = None
 
     T = tqdm(count(1), f'Rollout #{self._rollout_i}', leave=False)
     for t in T:
@@ -223,17 +274,8 @@ continuous
       if not terminated:  # If environment terminated then there is no successor state
         successor_state = next_state
 
-      transitions.append(
-          U.ValuedTransition(
-              state,
-              action,
-              action_prob,
-              value_estimates,
-              signal,
-              successor_state,
-              not terminated,
-              )
-          )
+      if train:
+        self._rollout_storage.insert([state], [action], action_prob, value_estimates, signal, not terminated)
       state = next_state
 
       episode_signal += signal
@@ -242,34 +284,28 @@ continuous
         episode_length = t
         break
 
-    return transitions, episode_signal, terminated, state, episode_length
+    return successor_state, episode_signal, terminated, state, episode_length
 
-  def trace_back_steps(self, transitions):
-    n_step_summary = U.ValuedTransition(*zip(*transitions))
-
-    advantages = U.generalised_advantage_estimate(n_step_summary, self._discount_factor, tau=self._gae_tau)
-
-    value_estimates = U.to_tensor(n_step_summary.value_estimate, device=self._device, dtype=torch.float)
-
-    discounted_returns = value_estimates + advantages
+  def trace_back_steps(self, successor_state):
+    '''
+Computes the advantages and returns of the rollout in the rollout storage.
 
-    i = 0
-    advantage_memories = []
-    for step in zip(*n_step_summary):
-      step = U.ValuedTransition(*step)
-      advantage_memories.append(
-          U.AdvantageMemory(
-              step.state,
-              step.action,
-              step.action_prob,
-              step.value_estimate,
-              advantages[i],
-              discounted_returns[i],
-              )
-          )
-      i += 1
+:param successor_state: State following the last step of the rollout, None if it terminated, or the
+states following it in every environment of a `VectorEnvironment`
+'''
+    bootstrap = None
+    if successor_state is not None:  # Rollout cut off mid episode, bootstrap from the value of its successor
+      successor_states = np.asarray(successor_state)
+      if successor_states.ndim == len(self._input_size):
+        successor_states = successor_states[None]
+      with torch.no_grad():
+        *_, bootstrap = self._actor_critic(
+            U.to_tensor(successor_states, device=self._device, dtype=self._state_type)
+            )
 
-    return advantage_memories
+    self._rollout_storage.compute_advantages(bootstrap,
+                                             discount_factor=self._discount_factor,
+                                             tau=self._gae_tau)
 
   def evaluate(self, batch, discrete=False, **kwargs):
 
@@ -284,6 +320,7 @@ continuous
     value_error = (value_estimates - discounted_returns).pow(2).mean()
 
     advantage = (advantages - advantages.mean()) / (advantages.std() + self._divide_by_zero_safety)
+    advantage = advantage.unsqueeze(-1)  # Broadcast over the action dimensions of the ratio
 
     action_probs = U.to_tensor(batch.action_prob, device=self._device, dtype=torch.float) \
       .view(-1, self._output_size[0])
@@ -311,9 +348,9 @@ continuous
     return collective_cost, policy_loss, value_error
 
   def update(self):
-    batch = U.AdvantageMemory(*zip(*self._experience_buffer.sample()))
-    collective_cost, actor_loss, critic_loss = self.evaluate(batch)
-    self._optimise_wrt(collective_cost)
+    for batch in self._rollout_storage.minibatches(self._mini_batch_size, epochs=self._ppo_epochs):
+      collective_cost, actor_loss, critic_loss = self.evaluate(batch)
+      self._optimise_wrt(collective_cost)
     # self.__optimise_wrt_split__((actor_loss, critic_loss))
 
     '''
@@ -341,6 +378,11 @@ continuous
     action, value_estimate, action_log_std, *_ = self._sample_model(state)
     return action, value_estimate, action_log_std
 
+  def sample_actions(self, states, **kwargs):
+    '''Batched `sample_action` for N parallel environments, one forward pass for all rows of `states`.'''
+    action, value_estimate, action_log_std, *_ = self._sample_model_batch(states)
+    return action, value_estimate, action_log_std
+
   def train_step_batched(self,
                          env,
                          num_batches=10000,
@@ -353,33 +395,35 @@ continuous
 
     initial_state = env.reset()
 
+    take_n_steps = self.take_n_steps
+    if isinstance(env, U.VectorEnvironment):
+      take_n_steps = self.take_n_vector_steps
+
     B = tqdm(range(1, num_batches + 1), f'Batch {0}, {num_batches} - Episode {self._rollout_i}', leave=False)
     for batch_i in B:
       if batch_i % stat_frequency == 0:
         B.set_description(f'Batch {batch_i}, {num_batches} - Episode {self._rollout_i}')
 
       if render and batch_i % render_frequency == 0:
-        transitions, accumulated_signal, terminated, initial_state = self.take_n_steps(
+        successor_state, accumulated_signal, terminated, initial_state = take_n_steps(
             initial_state, env, render=render, n=batch_length
             )
       else:
-        transitions, accumulated_signal, terminated, initial_state = self.take_n_steps(
+        successor_state, accumulated_signal, terminated, initial_state = take_n_steps(
             initial_state, env, n=batch_length
             )
 
       if batch_i >= self._initial_observation_period:
-        advantage_memories = self.trace_back_steps(transitions)
-        for m in advantage_memories:
-          self._experience_buffer.add(m)
-
+        self.trace_back_steps(successor_state)
         self.update()
-        self._experience_buffer.clear()
 
         if self._rollout_i % self._update_target_interval == 0:
           self._actor_critic_target.load_state_dict(
               self._actor_critic.state_dict()
               )
 
+      self._rollout_storage.clear()
+
       if self._end_training:
         break
 
@@ -403,30 +447,27 @@ continuous
         B.set_description(f'Batch {batch_i}, {num_batches} - Episode {self._rollout_i}')
 
       if render and batch_i % render_frequency == 0:
-        transitions, accumulated_signal, terminated, *_ = self.rollout(
+        successor_state, accumulated_signal, terminated, *_ = self.rollout(
             initial_state, env, render=render
             )
       else:
-        transitions, accumulated_signal, terminated, *_ = self.rollout(
+        successor_state, accumulated_signal, terminated, *_ = self.rollout(
             initial_state, env
             )
 
       initial_state = env.reset()
 
       if batch_i >= self._initial_observation_period:
-        advantage_memories = self.trace_back_steps(transitions)
-
-        for m in advantage_memories:
-          self._experience_buffer.add(m)
-
+        self.trace_back_steps(successor_state)
         self.update()
-        self._experience_buffer.clear()
 
         if self._rollout_i % self._update_target_interval == 0:
           self._actor_critic_target.load_state_dict(
               self._actor_critic.state_dict()
               )
 
+      self._rollout_storage.clear()
+
       if self._end_training:
         break
 
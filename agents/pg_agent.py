@@ -19,6 +19,7 @@ tqdm.monitor_interval = 0
 
 
 class PGAgent(PolicyAgent):
+  vectorised_training = True
 
   # region Private
 
@@ -56,18 +57,17 @@ class PGAgent(PolicyAgent):
   # region Protected
 
   def _sample_model(self, state, **kwargs):
-    state_tensor = U.to_tensor([state], device=self._device, dtype=self._state_type)
-    with torch.no_grad():
-      probs = self._policy(state_tensor)
-    m = Categorical(probs)
-    action = m.sample()
-    return action.item()
+    with torch.inference_mode():
+      probs = self._policy(self._inference_input(state))
+      action = torch.multinomial(probs[0], 1).item()
+    return action
 
   def _build(self, **kwargs) -> None:
 
     policy = self._policy_arch(
         **(self._policy_arch_params._asdict())
         ).to(self._device)
+    self._flatten_parameters(policy)
 
     self.optimiser = self._optimiser_type(
         policy.parameters(),
@@ -78,10 +78,9 @@ class PGAgent(PolicyAgent):
     self._policy = policy
 
   def _optimise_wrt(self, loss, **kwargs):
-    self.optimiser.zero_grad()
+    self._policy.zero_grad()
     loss.backward()
-    for params in self._policy.parameters():
-      params.grad.data.clamp_(-1, 1)
+    U.clamp_gradients(self._policy, -1, 1)
     self.optimiser.step()
 
   # endregion
@@ -94,8 +93,19 @@ class PGAgent(PolicyAgent):
 
     return self.sample_continuous_action(state)
 
+  def sample_actions(self, states, discrete=True, **kwargs):
+    '''Batched `sample_action` for N parallel environments, one forward pass of the policy for all rows.'''
+    if discrete:
+      return self.sample_discrete_actions(states)
+
+    return self.sample_continuous_actions(states)
+
   def sample_discrete_action(self, state):
-    state_var = U.to_tensor([state], device=self._device, dtype=self._state_type)
+    action, log_prob, entropy = self.sample_discrete_actions([state])
+    return action[0].item(), log_prob, entropy
+
+  def sample_discrete_actions(self, states):
+    state_var = U.to_tensor(states, device=self._device, dtype=self._state_type)
 
     probs = self._policy(state_var)
 
@@ -103,18 +113,20 @@ class PGAgent(PolicyAgent):
 
     m = Categorical(probs)
     action_sample = m.sample()
-    action = action_sample.item()
+    action = action_sample.to('cpu').numpy()
 
     return action, m.log_prob(action_sample), m.entropy()
 
   def sample_continuous_action(self, state):
-    model_input = U.to_tensor([state], device=self._device, dtype=self._state_type)
+    action, log_prob, entropy = self.sample_continuous_actions([state])
+    return action[0], log_prob[0], entropy[0]
+
+  def sample_continuous_actions(self, states):
+    model_input = U.to_tensor(states, device=self._device, dtype=self._state_type)
 
     with torch.no_grad():
       mu, sigma_sq = self._policy(model_input)
 
-      mu, sigma_sq = mu[0], sigma_sq[0]
-
     # std = self.sigma.exp().expand_as(mu)
     # dist = torch.Normal(mu, std)
     # return dist, value
@@ -135,9 +147,7 @@ class PGAgent(PolicyAgent):
     return action, log_prob, entropy
 
   def evaluate(self, **kwargs):
-    R = 0
     policy_loss = []
-    signals = []
 
     trajectory = self._trajectory_trace.retrieve_trajectory()
     t_signal = trajectory.signal
@@ -145,11 +155,8 @@ class PGAgent(PolicyAgent):
     entrp = trajectory.entropy
     self._trajectory_trace.clear()
 
-    for r in t_signal[::-1]:
-      R = r + self._discount_factor * R
-      signals.insert(0, R)
-
-    signals = U.to_tensor(signals, device=self._device, dtype=self._signals_tensor_type)
+    signals = U.to_tensor(t_signal, device=self._device, dtype=self._signals_tensor_type)
+    signals = U.discounted_returns(signals, self._discount_factor).type(self._signals_tensor_type)
 
     if signals.shape[0] > 1:
       stddev = signals.std()
@@ -216,6 +223,76 @@ class PGAgent(PolicyAgent):
 
     return episode_signal, episode_length, avg_entropy
 
+  def vector_rollout(self, initial_states, environment, n=100, render=False, train=True, **kwargs):
+    '''
+`rollout` for a `VectorEnvironment`, `n` steps of all of its environments acting for them with one forward
+pass of the policy per step, followed by one update. Returns are discounted per environment and cut at
+episode ends, episodes still running after the last step contribute the signals received so far.
+
+:return: The states to continue from, the signal accumulated over the steps and the mean entropy
+'''
+    states = initial_states
+    signals, log_probs, entropies, non_terminals = [], [], [], []
+
+    T = tqdm(range(1, n + 1), f'Step #{self._step_i}', leave=False)
+    for t in T:
+      self._step_i += len(states)
+      actions, action_log_probs, entropy, *_ = self.sample_actions(states)
+
+      states, step_signals, terminated, _ = environment.step(actions)
+
+      if render:
+        environment.render()
+
+      if self._signal_clipping:
+        step_signals = np.clip(step_signals, -1.0, 1.0)
+
+      signals.append(step_signals)
+      log_probs.append(action_log_probs.reshape(len(states), -1).sum(-1))
+      entropies.append(entropy.reshape(len(states), -1).sum(-1))
+      non_terminals.append(~terminated)
+
+    entropies = torch.stack(entropies)
+    if train:
+      returns = U.discounted_returns(np.stack(signals), self._discount_factor, np.stack(non_terminals))
+      returns = returns.to(self._device).type(self._signals_tensor_type)
+      if returns.numel() > 1:
+        returns = (returns - returns.mean()) / (returns.std() + self._divide_by_zero_safety)
+
+      self._optimise_wrt((-torch.stack(log_probs) * returns - self._pg_entropy_reg * entropies).sum())
+
+    return states, np.sum(signals), entropies.mean().item()
+
+  def train_step_batched(self,
+                         environment,
+                         num_batches=10000,
+                         render=False,
+                         render_frequency=100,
+                         stat_frequency=10,
+                         batch_length=100,
+                         **kwargs):
+    '''Trains on a `VectorEnvironment`, one update per `batch_length` steps of all of its environments.'''
+    stats = U.StatisticCollection(stats=('signal', 'entropy'))
+
+    states = environment.reset()
+
+    B = tqdm(range(1, num_batches + 1), leave=False)
+    for batch_i in B:
+      if batch_i % stat_frequency == 0:
+        B.set_description(f'Batch {batch_i}, Running signal: {stats.signal.running_value[-1]}')
+
+      states, signal, entropy = self.vector_rollout(states,
+                                                    environment,
+                                                    n=batch_length,
+                                                    render=render and batch_i % render_frequency == 0)
+      stats.signal.append(signal)
+      stats.entropy.append(entropy)
+
+      if self._end_training:
+        break
+
+    return self._policy, stats
+
   def infer(self, env, render=True):
 
     for episode_i in count(1):
@@ -55,6 +55,10 @@ MEMORY = U.TransitionBuffer(REPLAY_MEMORY_SIZE)
 ACTION_CLIPPING = False
 SIGNAL_CLIPPING = False
 
+INITIAL_OBSERVATION_PERIOD = 0
+LEARNING_FREQUENCY = 4
+UPDATE_TO_DATA_RATIO = 1
+
 ENVIRONMENT_NAME = 'Pendulum-v0'
 # ENVIRONMENT_NAME = 'MountainCarContinuous-v0'
 # ENVIRONMENT_NAME = 'InvertedPendulum-v2'
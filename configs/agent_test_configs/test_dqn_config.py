@@ -19,7 +19,11 @@ EXPLORATION_EPSILON_DECAY = 400
 INITIAL_OBSERVATION_PERIOD = 0
 LEARNING_FREQUENCY = 1
 REPLAY_MEMORY_SIZE = 10000
-MEMORY = U.ReplayBuffer3(REPLAY_MEMORY_SIZE)
+MEMORY = U.ArrayTransitionBuffer(REPLAY_MEMORY_SIZE)
+PRIORITISED_REPLAY = False  # Proportional prioritisation on the agent device
+PRIORITISED_REPLAY_ALPHA = 0.6
+PRIORITISED_REPLAY_BETA = 0.4
+# MEMORY = U.RankBasedReplayBuffer(REPLAY_MEMORY_SIZE)  # Rank based prioritisation, with PRIORITISED_REPLAY
 
 BATCH_SIZE = 128
 DISCOUNT_FACTOR = 0.999
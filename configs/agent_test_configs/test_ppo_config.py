@@ -27,6 +27,9 @@ STEPS = 10
 
 MEMORY_CAPACITY = STEPS
 BATCH_SIZE = STEPS
+MINI_BATCH_SIZE = 64
+PPO_EPOCHS = 4
+NUM_WORKERS = 4
 
 TARGET_UPDATE_INTERVAL = 1000
 TARGET_UPDATE_TAU = 1.0
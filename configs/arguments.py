@@ -37,9 +37,9 @@ def parse_arguments(desc, C):
       '--NUM_WORKERS',
       '-N',
       type=int,
-      default=4,
+      default=C.NUM_WORKERS,
       metavar='NUM_WORKERS',
-      help='Number of threads for agent (default: 4)')
+      help=f'Number of environments stepped in parallel (default: {C.NUM_WORKERS})')
   parser.add_argument(
       '--CONNECT_TO_RUNNING',
       '-C',
@@ -59,6 +59,23 @@ def parse_arguments(desc, C):
       action='store_true',
       default=C.VERBOSE,
       help='Enable verbose debug prints')
+  parser.add_argument(
+      '--REPLAY_MEMORY_DIRECTORY',
+      type=str,
+      default=C.REPLAY_MEMORY_DIRECTORY,
+      metavar='REPLAY_MEMORY_DIRECTORY',
+      help='Directory of a disk backed replay memory')
+  parser.add_argument(
+      '--REPLAY_MEMORY_RESUME',
+      action='store_true',
+      default=C.REPLAY_MEMORY_RESUME,
+      help='Continue the replay memory an earlier run left in REPLAY_MEMORY_DIRECTORY')
+  parser.add_argument(
+      '--EXPERIENCE_DIRECTORY',
+      type=str,
+      default=C.EXPERIENCE_DIRECTORY,
+      metavar='EXPERIENCE_DIRECTORY',
+      help='Directory to export the replay memory to after training')
   parser.add_argument(
       '--skip_confirmation',
       '-skip',
@@ -52,10 +52,18 @@ SIGNAL_CLIPPING = False
 CLAMP_GRADIENT = False
 BATCH_SIZE = 32
 LEARNING_FREQUENCY = 4
+UPDATE_TO_DATA_RATIO = 1
 SYNC_TARGET_MODEL_FREQUENCY = 10000
 REPLAY_MEMORY_SIZE = 1000000
+REPLAY_MEMORY_DIRECTORY = None  # Set to keep the replay memory on disk, see MemoryMappedTransitionBuffer
+REPLAY_MEMORY_RESUME = False  # Continue the memory an earlier run left in REPLAY_MEMORY_DIRECTORY
+REPLAY_MEMORY_RAM_BUDGET = 0  # Bytes kept in RAM for the most recent transitions of a disk backed memory
+REPLAY_MEMORY_FLUSH_INTERVAL = None
+EXPERIENCE_DIRECTORY = None  # Set to export the replay memory after training, see save_experience
+PREFETCH_DEPTH = 0  # Replay batches sampled ahead on a background thread, 0 samples in update
 INITIAL_OBSERVATION_PERIOD = 10000
 DISCOUNT_FACTOR = 0.99
+N_STEPS = 1  # Signals folded into each replayed transition, above 1 DQN uses an NStepTransitionBuffer
 UPDATE_DIFFICULTY_INTERVAL = 1000
 ROLLOUTS = 4000
 STATE_TYPE = torch.float
@@ -82,6 +90,9 @@ USE_CUDA = True
 if USE_CUDA:  # If available
   USE_CUDA = torch.cuda.is_available()
 
+# Number of environments stepped in parallel, by agents that can train on a VectorEnvironment
+NUM_WORKERS = 1
+
 # Visualisation
 USE_VISDOM = False
 START_VISDOM_SERVER = False
@@ -61,6 +61,10 @@ BATCH_SIZE = 32
 LEARNING_FREQUENCY = 4
 SYNC_TARGET_MODEL_FREQUENCY = 10000
 REPLAY_MEMORY_SIZE = 1000000
+REPLAY_MEMORY_DIRECTORY = LOG_DIRECTORY / 'replay_memory'  # The agent builds a disk backed memory here
+REPLAY_MEMORY_RESUME = False  # Or pass --REPLAY_MEMORY_RESUME to continue the memory of an earlier run
+REPLAY_MEMORY_RAM_BUDGET = 2 ** 30  # Bytes kept in RAM for the most recent transitions
+REPLAY_MEMORY_FLUSH_INTERVAL = 100000
 INITIAL_OBSERVATION_PERIOD = 50000
 DISCOUNT_FACTOR = 0.99
 
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+__author__ = 'cnheider'
+'''
+Description: Microbenchmark of the per action latency of the single state action selection of agents
+Author: Christian Heider Nielsen
+'''
+import argparse
+import time
+
+import numpy as np
+import torch
+from gym import spaces
+
+
+class SpecificationEnvironment(object):
+  '''Only exposes the spaces agents infer their input and output sizes from.'''
+
+  def __init__(self, observation_space, action_space):
+    self.observation_space = observation_space
+    self.action_space = action_space
+
+
+def action_latencies(agent, state, samples=10000, warm_up=1000):
+  '''
+Times `samples` consecutive calls of `agent._sample_model(state)`, after `warm_up` untimed calls.
+
+:return: Latencies in microseconds
+'''
+  for _ in range(warm_up):
+    agent._sample_model(state)
+
+  latencies = np.empty(samples)
+  for i in range(samples):
+    start = time.perf_counter_ns()
+    agent._sample_model(state)
+    latencies[i] = time.perf_counter_ns() - start
+
+  return latencies / 1e3
+
+
+def main():
+  parser = argparse.ArgumentParser(description='Per action latency of agents acting on single states')
+  parser.add_argument('--samples', type=int, default=10000, help='Timed actions per agent')
+  parser.add_argument('--warm_up', type=int, default=1000, help='Untimed actions before timing')
+  parser.add_argument('--observation_size', type=int, default=8, help='Size of the flat observations')
+  parser.add_argument('--action_size', type=int, default=4, help='Number of discrete actions, or size of '
+                                                                  'the continuous actions')
+  parser.add_argument('--threads', type=int, default=1, help='Torch intra-op threads')
+  parser.add_argument('--cuda', action='store_true', default=False, help='Act on the GPU')
+  args = parser.parse_args()
+
+  import configs.agent_test_configs.test_ddpg_config as DDPG_C
+  import configs.agent_test_configs.test_dqn_config as DQN_C
+  import configs.agent_test_configs.test_pg_config as PG_C
+  import configs.agent_test_configs.test_ppo_config as PPO_C
+  from agents.ddpg_agent import DDPGAgent
+  from agents.dqn_agent import DQNAgent
+  from agents.experimental.ppo_agent import PPOAgent
+  from agents.pg_agent import PGAgent
+
+  torch.set_num_threads(args.threads)
+  device = torch.device('cuda' if args.cuda and torch.cuda.is_available() else 'cpu')
+
+  observation_space = spaces.Box(-1., 1., shape=(args.observation_size,), dtype=np.float32)
+  discrete = spaces.Discrete(args.action_size)
+  continuous = spaces.Box(-1., 1., shape=(args.action_size,), dtype=np.float32)
+
+  agents = (('DQN', DQNAgent, DQN_C, discrete),
+            ('PG', PGAgent, PG_C, discrete),
+            ('PPO', PPOAgent, PPO_C, continuous),
+            ('DDPG', DDPGAgent, DDPG_C, continuous))
+
+  results = []
+  for name, agent_type, config, action_space in agents:
+    agent = agent_type(config)
+    agent.build(SpecificationEnvironment(observation_space, action_space), device)
+    state = observation_space.sample()
+    results.append((name, action_latencies(agent, state, args.samples, args.warm_up)))
+
+  print(f'{"agent":<6}{"p50 us":>10}{"p99 us":>10}{"mean us":>10}')
+  for name, latencies in results:
+    p50, p99 = np.percentile(latencies, [50, 99])
+    print(f'{name:<6}{p50:>10.1f}{p99:>10.1f}{latencies.mean():>10.1f}')
+
+
+if __name__ == '__main__':
+  main()
@@ -3,9 +3,12 @@
 
 __author__ = 'cnheider'
 import argparse
+import functools
 import os
 import signal
+import time
 
+import gym
 import torch
 import torch.multiprocessing as MP
 import torch.nn as nn
@@ -13,6 +16,77 @@ import torch.nn.functional as F
 import torch.optim as optim
 from torchvision import datasets, transforms
 
+import utilities as U
+
+
+def _replay_actor(agent, environment_factory, seed, steps):
+  '''Steps an environment with the shared value model of `agent`, appending to its shared replay memory.'''
+  environment = environment_factory()
+  environment.seed(seed)
+  U.set_seeds(seed)
+
+  state = environment.reset()
+  for _ in range(steps):
+    action = agent.sample_action(state)
+    successor_state, signal, terminated, *_ = environment.step(action)
+    agent._memory.add_transition(state,
+                                 action,
+                                 signal,
+                                 None if terminated else successor_state,
+                                 not terminated)
+    state = environment.reset() if terminated else successor_state
+
+
+def replay_train_agent_procedure(agent_type, config, environment_factory=None, steps_per_actor=100000):
+  '''
+Actor-learner training of a replay agent, eg. `DQNAgent`. `NUM_WORKERS` actor processes step their own
+environments with the shared value model and append to a `SharedTransitionBuffer`, while this process
+samples it and learns until the actors are done.
+
+:param environment_factory: Callable making an environment, defaults to gym.make of ENVIRONMENT_NAME
+:param steps_per_actor: Number of environment steps of each actor
+:return: The value model
+'''
+  if environment_factory is None:
+    environment_factory = functools.partial(gym.make, config.ENVIRONMENT_NAME)
+  environment = environment_factory()
+
+  agent = agent_type(config)
+  agent.build(environment, torch.device('cpu'))
+  agent._memory = U.SharedTransitionBuffer(config.REPLAY_MEMORY_SIZE,
+                                           state_shape=environment.observation_space.shape)
+  agent._value_model.share_memory()  # Actors act on the weights the learner updates
+
+  context = MP.get_context('fork')  # Actors inherit the shared tensors without pickling the agent
+  actors = [context.Process(target=_replay_actor,
+                            args=(agent, environment_factory, config.SEED + actor_i, steps_per_actor))
+            for actor_i in range(config.NUM_WORKERS)]
+  for actor in actors:
+    actor.start()
+
+  updates = 0
+  try:
+    while any(actor.is_alive() for actor in actors) and not agent._end_training:
+      if len(agent._memory) <= agent._batch_size:
+        time.sleep(.01)
+        continue
+
+      agent.update()
+      updates += 1
+      if agent._use_double_dqn and updates % agent._sync_target_model_frequency == 0:
+        agent._target_value_model = U.copy_state(agent._target_value_model, agent._value_model)
+
+    U.save_agent_experience(agent, config)
+  finally:
+    for actor in actors:
+      if agent._end_training:
+        actor.terminate()
+      actor.join()
+    agent.close()
+    environment.close()
+
+  return agent._value_model
+
 
 def _train(rankey, args, model):
   torch.manual_seed(args.seed + rank)
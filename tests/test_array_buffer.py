@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+__author__ = 'cnheider'
+
+import numpy as np
+
+from utilities.memory.array_buffer import ArrayTransitionBuffer
+from utilities.memory.transition import Transition
+
+
+def add(memory, i, terminal=False):
+  successor = None if terminal else np.full(3, i + 1, np.float32)
+  memory.add_transition(np.full(3, i, np.float32), i % 2, float(i), successor, not terminal)
+
+
+def test_ring_wraps_around_overwriting_the_oldest():
+  memory = ArrayTransitionBuffer(4)
+  for i in range(10):
+    add(memory, i)
+
+  assert len(memory) == 4
+  batch = memory.get_transitions(np.arange(4))
+  np.testing.assert_array_equal(batch.signal, [8, 9, 6, 7])
+  np.testing.assert_array_equal(batch.state[:, 0], [8, 9, 6, 7])
+  np.testing.assert_array_equal(batch.successor_state[:, 0], [9, 10, 7, 8])
+  assert set(memory.sample_transitions(256).signal) == {6, 7, 8, 9}
+
+
+def test_terminal_successors_are_zero_filled():
+  memory = ArrayTransitionBuffer(4)
+  add(memory, 5)
+  add(memory, 6, terminal=True)
+  add(memory, 7)
+  add(memory, 8)
+  add(memory, 9)  # Overwrites slot 0, a terminal slot reused by a non terminal transition keeps no zeros
+
+  batch = memory.get_transitions(np.arange(4))
+  np.testing.assert_array_equal(batch.non_terminal, [True, False, True, True])
+  np.testing.assert_array_equal(batch.successor_state[1], np.zeros(3))
+  np.testing.assert_array_equal(batch.successor_state[0], np.full(3, 10))
+
+
+def test_extend_matches_adding_one_by_one():
+  added, extended = ArrayTransitionBuffer(5), ArrayTransitionBuffer(5)
+  for i in range(3):
+    add(added, i)
+  for i in range(3):
+    add(extended, i)
+
+  batch = Transition(np.arange(3, 9, dtype=np.float32)[:, None].repeat(3, 1),
+                     np.arange(3, 9) % 2,
+                     np.arange(3, 9, dtype=np.float32),
+                     np.arange(4, 10, dtype=np.float32)[:, None].repeat(3, 1),
+                     np.ones(6, dtype=np.bool_))
+  for transition in zip(*batch):
+    added.add(Transition(*transition))
+  extended.extend(batch)
+
+  for expected, column in zip(added.get_transitions(np.arange(5)), extended.get_transitions(np.arange(5))):
+    np.testing.assert_array_equal(expected, column)
+
+
+def test_extending_by_an_empty_batch_is_a_no_op():
+  memory = ArrayTransitionBuffer(5)
+  memory.extend(Transition(*[np.empty((0, 3), np.float32)] * 5))
+  assert len(memory) == 0
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+__author__ = 'cnheider'
+
+import numpy as np
+import pytest
+
+from utilities.memory.array_buffer import ArrayTransitionBuffer, CompressedTransitionBuffer
+from utilities.memory.codecs import ChunkedCompressedColumn, Float16Codec, StorageCodec, Uint8Codec
+
+
+def test_uint8_round_trip_is_within_half_a_level():
+  codec = Uint8Codec(-1., 3.)
+  values = np.linspace(-1., 3., 1000, dtype=np.float32)
+
+  encoded = codec.encode(values)
+  assert encoded.dtype == codec.storage_dtype(values.dtype) == np.uint8
+  np.testing.assert_allclose(codec.decode(encoded), values, atol=4 / 255 / 2 + 1e-6)
+  np.testing.assert_array_equal(codec.encode(np.array([-5., 7.])), [0, 255])  # Clipped to the range
+
+
+@pytest.mark.parametrize('codec', [Float16Codec(), StorageCodec()])
+def test_float_round_trip(codec):
+  values = np.random.randn(100, 4).astype(np.float32)
+
+  encoded = codec.encode(values)
+  assert encoded.dtype == codec.storage_dtype(values.dtype)
+  decoded = codec.decode(encoded)
+  assert decoded.dtype == np.float32
+  np.testing.assert_allclose(decoded, values, rtol=1e-3, atol=1e-3)
+
+
+def test_compressed_column_round_trip_across_hot_and_cold_chunks():
+  capacity, shape = 100, (16, 16)
+  column = ChunkedCompressedColumn(capacity, shape, np.uint8, chunk_size=8, hot_chunks=2)
+  rows = np.random.randint(0, 4, (capacity, *shape)).astype(np.uint8)  # Compressible, like frames
+  for i, row in enumerate(rows):
+    column[i] = row
+
+  for _ in range(5):
+    indices = np.random.randint(0, capacity, 32)
+    np.testing.assert_array_equal(column[indices], rows[indices])
+
+  column[3] = 0  # Writing into a cold chunk makes it hot again
+  rows[3] = 0
+  np.testing.assert_array_equal(column[np.arange(capacity)], rows)
+  assert column.nbytes < rows.nbytes
+
+
+def test_compressed_buffer_samples_equal_the_plain_buffer():
+  plain = ArrayTransitionBuffer(50)
+  compressed = CompressedTransitionBuffer(50, chunk_size=4, hot_chunks=1)
+  for i in range(70):
+    state = np.random.rand(6).astype(np.float32)
+    for memory in (plain, compressed):
+      memory.add_transition(state, i, float(i), state + 1, i % 9 != 0)
+
+  indices = np.random.randint(0, 50, 40)
+  for expected, actual in zip(plain.get_transitions(indices), compressed.get_transitions(indices)):
+    np.testing.assert_array_equal(np.asarray(actual), np.asarray(expected))
+
+
+def test_terminal_successors_decode_to_zero_when_zero_is_not_the_low_end():
+  codec = Uint8Codec(-1., 1.)
+  memory = ArrayTransitionBuffer(4, codecs={'state':codec, 'successor_state':codec})
+  memory.add_transition(np.full(3, .5), 0, 0., np.full(3, -1.), True)
+  memory.add_transition(np.full(3, -1.), 0, 0., None, False)
+
+  batch = memory.get_transitions(np.arange(2))
+  np.testing.assert_allclose(batch.successor_state[0], -1.)
+  np.testing.assert_array_equal(batch.successor_state[1], np.zeros(3))
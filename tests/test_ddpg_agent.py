@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+__author__ = 'cnheider'
+
+import types
+
+import numpy as np
+import pytest
+
+import utilities as U
+from agents.ddpg_agent import DDPGAgent
+
+
+def ddpg_agent(memory, **attributes):
+  agent = DDPGAgent()
+  agent._memory = memory
+  agent._input_size = (3,)
+  agent._output_size = (1,)
+  agent._device = 'cpu'
+  agent._build()
+  for name, value in attributes.items():
+    setattr(agent, name, value)
+  return agent
+
+
+def fill(memory, num):
+  for _ in range(num):
+    memory.add_transition(np.random.rand(3).astype(np.float32),
+                          np.random.rand(1).astype(np.float32),
+                          np.random.rand(),
+                          np.random.rand(3).astype(np.float32),
+                          True)
+  return memory
+
+
+@pytest.mark.parametrize('ratio, frequency', [(0.25, 1), (0.5, 4), (1, 4), (1.5, 4), (2, 3)])
+def test_scheduled_gradient_steps_follow_update_to_data_ratio(ratio, frequency):
+  agent = ddpg_agent(fill(U.ArrayTransitionBuffer(1000), 1000),
+                     _batch_size=8,
+                     _initial_observation_period=10,
+                     _learning_frequency=frequency,
+                     _update_to_data_ratio=ratio)
+
+  steps = []
+  for step_i in range(1, 211):
+    agent._step_i = step_i
+    steps.append(agent._scheduled_gradient_steps())
+
+  assert sum(steps[:10]) == 0
+  assert all(num == 0 for step_i, num in enumerate(steps, 1) if step_i % frequency)
+  learning_calls = 210 // frequency - 10 // frequency
+  assert abs(sum(steps) - ratio * frequency * learning_calls) < 1
+  assert 0 <= agent._gradient_step_credit < 1
+
+
+def test_scheduled_gradient_steps_keep_credit_the_memory_can_not_supply():
+  memory = fill(U.ArrayTransitionBuffer(1000), 16)
+  agent = ddpg_agent(memory, _batch_size=8, _initial_observation_period=0, _learning_frequency=4,
+                     _update_to_data_ratio=2)
+
+  agent._step_i = 4
+  assert agent._scheduled_gradient_steps() == 2
+  assert agent._gradient_step_credit == 6
+
+  fill(memory, 64)
+  agent._step_i = 8
+  assert agent._scheduled_gradient_steps() == 10
+  assert agent._gradient_step_credit == 4
+
+
+def test_scheduled_gradient_steps_accrue_no_credit_before_a_full_batch():
+  memory = fill(U.ArrayTransitionBuffer(1000), 4)
+  agent = ddpg_agent(memory, _batch_size=8, _initial_observation_period=0, _learning_frequency=1,
+                     _update_to_data_ratio=1)
+
+  for step_i in range(1, 11):
+    agent._step_i = step_i
+    assert agent._scheduled_gradient_steps() == 0
+  assert agent._gradient_step_credit == 0
+
+  fill(memory, 4)
+  agent._step_i = 11
+  assert agent._scheduled_gradient_steps() == 1
+
+
+def test_update_takes_at_most_one_step_per_distinct_batch():
+  agent = ddpg_agent(fill(U.TransitionBuffer(1000), 40), _batch_size=32)
+
+  calls = []
+  optimise = agent._optimise_wrt
+  agent._optimise_wrt = lambda *args: calls.append(1) or optimise(*args)
+
+  td_error, loss = agent.update(4)
+
+  assert len(calls) == 1
+  assert np.isfinite(td_error.item()) and np.isfinite(loss.item())
+
+
+def test_update_waits_for_a_full_batch():
+  assert ddpg_agent(fill(U.TransitionBuffer(1000), 8), _batch_size=32).update(4) is None
+
+
+class DriftingEnvironment(object):
+  '''Observes its step count, terminates after 3 steps.'''
+
+  observation_space = types.SimpleNamespace(shape=(3,), dtype=np.float32)
+  action_space = types.SimpleNamespace(shape=(1,))
+
+  def reset(self):
+    self._t = 0
+    return np.zeros(3, np.float32)
+
+  def step(self, action):
+    self._t += 1
+    return np.full(3, self._t, np.float32), float(action[0]), self._t == 3, {}
+
+
+def test_vector_environments_explore_and_learn_per_environment_step():
+  agent = ddpg_agent(U.ArrayTransitionBuffer(100),
+                     _batch_size=4,
+                     _initial_observation_period=0,
+                     _learning_frequency=2,
+                     _update_to_data_ratio=1)
+  gradient_steps = []
+  update = agent.update
+  agent.update = lambda num_steps:(gradient_steps.append(num_steps), update(num_steps))[1]
+
+  environment = U.SyncVectorEnvironment([DriftingEnvironment] * 3)
+  agent.vector_rollout(environment.reset(), environment, n=4)
+
+  assert len(agent._memory) == 12 and agent._step_i == 12
+  assert len(agent._random_processes) == 3
+  assert len(gradient_steps) == 4 and 0 < sum(gradient_steps) <= 12  # One gradient step per environment step
+  batch = agent._memory.get_transitions(np.arange(12))
+  np.testing.assert_array_equal(batch.non_terminal, batch.state[:, 0] < 2)
+  assert len(set(batch.action[:3, 0].tolist())) == 3  # Every environment draws its own noise
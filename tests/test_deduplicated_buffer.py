@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+__author__ = 'cnheider'
+
+import numpy as np
+
+from utilities.memory.deduplicated_buffer import DeduplicatedTransitionBuffer
+
+
+def transition(i):
+  return np.full(2, i, dtype=np.float32), i, float(i), np.full(2, i + 1, dtype=np.float32), True
+
+
+def test_length_counts_repeats():
+  memory = DeduplicatedTransitionBuffer(16)
+  for i in range(200):
+    memory.add_transition(*transition(i % 3))
+
+  assert len(memory) == 200
+  assert memory.num_unique == 3
+  np.testing.assert_array_equal(memory.counts(), [67, 67, 66])
+
+
+def test_overwritten_transitions_leave_the_length():
+  memory = DeduplicatedTransitionBuffer(2)
+  for i in (0, 0, 0, 1, 2):
+    memory.add_transition(*transition(i))
+
+  assert memory.num_unique == 2
+  assert len(memory) == 2
+  assert set(memory.sample_transitions(64).action) == {1, 2}
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+__author__ = 'cnheider'
+
+import numpy as np
+import pytest
+
+from utilities.functions.discounting import discounted_returns
+from utilities.functions.generalised_advantage_estimation import generalised_advantage_estimate
+
+
+def test_empty_trajectory():
+  assert discounted_returns([]).shape == (0,)
+  assert discounted_returns(np.zeros((0, 3)), bootstrap=np.ones(3)).shape == (0, 3)
+
+
+def test_block_size_must_shorten_the_scan():
+  with pytest.raises(AssertionError):
+    discounted_returns(np.ones(5), block_size=1)
+
+
+def scalar_returns(signals, non_terminals, discount_factor, bootstrap=0.):
+  R = bootstrap
+  returns = []
+  for signal, non_terminal in zip(reversed(signals), reversed(non_terminals)):
+    R = signal + discount_factor * R * non_terminal
+    returns.insert(0, R)
+  return returns
+
+
+@pytest.mark.parametrize('T', [1, 7, 8, 9, 100, 531])
+@pytest.mark.parametrize('block_size', [2, 8])
+def test_returns_match_the_scalar_loop(T, block_size):
+  signals = np.random.rand(T)
+  non_terminals = np.random.rand(T) > .1
+
+  returns = discounted_returns(signals, .97, non_terminals, bootstrap=2., block_size=block_size)
+  np.testing.assert_allclose(returns.numpy(), scalar_returns(signals, non_terminals, .97, 2.), rtol=1e-4)
+
+
+def test_parallel_environments_match_the_scalar_loop_per_environment():
+  T, N = 50, 4
+  signals = np.random.rand(T, N)
+  non_terminals = np.random.rand(T, N) > .1
+  bootstrap = np.random.rand(N)
+
+  returns = discounted_returns(signals, .9, non_terminals, bootstrap=bootstrap).numpy()
+  for n in range(N):
+    expected = scalar_returns(signals[:, n], non_terminals[:, n], .9, bootstrap[n])
+    np.testing.assert_allclose(returns[:, n], expected, rtol=1e-4)
+
+
+def scalar_gae(signals, values, non_terminals, bootstrap, discount_factor, tau):
+  advantage = 0
+  advantages = []
+  for t in reversed(range(len(signals))):
+    successor_value = values[t + 1] if t + 1 < len(signals) else bootstrap
+    td_error = signals[t] + discount_factor * successor_value * non_terminals[t] - values[t]
+    advantage = td_error + discount_factor * tau * non_terminals[t] * advantage
+    advantages.insert(0, advantage)
+  return np.array(advantages), np.array(advantages) + values
+
+
+@pytest.mark.parametrize('scripted', [False, True])
+def test_gae_matches_the_scalar_loop(scripted):
+  T, N = 40, 3
+  signals = np.random.rand(T, N)
+  values = np.random.rand(T, N)
+  non_terminals = np.random.rand(T, N) > .1
+  bootstrap = np.random.rand(N)
+
+  advantages, returns = generalised_advantage_estimate(signals, values, non_terminals, bootstrap,
+                                                       discount_factor=.99, tau=.95, scripted=scripted)
+  for n in range(N):
+    expected_advantages, expected_returns = scalar_gae(signals[:, n], values[:, n], non_terminals[:, n],
+                                                       bootstrap[n], .99, .95)
+    np.testing.assert_allclose(advantages[:, n].numpy(), expected_advantages, rtol=1e-4, atol=1e-5)
+    np.testing.assert_allclose(returns[:, n].numpy(), expected_returns, rtol=1e-4, atol=1e-5)
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+__author__ = 'cnheider'
+
+import types
+
+import numpy as np
+import pytest
+import torch
+import torch.nn.functional as F
+
+import utilities as U
+from agents.dqn_agent import DQNAgent
+from utilities.memory.transition import Transition
+
+
+def dqn_agent(memory, **attributes):
+  agent = DQNAgent()
+  agent._memory = memory
+  for name, value in attributes.items():
+    setattr(agent, name, value)
+  agent._value_arch_parameters = dict(input_size=None,
+                                      hidden_layers=[16],
+                                      output_size=None,
+                                      activation=F.relu,
+                                      use_bias=True)
+  agent._input_size = (4,)
+  agent._output_size = [2]
+  agent._device = 'cpu'
+  agent._build()
+  return agent
+
+
+@pytest.mark.parametrize('memory', [U.TransitionBuffer(100), U.FrameTransitionBuffer(100)])
+def test_prioritised_replay_replaces_memories_without_capacity_property(memory):
+  with pytest.warns(UserWarning, match=type(memory).__name__):
+    agent = dqn_agent(memory, _prioritised_replay=True, _replay_memory_size=321)
+
+  assert isinstance(agent._memory, U.TensorPrioritisedReplayBuffer)
+  assert agent._memory.capacity == 321
+
+
+def test_prioritised_replay_requires_the_weighted_sampling_interface():
+  from utilities.memory.scrap import PrioritisedReplayMemory
+
+  with pytest.warns(UserWarning, match='PrioritisedReplayMemory'):
+    agent = dqn_agent(PrioritisedReplayMemory(100), _prioritised_replay=True)
+  assert isinstance(agent._memory, U.TensorPrioritisedReplayBuffer)
+
+  memory = U.RankBasedReplayBuffer(100)
+  agent = dqn_agent(memory, _prioritised_replay=True, _batch_size=8)
+  assert agent._memory is memory
+
+  for i in range(20):
+    memory.add_transition(np.full(4, i, np.float32), i % 2, float(i), np.full(4, i + 1, np.float32), True)
+  assert np.isfinite(agent.update())
+
+
+def test_replay_memory_directory_builds_a_resumable_disk_backed_memory(tmp_path):
+  agent = dqn_agent(None, _replay_memory_directory=tmp_path, _replay_memory_size=50)
+  assert isinstance(agent._memory, U.MemoryMappedTransitionBuffer)
+  for i in range(10):
+    state = np.full(4, i, np.float32)
+    agent._memory.add_transition(state, i % 2, float(i), state + 1, True)
+  agent.close()
+
+  with pytest.raises(FileExistsError):
+    dqn_agent(None, _replay_memory_directory=tmp_path, _replay_memory_size=50)
+
+  resumed = dqn_agent(None,
+                      _replay_memory_directory=tmp_path,
+                      _replay_memory_size=50,
+                      _replay_memory_resume=True)
+  assert len(resumed._memory) == 10
+
+
+class TimeLimitedEnvironment(object):
+  '''Counts up from 0 and is cut off by a time limit after `limit` steps.'''
+
+  def __init__(self, limit):
+    self._limit = limit
+    self._t = 0
+
+  def step(self, action):
+    self._t += 1
+    truncated = self._t == self._limit
+    return np.full(4, self._t, np.float32), 1., truncated, {'TimeLimit.truncated':truncated}
+
+
+def test_n_steps_builds_an_n_step_memory_discounting_like_the_agent():
+  agent = dqn_agent(U.ArrayTransitionBuffer(100), _n_steps=3, _discount_factor=.9, _replay_memory_size=50)
+  assert isinstance(agent._memory, U.NStepTransitionBuffer)
+  assert agent._memory.n_steps == 3 and agent._memory.discount_factor == .9
+
+  with pytest.raises(AssertionError):
+    dqn_agent(U.NStepTransitionBuffer(100, discount_factor=.99), _discount_factor=.9)
+
+
+def test_time_limited_rollouts_flush_their_pending_n_step_transitions():
+  agent = dqn_agent(None, _n_steps=3, _discount_factor=.5, _batch_size=1000)
+  agent.rollout(np.zeros(4, np.float32), TimeLimitedEnvironment(5))
+
+  batch = agent._memory.get_transitions(np.arange(len(agent._memory)))
+  assert len(agent._memory) == 5
+  np.testing.assert_array_equal(batch.state[:, 0], [0, 1, 2, 3, 4])
+  np.testing.assert_allclose(batch.signal, [1.75, 1.75, 1.75, 1.5, 1.])
+  np.testing.assert_allclose(batch.discount, [.125, .125, .125, .25, .5])
+  assert batch.non_terminal.all()  # Cut off episodes bootstrap from their last state
+  np.testing.assert_array_equal(batch.successor_state[:, 0], [3, 4, 5, 5, 5])
+
+
+@pytest.mark.parametrize('memory', [U.TensorPrioritisedReplayBuffer(100), U.RankBasedReplayBuffer(100)])
+def test_weighted_memories_update_by_their_interface_without_the_prioritised_flag(memory):
+  agent = dqn_agent(memory, _prioritised_replay=False, _batch_size=8)
+  for i in range(20):
+    state = np.full(4, i, np.float32)
+    memory.add_transition(state, i % 2, float(i), state + 1, True)
+
+  assert np.isfinite(agent.update())
+
+
+def test_td_errors_feed_a_priority_ranked_eviction_policy():
+  memory = U.ArrayTransitionBuffer(20, eviction=U.LowestPriorityEviction())
+  agent = dqn_agent(memory, _batch_size=8)
+  for i in range(20):
+    memory.add_transition(np.full(4, i, np.float32), i % 2, float(i), np.full(4, i + 1, np.float32), True)
+
+  assert np.isfinite(agent.update())
+  assert len(set(memory.eviction._priorities.tolist())) > 1
+
+
+def test_batched_sampling_runs_the_model_on_the_exploiting_rows_only():
+  agent = dqn_agent(None, _eps_start=.5, _eps_end=.5, _initial_observation_period=0)
+  rows = []
+  sample_model_batch = agent._sample_model_batch
+  agent._sample_model_batch = lambda states: (rows.append(len(states)), sample_model_batch(states))[1]
+
+  np.random.seed(0)
+  actions = agent.sample_actions(np.zeros((1000, 4), np.float32))
+  assert agent._step_i == 1000 and actions.shape == (1000,)
+  assert len(rows) == 1 and 400 < rows[0] < 600
+  assert set(actions.tolist()) <= {0, 1}
+
+  agent._eps_start = agent._eps_end = 1.
+  agent.sample_actions(np.zeros((10, 4), np.float32))
+  assert len(rows) == 1
+
+
+class CountingEnvironment(object):
+  '''Observes its step count, terminates after 3 steps.'''
+
+  observation_space = types.SimpleNamespace(shape=(4,), dtype=np.float32)
+  action_space = types.SimpleNamespace(shape=(), n=2)
+
+  def reset(self):
+    self._t = 0
+    return np.zeros(4, np.float32)
+
+  def step(self, action):
+    self._t += 1
+    return np.full(4, self._t, np.float32), 1., self._t == 3, {}
+
+
+def test_vector_environments_train_with_one_transition_per_environment_step():
+  agent = dqn_agent(U.NStepTransitionBuffer(100, n_steps=2, discount_factor=.5),
+                    _discount_factor=.5,
+                    _batch_size=8,
+                    _learning_frequency=4,
+                    _initial_observation_period=0)
+  updates = []
+  update = agent.update
+  agent.update = lambda:(updates.append(agent._step_i), update())[1]
+
+  environment = U.SyncVectorEnvironment([CountingEnvironment] * 2)
+  states = agent.vector_rollout(environment.reset(), environment, n=6)[0]
+  agent.vector_rollout(states, environment, n=6)
+
+  assert len(agent._memory) == 24 and agent._step_i == 24
+  assert updates == [12, 16, 20, 24]  # Due every 4 steps once the memory holds a batch
+  batch = agent._memory.get_transitions(np.arange(24))
+  np.testing.assert_array_equal(batch.non_terminal, batch.state[:, 0] < 1)
+  np.testing.assert_allclose(batch.signal, np.where(batch.state[:, 0] < 2, 1.5, 1.))
+
+
+def terminal_batch(size=8):
+  rng = np.random.RandomState(0)
+  non_terminal = np.arange(size) % 3 != 0
+  return Transition([rng.rand(4).astype(np.float32) for _ in range(size)],
+                    list(rng.randint(2, size=size)),
+                    list(rng.rand(size)),
+                    [rng.rand(4).astype(np.float32) if n else None for n in non_terminal],
+                    list(non_terminal))
+
+
+def per_sample_targets(agent, batch):
+  targets = []
+  for signal, successor_state, non_terminal in zip(batch.signal, batch.successor_state, batch.non_terminal):
+    successor_value = 0.
+    if non_terminal:
+      successor = torch.tensor(successor_state)[None]
+      with torch.no_grad():
+        action = agent._value_model(successor).argmax(1)
+        model = agent._target_value_model if agent._use_double_dqn else agent._value_model
+        successor_value = model(successor)[0, action].item()
+    targets.append(signal + agent._discount_factor * successor_value)
+  return np.array(targets)
+
+
+@pytest.mark.parametrize('use_double_dqn', [False, True])
+@pytest.mark.parametrize('columnar', [False, True])
+def test_evaluate_masks_terminal_successors_like_the_per_sample_targets(use_double_dqn, columnar):
+  agent = dqn_agent(U.TransitionBuffer(100), _use_double_dqn=use_double_dqn)
+  agent._target_value_model.load_state_dict({name: parameter + .1 for name, parameter in
+                                             agent._value_model.state_dict().items()})
+  batch = terminal_batch()
+  targets = per_sample_targets(agent, batch)
+  if columnar:  # Columnar batches store terminal successors zero-filled
+    batch = Transition(np.stack(batch.state),
+                       np.array(batch.action),
+                       np.array(batch.signal),
+                       np.stack([np.zeros(4, np.float32) if s is None else s for s in batch.successor_state]),
+                       np.array(batch.non_terminal))
+
+  loss, td_errors = agent.evaluate(batch, weights=np.ones(8))
+
+  with torch.no_grad():
+    Q_state = agent._value_model(torch.tensor(np.stack(batch.state)))
+  Q_state = Q_state[np.arange(8), np.asarray(batch.action)].numpy()
+  np.testing.assert_allclose(td_errors.numpy(), np.abs(targets - Q_state), rtol=1e-5, atol=1e-6)
+  assert loss.requires_grad
+
+
+def test_evaluate_runs_states_and_successors_in_one_online_forward_pass():
+  agent = dqn_agent(U.TransitionBuffer(100), _use_double_dqn=False)
+  batch_sizes = []
+  agent._value_model.register_forward_hook(lambda model, inputs, output: batch_sizes.append(len(inputs[0])))
+
+  agent.evaluate(terminal_batch()).backward()
+
+  assert batch_sizes == [16]
+  assert all(parameter.grad is not None for parameter in agent._value_model.parameters())
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+__author__ = 'cnheider'
+
+import random
+
+import numpy as np
+import pytest
+import torch
+
+from utilities.memory.array_buffer import ArrayTransitionBuffer
+from utilities.memory.eviction import (EpisodeStratifiedEviction,
+                                       FIFOEviction,
+                                       LowestPriorityEviction,
+                                       ReservoirEviction)
+from utilities.memory.memory_mapped_buffer import MemoryMappedTransitionBuffer
+from utilities.memory.n_step_buffer import NStepTransitionBuffer
+from utilities.memory.rank_based_buffer import RankBasedReplayBuffer
+from utilities.memory.tensor_prioritised_buffer import TensorPrioritisedReplayBuffer
+
+
+def fill(memory, signals, episode_length=None):
+  for i, signal in enumerate(signals):
+    terminal = episode_length is not None and (i + 1) % episode_length == 0
+    state = np.zeros(2, np.float32)
+    memory.add_transition(state, 0, float(signal), state, not terminal)
+  return memory
+
+
+def stored_signals(memory):
+  return sorted(memory.get_transitions(np.arange(len(memory))).signal.tolist())
+
+
+def test_fifo_keeps_the_newest():
+  memory = fill(ArrayTransitionBuffer(4, eviction=FIFOEviction()), range(10))
+  assert stored_signals(memory) == [6, 7, 8, 9]
+
+
+def test_lowest_priority_is_fifo_without_priority_feedback():
+  memory = fill(ArrayTransitionBuffer(4, eviction=LowestPriorityEviction()), range(10))
+  assert stored_signals(memory) == [6, 7, 8, 9]
+
+
+def test_lowest_priority_overwrites_the_lowest_priority():
+  eviction = LowestPriorityEviction()
+  memory = fill(ArrayTransitionBuffer(5, eviction=eviction), range(5))
+  eviction.update([0, 1, 2, 3, 4], [5., 0.5, 4., 0.1, 3.])
+
+  fill(memory, [10, 11])
+  assert stored_signals(memory) == [0, 2, 4, 10, 11]
+
+  fill(memory, [12])  # New transitions got the max priority, 5, the lowest left is slot 4
+  assert stored_signals(memory) == [0, 2, 10, 11, 12]
+
+
+@pytest.mark.parametrize('memory_type', [ArrayTransitionBuffer,
+                                         TensorPrioritisedReplayBuffer,
+                                         RankBasedReplayBuffer])
+def test_memories_feed_priorities_to_the_eviction_policy(memory_type):
+  memory = fill(memory_type(5, eviction=LowestPriorityEviction()), range(5))
+  priorities = torch.tensor([5., 0.5, 4., 0.1, 3.])
+  if memory_type is ArrayTransitionBuffer:
+    memory.update_priorities(np.arange(5), priorities)
+  else:
+    memory.batch_update(np.arange(5), priorities)
+
+  fill(memory, [10, 11])
+  assert stored_signals(memory) == [0, 2, 4, 10, 11]
+
+
+def test_write_order_memories_refuse_eviction_policies(tmp_path):
+  with pytest.raises(ValueError):
+    MemoryMappedTransitionBuffer(10, tmp_path, eviction=FIFOEviction())
+  with pytest.raises(ValueError):
+    NStepTransitionBuffer(10, eviction=FIFOEviction())
+
+
+def test_reservoir_keeps_a_uniform_sample():
+  random.seed(0)
+  kept = np.zeros(100)
+  for _ in range(200):
+    memory = fill(ArrayTransitionBuffer(10, eviction=ReservoirEviction()), range(100))
+    kept[np.asarray(stored_signals(memory), dtype=np.int64)] += 1
+
+  assert kept.sum() == 2000
+  assert kept[:50].sum() / kept.sum() > 0.4
+
+
+def test_episode_stratified_keeps_every_episode():
+  memory = ArrayTransitionBuffer(12, eviction=EpisodeStratifiedEviction())
+  fill(memory, range(12), episode_length=6)
+  fill(memory, range(100, 106), episode_length=2)
+
+  signals = stored_signals(memory)
+  per_episode = [sum(0 <= s < 6 for s in signals), sum(6 <= s < 12 for s in signals)]
+  assert len(signals) == 12 and sorted(per_episode) == [3, 3]
+  assert sum(s >= 100 for s in signals) == 6
+
+
+def test_episode_stratified_heap_stays_bounded():
+  eviction = EpisodeStratifiedEviction()
+  memory = fill(ArrayTransitionBuffer(50, eviction=eviction), range(5000), episode_length=7)
+  assert len(memory) == 50
+  assert len(eviction._heap) <= 2 * len(eviction._slots) + 65
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+__author__ = 'cnheider'
+
+import numpy as np
+
+from utilities.memory.array_buffer import ArrayTransitionBuffer
+from utilities.memory.deduplicated_buffer import DeduplicatedTransitionBuffer
+from utilities.memory.shared_buffer import SharedTransitionBuffer
+from utilities.persistence.experience import load_experience, save_experience
+
+
+def fill(memory, values):
+  for i in values:
+    memory.add_transition(np.full(3, i, np.float32), i % 2, float(i), np.full(3, i + 1, np.float32), True)
+  return memory
+
+
+def test_round_trip_keeps_the_write_order(tmp_path):
+  memory = fill(ArrayTransitionBuffer(8), range(12))
+  assert save_experience(memory, tmp_path, chunk_size=3) == 8
+
+  restored = load_experience(tmp_path, ArrayTransitionBuffer(8))
+  np.testing.assert_array_equal(restored.get_transitions(np.arange(8)).signal, np.arange(4, 12))
+
+
+def test_shared_memories_export_what_their_actors_wrote(tmp_path):
+  memory = fill(SharedTransitionBuffer(8, state_shape=(3,)), range(12))
+  assert save_experience(memory, tmp_path, chunk_size=3) == 8
+
+  dataset = load_experience(tmp_path)
+  batch = dataset.get_transitions(np.arange(8))
+  np.testing.assert_array_equal(batch.signal, np.arange(4, 12))
+  np.testing.assert_array_equal(batch.successor_state[:, 0], np.arange(5, 13))
+
+
+def test_deduplicated_memories_keep_their_counts(tmp_path):
+  memory = fill(DeduplicatedTransitionBuffer(8), [0, 1, 1, 2, 2, 2])
+  save_experience(memory, tmp_path, chunk_size=2)
+
+  dataset = load_experience(tmp_path)
+  np.testing.assert_array_equal(dataset.counts(), [1, 2, 3])
+  assert set(dataset.sample_transitions(600).signal.tolist()) == {0, 1, 2}
+  assert (dataset.sample_transitions(600).signal == 2).sum() > 200
+
+  restored = load_experience(tmp_path, DeduplicatedTransitionBuffer(8))
+  assert len(restored) == 6 and restored.num_unique == 3
+  np.testing.assert_array_equal(restored.counts(), [1, 2, 3])
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+__author__ = 'cnheider'
+
+import copy
+
+import torch
+import torch.nn.functional as F
+
+import utilities as U
+
+
+def mlp():
+  return U.MLP(input_size=(4,), hidden_layers=(8, 8), output_size=(2,), activation=F.relu, use_bias=True)
+
+
+def flat_mlp():
+  model = mlp()
+  model.flatten_parameters()
+  return model
+
+
+def assert_parameters_equal(model, other):
+  for parameter, other_parameter in zip(model.parameters(), other.parameters()):
+    torch.testing.assert_close(parameter, other_parameter)
+
+
+def test_soft_update_matches_the_parameter_loop():
+  target, source = flat_mlp(), flat_mlp()
+  expected = copy.deepcopy(target)
+  for target_parameter, parameter in zip(expected.parameters(), source.parameters()):
+    target_parameter.data.copy_(0.7 * target_parameter.data + 0.3 * parameter.data)
+
+  U.soft_update(target, source, 0.3)
+  assert_parameters_equal(target, expected)
+
+
+def test_updates_fall_back_for_unflattened_models():
+  target, source = mlp(), flat_mlp()
+  U.copy_parameters(target, source)
+  assert_parameters_equal(target, source)
+
+
+def test_deepcopy_keeps_views_of_its_own_buffer():
+  model = flat_mlp()
+  target = copy.deepcopy(model)
+
+  assert target.flat_parameters is not None
+  assert target.flat_parameters.data_ptr() != model.flat_parameters.data_ptr()
+
+  with torch.no_grad():
+    model.flat_parameters.add_(1.)
+  U.soft_update(target, model, 1.)
+  assert_parameters_equal(target, model)
+
+
+def test_reassigned_parameters_leave_the_flat_path():
+  model = flat_mlp()
+  first = next(model.parameters())
+  first.data = first.data.clone()
+  assert model.flat_parameters is None
+
+  source = flat_mlp()
+  U.copy_parameters(model, source)
+  assert_parameters_equal(model, source)
+
+
+def test_gradient_views_survive_training_steps():
+  model, reference = flat_mlp(), mlp()
+  reference.load_state_dict(model.state_dict())
+  optimiser = torch.optim.Adam(model.parameters(), 1e-2)
+  reference_optimiser = torch.optim.Adam(reference.parameters(), 1e-2)
+  inputs = torch.randn(16, 4)
+
+  for _ in range(3):
+    model.zero_grad()
+    reference_optimiser.zero_grad()
+    model(inputs).pow(2).sum().backward()
+    reference(inputs).pow(2).sum().backward()
+    assert model.flat_gradients is not None
+    U.clamp_gradients(model, -.01, .01)
+    U.clamp_gradients(reference, -.01, .01)
+    optimiser.step()
+    reference_optimiser.step()
+
+  assert_parameters_equal(model, reference)
+  assert model.flat_parameters is not None
+
+  optimiser.zero_grad()
+  assert model.flat_gradients is None
+  model.zero_grad()
+  assert model.flat_gradients is not None
+
+
+def test_copy_state_copies_parameters_and_buffers():
+  target, source = U.CNN(input_channels=3, output_size=(2,)), U.CNN(input_channels=3, output_size=(2,))
+  target.flatten_parameters()
+  source.flatten_parameters()
+  source(torch.randn(4, 3, 40, 80))  # Updates the batch norm statistics
+
+  U.copy_state(target, source)
+  for key, value in source.state_dict().items():
+    torch.testing.assert_close(target.state_dict()[key], value)
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+__author__ = 'cnheider'
+
+import numpy as np
+
+from utilities.memory.codecs import Uint8Codec
+from utilities.memory.frame_buffer import FrameTransitionBuffer
+
+
+def frame(i):
+  return np.full((2, 2), i, np.float32)
+
+
+def play(memory, episodes):
+  for episode in episodes:
+    for step, (i, j) in enumerate(zip(episode, episode[1:])):
+      memory.add_transition(frame(i), step, 1., frame(j), step < len(episode) - 2)
+
+
+def test_stacks_are_zero_filled_before_the_episode_start():
+  memory = FrameTransitionBuffer(16, history_length=3)
+  play(memory, [[1, 2, 3, 4], [11, 12, 13]])
+
+  states = memory.get_transitions(np.arange(len(memory))).state[:, :, 0, 0]
+  np.testing.assert_array_equal(states, [[0, 0, 1],
+                                         [0, 1, 2],
+                                         [1, 2, 3],
+                                         [0, 0, 11],  # Frames of the previous episode are masked
+                                         [0, 11, 12]])
+
+
+def test_an_episode_starting_on_an_identical_frame_is_not_merged_into_the_previous():
+  memory = FrameTransitionBuffer(16, history_length=3)
+  play(memory, [[1, 2, 2], [2, 3]])
+
+  states = memory.get_transitions(np.arange(len(memory))).state[:, :, 0, 0]
+  np.testing.assert_array_equal(states, [[0, 0, 1], [0, 1, 2], [0, 0, 2]])
+  assert memory.frame_count == 5
+
+
+def test_end_episode_starts_a_new_episode_without_a_terminal():
+  memory = FrameTransitionBuffer(16, history_length=2)
+  memory.add_transition(frame(1), 0, 1., frame(2), True)
+  memory.end_episode()  # Cut off by a time limit
+  memory.add_transition(frame(7), 0, 1., frame(8), True)
+
+  states = memory.get_transitions(np.arange(2)).state[:, :, 0, 0]
+  np.testing.assert_array_equal(states, [[0, 1], [0, 7]])
+
+
+def test_successor_stacks_share_the_history_and_terminals_are_zero_filled():
+  memory = FrameTransitionBuffer(16, history_length=2)
+  play(memory, [[1, 2, 3]])
+  memory.add_transition(frame(5), 0, 1., None, False)
+
+  batch = memory.get_transitions(np.arange(len(memory)))
+  np.testing.assert_array_equal(batch.successor_state[:, :, 0, 0], [[1, 2], [2, 3], [0, 0]])
+  np.testing.assert_array_equal(batch.state[:, :, 0, 0], [[0, 1], [1, 2], [0, 5]])
+  assert memory.frame_count == 4  # Consecutive transitions share their frames
+
+
+def test_overwritten_frames_are_zero_filled_and_their_transitions_dropped():
+  memory = FrameTransitionBuffer(16, history_length=2, frame_capacity=4)
+  play(memory, [list(range(1, 8))])
+
+  assert len(memory) == 3  # Only the transitions of frames 4, 5 and 6 still have their state frame
+  batch = memory.get_transitions(np.arange(3, 6))
+  np.testing.assert_array_equal(batch.state[:, :, 0, 0], [[0, 4], [4, 5], [5, 6]])
+
+
+def test_frame_codec_round_trip():
+  memory = FrameTransitionBuffer(8, history_length=2, frame_codec=Uint8Codec())
+  memory.add_transition(np.full((2, 2), .25), 0, 1., np.full((2, 2), .5), True)
+
+  batch = memory.get_transitions(np.arange(1))
+  assert memory._frames.dtype == np.uint8
+  np.testing.assert_allclose(batch.state[0, 1], .25, atol=1 / 510)
+  np.testing.assert_allclose(batch.successor_state[0, 0], .25, atol=1 / 510)
+  np.testing.assert_allclose(batch.successor_state[0, 1], .5, atol=1 / 510)
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+__author__ = 'cnheider'
+
+import numpy as np
+import pytest
+
+from utilities.memory.memory_mapped_buffer import MemoryMappedTransitionBuffer
+
+
+def fill(memory, num):
+  for i in range(num):
+    memory.add_transition(np.full(3, i, dtype=np.float32), i % 2, float(i), np.full(3, i + 1, np.float32), True)
+
+
+@pytest.mark.parametrize('ram_budget', [0, 400, 2 ** 20])
+def test_close_and_resume_round_trip(tmp_path, ram_budget):
+  memory = MemoryMappedTransitionBuffer(16, tmp_path, ram_budget=ram_budget)
+  fill(memory, 20)
+  indices = np.arange(16)
+  expected = memory.get_transitions(indices)
+  memory.close()
+
+  reopened = MemoryMappedTransitionBuffer(16, tmp_path, ram_budget=ram_budget, resume=True)
+  assert len(reopened) == 16
+  for expected_column, column in zip(expected, reopened.get_transitions(indices)):
+    np.testing.assert_array_equal(expected_column, column)
+
+  fill(reopened, 1)  # Resumes at the cursor, overwriting the oldest transition, signal 4, with signal 0
+  np.testing.assert_array_equal(reopened.get_transitions([4]).signal, [0.])
+
+
+def test_flush_interval_persists_without_close(tmp_path):
+  memory = MemoryMappedTransitionBuffer(32, tmp_path, ram_budget=2 ** 20, flush_interval=5)
+  fill(memory, 12)
+
+  reopened = MemoryMappedTransitionBuffer(32, tmp_path, resume=True)
+  assert len(reopened) == 10
+  np.testing.assert_array_equal(reopened.get_transitions(np.arange(10)).signal, np.arange(10))
+
+
+def test_existing_directory_is_not_silently_reused(tmp_path):
+  memory = MemoryMappedTransitionBuffer(8, tmp_path)
+  fill(memory, 3)
+  memory.close()
+
+  with pytest.raises(FileExistsError):
+    MemoryMappedTransitionBuffer(8, tmp_path)
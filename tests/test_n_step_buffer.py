@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+__author__ = 'cnheider'
+
+import numpy as np
+
+from utilities.memory.n_step_buffer import NStepTransitionBuffer
+
+
+def state(i):
+  return np.full(2, i, np.float32)
+
+
+def stored(memory):
+  return memory.get_transitions(np.arange(len(memory)))
+
+
+def test_windows_fold_discounted_signals_and_bootstrap_from_the_latest_successor():
+  memory = NStepTransitionBuffer(16, n_steps=3, discount_factor=.5)
+  for i in range(5):
+    memory.add_transition(state(i), i, float(i + 1), state(i + 1), True)
+
+  batch = stored(memory)
+  np.testing.assert_allclose(batch.signal, [1 + .5 * 2 + .25 * 3, 2 + .5 * 3 + .25 * 4, 3 + .5 * 4 + .25 * 5])
+  np.testing.assert_array_equal(batch.state[:, 0], [0, 1, 2])
+  np.testing.assert_array_equal(batch.successor_state[:, 0], [3, 4, 5])
+  np.testing.assert_allclose(batch.discount, [.125] * 3)
+  assert batch.non_terminal.all()
+
+
+def test_episode_end_truncates_windows_without_bootstrapping():
+  memory = NStepTransitionBuffer(16, n_steps=3, discount_factor=.5)
+  for i in range(4):
+    memory.add_transition(state(i), i, 1., state(i + 1), i < 3)
+  memory.add_transition(state(10), 10, 1., state(11), True)  # The next episode does not fold into the last
+
+  batch = stored(memory)
+  np.testing.assert_array_equal(batch.state[:, 0], [0, 1, 2, 3])
+  np.testing.assert_allclose(batch.signal, [1.75, 1.75, 1.5, 1.])
+  np.testing.assert_array_equal(batch.non_terminal, [True, False, False, False])
+  np.testing.assert_allclose(batch.discount, [.125, .125, .25, .5])
+  np.testing.assert_array_equal(batch.successor_state[1:], np.zeros((3, 2)))
+
+
+def test_environments_fold_separately():
+  memory = NStepTransitionBuffer(16, n_steps=2, discount_factor=1.)
+  for i in range(3):
+    memory.add_transition(state(i), i, 1., state(i + 1), True, env_id=0)
+    memory.add_transition(state(100 + i), i, 10., state(101 + i), True, env_id=1)
+
+  batch = stored(memory)
+  np.testing.assert_array_equal(batch.state[:, 0], [0, 100, 1, 101])
+  np.testing.assert_allclose(batch.signal, [2, 20, 2, 20])
+
+  memory.flush(env_id=1, successor_state=state(103))
+  batch = stored(memory)
+  np.testing.assert_array_equal(batch.state[-1, 0], 102)
+  np.testing.assert_array_equal(batch.successor_state[-1, 0], 103)
+  np.testing.assert_allclose(batch.discount[-1], 1.)
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+__author__ = 'cnheider'
+
+import types
+
+import numpy as np
+import torch.nn.functional as F
+
+from agents.dqn_agent import DQNAgent
+from procedures.parallel_train_agent import replay_train_agent_procedure
+from utilities.persistence.experience import load_experience
+
+
+class CountingEnvironment(object):
+  '''Observes its step count, ends after 10 steps.'''
+
+  observation_space = types.SimpleNamespace(shape=(4,))
+  action_space = types.SimpleNamespace(shape=(2,), n=2)
+
+  def seed(self, seed):
+    self._t = 0
+
+  def reset(self):
+    self._t = 0
+    return np.zeros(4, np.float32)
+
+  def step(self, action):
+    self._t += 1
+    return np.full(4, self._t, np.float32), float(action), self._t == 10, {}
+
+  def close(self):
+    pass
+
+
+class RecordingDQNAgent(DQNAgent):
+  updates = 0
+  memory = None
+
+  def update(self):
+    RecordingDQNAgent.updates += 1
+    return super().update()
+
+  def close(self):
+    RecordingDQNAgent.memory = self._memory
+    super().close()
+
+
+def test_actor_processes_fill_a_shared_memory_the_learner_trains_on(tmp_path):
+  config = types.SimpleNamespace(REPLAY_MEMORY_SIZE=1000,
+                                 EXPERIENCE_DIRECTORY=tmp_path,
+                                 NUM_WORKERS=2,
+                                 SEED=3,
+                                 BATCH_SIZE=16,
+                                 SYNC_TARGET_MODEL_FREQUENCY=5,
+                                 VALUE_ARCH_PARAMETERS=dict(input_size=None,
+                                                            hidden_layers=[8],
+                                                            output_size=None,
+                                                            activation=F.relu,
+                                                            use_bias=True))
+  replay_train_agent_procedure(RecordingDQNAgent, config, CountingEnvironment, steps_per_actor=2000)
+
+  memory = RecordingDQNAgent.memory
+  assert len(memory) == 1000 and memory._cursor_view[0] == 4000
+  assert RecordingDQNAgent.updates > 0
+  batch = memory.sample_transitions(64)
+  np.testing.assert_array_equal(batch.non_terminal, batch.state[:, 0] < 9)
+  assert len(load_experience(tmp_path)) == 1000
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+__author__ = 'cnheider'
+
+import types
+
+import numpy as np
+
+import utilities as U
+from agents.pg_agent import PGAgent
+
+
+class CountingEnvironment(object):
+  '''Observes its step count, signals its actions, terminates after 3 steps.'''
+
+  observation_space = types.SimpleNamespace(shape=(4,), dtype=np.float32)
+  action_space = types.SimpleNamespace(shape=(), n=2)
+
+  def reset(self):
+    self._t = 0
+    return np.zeros(4, np.float32)
+
+  def step(self, action):
+    self._t += 1
+    return np.full(4, self._t, np.float32), float(action), self._t == 3, {}
+
+
+def test_vector_environments_update_once_per_batch_of_steps():
+  agent = PGAgent()
+  agent._input_size = (4,)
+  agent._output_size = (2,)
+  agent._device = 'cpu'
+  agent._infer_input_output_sizes(CountingEnvironment())
+  agent._build()
+
+  losses = []
+  optimise_wrt = agent._optimise_wrt
+  agent._optimise_wrt = lambda loss:(losses.append(loss.item()), optimise_wrt(loss))
+
+  environment = U.SyncVectorEnvironment([CountingEnvironment] * 4)
+  states, signal, entropy = agent.vector_rollout(environment.reset(), environment, n=7)
+
+  assert states.shape == (4, 4) and agent._step_i == 28
+  assert len(losses) == 1 and np.isfinite(losses[0])
+  assert 0 <= signal <= 28 and entropy > 0
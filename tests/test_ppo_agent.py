@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+__author__ = 'cnheider'
+
+import numpy as np
+import torch
+
+from agents.experimental.ppo_agent import PPOAgent
+from procedures.benchmark_inference import action_latencies
+
+
+def ppo_agent(continuous=True, **attributes):
+  agent = PPOAgent()
+  for name, value in attributes.items():
+    setattr(agent, name, value)
+  agent._actor_critic_arch_params['continuous'] = continuous
+  agent._input_size = (4,)
+  agent._output_size = [2]
+  agent._device = 'cpu'
+  agent._environment = None
+  agent._build()
+  return agent
+
+
+def test_update_runs_epochs_of_shuffled_minibatches_over_the_rollout():
+  agent = ppo_agent(_mini_batch_size=5, _ppo_epochs=3)
+  state = np.zeros(4, np.float32)
+  for t in range(12):
+    action, value_estimate, action_log_std = agent.sample_action(state)
+    agent._rollout_storage.insert([state], [action], action_log_std, value_estimate, 1., t != 11)
+  agent.trace_back_steps(None)
+
+  batch_sizes = []
+  evaluate = agent.evaluate
+  agent.evaluate = lambda batch: (batch_sizes.append(len(batch.state)), evaluate(batch))[1]
+  steps = []
+  optimise_wrt = agent._optimise_wrt
+  agent._optimise_wrt = lambda cost: (steps.append(cost), optimise_wrt(cost))
+  agent.update()
+
+  assert batch_sizes == [5, 5, 2] * 3 and len(steps) == 9
+
+
+def test_batched_discrete_sampling_draws_from_the_logits_outside_autograd():
+  agent = ppo_agent(continuous=False)
+  torch.manual_seed(0)
+  states = np.zeros((4000, 4), np.float32)
+  actions, value_estimates, log_probs = agent._sample_model_batch(states, continuous=False)
+
+  assert actions.shape == (4000,) and value_estimates.shape == (4000, 1)
+  assert log_probs.is_inference() and value_estimates.is_inference()
+
+  with torch.no_grad():
+    log_probabilities = agent._actor_critic(torch.zeros(1, 4))[0].log_softmax(-1)[0]
+  np.testing.assert_allclose(log_probs, log_probabilities[actions], rtol=1e-5)
+  np.testing.assert_allclose(np.bincount(actions, minlength=2) / len(actions),
+                             log_probabilities.exp(),
+                             atol=.03)
+
+
+def test_benchmark_times_every_sample_after_the_warm_up():
+  agent = ppo_agent()
+  calls = []
+  sample_model = agent._sample_model
+  agent._sample_model = lambda state: (calls.append(state), sample_model(state))[1]
+
+  latencies = action_latencies(agent, np.zeros(4, np.float32), samples=50, warm_up=5)
+
+  assert latencies.shape == (50,) and (latencies > 0).all() and len(calls) == 55
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+__author__ = 'cnheider'
+
+import numpy as np
+import pytest
+import torch
+import torch.nn.functional as F
+
+import utilities as U
+from agents.ddpg_agent import DDPGAgent
+from agents.dqn_agent import DQNAgent
+from utilities.memory.array_buffer import ArrayTransitionBuffer
+from utilities.memory.prefetching_sampler import PrefetchingSampler
+
+
+def fill(memory, num, state_size=4, action=None):
+  for i in range(num):
+    state = np.full(state_size, i, np.float32)
+    memory.add_transition(state, i % 2 if action is None else action, float(i), state + 1, True)
+  return memory
+
+
+def test_prefetched_batches_are_contiguous_tensors_of_the_memory():
+  sampler = PrefetchingSampler(fill(ArrayTransitionBuffer(100), 50), 16, depth=3)
+  try:
+    for _ in range(10):
+      batch = sampler.sample_transitions(16)
+      assert all(torch.is_tensor(values) and values.is_contiguous() for values in batch)
+      assert batch.state.shape == (16, 4) and batch.state.dtype == torch.float32
+      assert (batch.successor_state[:, 0] == batch.signal + 1).all()
+    assert sampler._queue.qsize() <= 3
+
+    assert len(sampler.sample_transitions(5).signal) == 5  # Other sizes are sampled synchronously
+  finally:
+    sampler.close()
+  assert sampler._thread is None
+
+
+def test_errors_of_the_background_thread_surface_in_sample_transitions():
+  class BrokenMemory(ArrayTransitionBuffer):
+    def sample_transitions(self, num):
+      raise RuntimeError('broken')
+
+  sampler = PrefetchingSampler(fill(BrokenMemory(10), 10), 4)
+  with pytest.raises(RuntimeError, match='broken'):
+    sampler.sample_transitions(4)
+  sampler.close()
+
+
+def test_close_closes_the_wrapped_memory(tmp_path):
+  memory = U.MemoryMappedTransitionBuffer(20, tmp_path)
+  sampler = PrefetchingSampler(fill(memory, 10), 4)
+  sampler.sample_transitions(4)
+  sampler.close()
+  assert len(U.MemoryMappedTransitionBuffer(20, tmp_path, resume=True)) == 10
+
+
+def test_dqn_updates_on_prefetched_batches():
+  agent = DQNAgent()
+  agent._memory = fill(ArrayTransitionBuffer(100), 50)
+  agent._prefetch_depth = 2
+  agent._batch_size = 8
+  agent._value_arch_parameters = dict(input_size=None, hidden_layers=[8], output_size=None,
+                                      activation=F.relu, use_bias=True)
+  agent._input_size, agent._output_size, agent._device = (4,), [2], 'cpu'
+  agent._build()
+  try:
+    assert isinstance(agent._memory, PrefetchingSampler)
+    assert np.isfinite(agent.update())
+  finally:
+    agent.close()
+
+
+def test_ddpg_takes_one_prefetched_batch_per_gradient_step():
+  agent = DDPGAgent()
+  agent._memory = fill(ArrayTransitionBuffer(100), 50, state_size=3, action=np.zeros(1, np.float32))
+  agent._prefetch_depth = 2
+  agent._batch_size = 8
+  agent._input_size, agent._output_size, agent._device = (3,), (1,), 'cpu'
+  agent._build()
+  try:
+    sampled = []
+    sample_transitions = agent._memory.sample_transitions
+    agent._memory.sample_transitions = lambda num: sampled.append(num) or sample_transitions(num)
+    td_error, loss = agent.update(3)
+    assert sampled == [8, 8, 8]
+    assert torch.isfinite(td_error) and torch.isfinite(loss)
+  finally:
+    agent.close()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+__author__ = 'cnheider'
+
+import numpy as np
+
+from utilities.memory.rank_based_buffer import RankBasedReplayBuffer
+
+
+def filled(capacity=64, num=64, **kwargs):
+  memory = RankBasedReplayBuffer(capacity, **kwargs)
+  for i in range(num):
+    state = np.full(2, i, np.float32)
+    memory.add_transition(state, i % 2, float(i), state + 1, True)
+  return memory
+
+
+def assert_valid_heap(memory):
+  size = len(memory)
+  priorities = memory._heap_priorities[:size]
+  children = np.arange(1, size)
+  assert (priorities[(children - 1) // 2] >= priorities[children]).all()
+  np.testing.assert_array_equal(memory._slot_positions[memory._heap_slots[:size]], np.arange(size))
+
+
+def test_updates_keep_the_heap_and_its_index_consistent():
+  memory = filled(sort_frequency=10 ** 6)
+  for _ in range(20):
+    indices = np.random.randint(0, 64, 16)
+    memory.batch_update(indices, np.random.randn(16))
+    assert_valid_heap(memory)
+
+  memory.batch_update([17], [100.])
+  assert memory._heap_slots[0] == 17
+
+
+def test_sorted_heap_positions_are_ranks():
+  memory = filled(sort_frequency=10 ** 6)
+  errors = np.random.rand(64)
+  memory.batch_update(np.arange(64), errors)
+  memory.sort()
+
+  np.testing.assert_array_equal(memory._heap_slots[:64], np.argsort(-errors, kind='stable'))
+  assert_valid_heap(memory)
+
+
+def test_one_rank_is_drawn_per_segment_of_equal_mass_and_weighted_by_its_probability():
+  memory = filled(alpha=.7, beta=.5, beta_increment=0.)
+  memory.batch_update(np.arange(64), np.arange(64, 0, -1))  # Transition i has rank i
+  memory.sort()
+
+  lows, highs, normaliser = memory._segment_boundaries(64, 8)
+  assert memory._segment_boundaries(64, 8)[0] is lows  # Cached
+  masses = np.arange(1, 65) ** -.7 / normaliser
+  segment_masses = [masses[low:high].sum() for low, high in zip(lows, highs)]
+  np.testing.assert_allclose(segment_masses, 1 / 8, atol=masses.max())
+
+  for _ in range(20):
+    indices, batch, weights = memory.sample_transitions(8)
+    assert ((lows <= indices) & (indices < highs)).all()
+    np.testing.assert_array_equal(batch.signal, indices)
+
+    expected = (64 * masses[indices]) ** -.5 / (64 * masses[-1]) ** -.5
+    np.testing.assert_allclose(weights, expected)
+    assert (weights <= 1.).all()
+
+
+def test_overwritten_transitions_enter_with_the_max_priority():
+  memory = filled(capacity=8, num=8, sort_frequency=10 ** 6)
+  memory.batch_update(np.arange(8), np.arange(8) / 10.)
+  state = np.zeros(2, np.float32)
+  memory.add_transition(state, 0, -1., state, True)  # Overwrites transition 0
+
+  assert memory._heap_priorities[memory._slot_positions[0]] == .7  # Ties the top, transition 7
+  assert_valid_heap(memory)
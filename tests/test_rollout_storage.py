@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+__author__ = 'cnheider'
+
+import numpy as np
+import torch
+
+from utilities.memory.rollout_storage import RolloutStorage
+
+
+def fill(storage, steps, num_envs=2):
+  for t in range(steps):
+    storage.insert(np.full((num_envs, 3), t),
+                   np.full((num_envs, 1), t % 2),
+                   np.zeros((num_envs, 1)),
+                   np.full(num_envs, .5),
+                   np.arange(num_envs) + t,
+                   np.ones(num_envs, dtype=np.bool_))
+  return storage
+
+
+def test_columns_are_reused_and_grow_past_the_preallocated_steps():
+  storage = fill(RolloutStorage(4, num_envs=2), 4)
+  columns = storage.columns['state']
+  storage.clear()
+  fill(storage, 4)
+  assert storage.columns['state'] is columns
+
+  fill(storage, 3)
+  assert len(storage) == 14 and storage.columns['state'].shape == (8, 2, 3)
+  np.testing.assert_array_equal(storage.columns['state'][:7, 0, 0].numpy(), [0, 1, 2, 3, 0, 1, 2])
+
+
+def test_advantages_are_computed_in_place():
+  storage = fill(RolloutStorage(5, num_envs=2), 5)
+  storage.compute_advantages(torch.zeros(2), discount_factor=1., tau=1.)
+
+  returns = storage.columns['discounted_return'][:5].numpy()
+  np.testing.assert_allclose(returns[:, 0], [10, 10, 9, 7, 4])
+  np.testing.assert_allclose(storage.columns['advantage'][:5].numpy(), returns - .5)
+
+
+def test_minibatches_visit_every_step_once_per_epoch():
+  storage = fill(RolloutStorage(6, num_envs=2), 6)
+  batches = list(storage.minibatches(5, epochs=3))
+  assert [len(batch.state) for batch in batches] == [5, 5, 2] * 3
+
+  for epoch in range(3):
+    states = torch.cat([batch.state for batch in batches[3 * epoch:3 * epoch + 3]])
+    assert sorted(states[:, 0].tolist()) == sorted(list(range(6)) * 2)
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+__author__ = 'cnheider'
+
+import numpy as np
+
+from utilities.memory.data_structures.segment_tree import MinSegmentTree, SumSegmentTree
+
+
+def test_batched_set_matches_scalar_set():
+  values = np.random.rand(20)
+  indices = np.random.randint(0, 32, size=20)  # With duplicates, the last value wins
+
+  batched, scalar = SumSegmentTree(32), SumSegmentTree(32)
+  batched[indices] = values
+  for index, value in zip(indices, values):
+    scalar[int(index)] = value
+
+  np.testing.assert_allclose(batched._value, scalar._value)
+  np.testing.assert_allclose(batched.sum(), scalar.sum())
+  np.testing.assert_allclose(batched.sum(3, 17), scalar[np.arange(3, 17)].sum())
+
+
+def test_batched_prefix_sum_matches_scalar_search():
+  tree = SumSegmentTree(16)
+  tree[np.arange(16)] = np.random.rand(16)
+
+  prefix_sums = np.random.rand(100) * tree.sum()
+  indices = tree.find_prefix_sum_idx(prefix_sums)
+
+  assert [tree.find_prefix_sum_idx(float(prefix_sum)) for prefix_sum in prefix_sums] == indices.tolist()
+  cumulative = np.cumsum(tree[np.arange(16)])
+  np.testing.assert_array_equal(indices, np.searchsorted(cumulative, prefix_sums, side='right'))
+
+
+def test_min_tree():
+  tree = MinSegmentTree(8)
+  tree[np.arange(8)] = [5., 3., 7., 3., 9., 1., 4., 6.]
+
+  assert tree.min() == 1.
+  assert tree.min(0, 4) == 3.
+  tree[np.array([5, 1])] = [8., 2.]
+  assert tree.min() == 2.
+  assert tree.min(2, 8) == 3.
+
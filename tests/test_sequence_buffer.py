@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+__author__ = 'cnheider'
+
+import numpy as np
+
+from utilities.memory.sequence_buffer import SequenceReplayBuffer
+
+
+def play(memory, length, env_id=0, offset=0):
+  for t in range(offset, offset + length):
+    terminal = t == offset + length - 1
+    hidden_state = (np.full(3, t, np.float32), np.full(3, -t, np.float32))
+    memory.add_transition(np.full(2, t, np.float32),
+                          t % 2,
+                          float(t),
+                          None if terminal else np.full(2, t + 1, np.float32),
+                          not terminal,
+                          hidden_state=hidden_state,
+                          env_id=env_id)
+
+
+def test_overlapping_windows_with_burn_in_and_a_padded_episode_end():
+  memory = SequenceReplayBuffer(10, sequence_length=4, burn_in=2)
+  play(memory, 9)
+
+  assert len(memory) == 3  # Windows of 6 steps starting every 2 steps at 0, 2 and 4
+  batch = memory.get_transitions(np.arange(3))
+  assert batch.state.shape == (6, 3, 2)  # Time-major
+  np.testing.assert_array_equal(batch.signal[:, 0], [0, 1, 2, 3, 4, 5])
+  np.testing.assert_array_equal(batch.signal[:, 1], [2, 3, 4, 5, 6, 7])
+  np.testing.assert_array_equal(batch.signal[:, 2], [4, 5, 6, 7, 8, 0])
+  np.testing.assert_array_equal(batch.mask[:, 2], [True] * 5 + [False])
+  assert batch.mask[:, :2].all()
+  np.testing.assert_array_equal(batch.non_terminal[:, 2], [True] * 4 + [False] * 2)
+  np.testing.assert_array_equal(batch.successor_state[4, 2], np.zeros(2))
+
+
+def test_hidden_states_are_those_before_the_first_step_of_each_window():
+  memory = SequenceReplayBuffer(10, sequence_length=4, burn_in=2)
+  play(memory, 9)
+
+  h, c = memory.get_transitions(np.arange(3)).hidden_state
+  np.testing.assert_array_equal(h[:, 0], [0, 2, 4])
+  np.testing.assert_array_equal(c[:, 0], [0, -2, -4])
+
+
+def test_parallel_environments_form_separate_windows_and_flush_cut_off_episodes():
+  memory = SequenceReplayBuffer(10, sequence_length=3, stride=3)
+  for t in range(4):
+    for env_id in (0, 1):
+      memory.add_transition(np.full(2, 10 * env_id + t, np.float32), 0, float(10 * env_id + t),
+                            np.full(2, 10 * env_id + t + 1, np.float32), True, env_id=env_id)
+  assert len(memory) == 2
+
+  memory.flush()  # Both environments hold one transition not yet in a stored window
+  batch = memory.get_transitions(np.arange(len(memory)))
+  assert len(memory) == 4
+  np.testing.assert_array_equal(batch.signal.T, [[0, 1, 2], [10, 11, 12], [3, 0, 0], [13, 0, 0]])
+  np.testing.assert_array_equal(batch.mask.T[2:], [[True, False, False]] * 2)
+  assert batch.hidden_state is None
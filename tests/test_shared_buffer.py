@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+__author__ = 'cnheider'
+
+import threading
+import time
+
+import numpy as np
+import pytest
+import torch.multiprocessing as MP
+
+from utilities.memory.shared_buffer import SharedTransitionBuffer
+
+
+def add(memory, value):
+  state = np.full(4, value, np.float32)
+  memory.add_transition(state, 0, float(value), state + 1, True)
+
+
+def _actor(memory, actor_id, steps):
+  for step in range(steps):
+    add(memory, actor_id * 100000 + step)
+
+
+def test_actor_processes_wrapping_the_buffer_never_leave_torn_rows():
+  memory = SharedTransitionBuffer(64, state_shape=(4,))
+  actors = [MP.get_context('fork').Process(target=_actor, args=(memory, actor_id, 3000))
+            for actor_id in range(1, 4)]
+  for actor in actors:
+    actor.start()
+
+  while any(actor.is_alive() for actor in actors):
+    if len(memory):
+      batch = memory.sample_transitions(32)
+      assert (batch.state == batch.signal[:, None]).all()
+      assert (batch.successor_state == batch.signal[:, None] + 1).all()
+  for actor in actors:
+    actor.join()
+
+  assert len(memory) == 64
+  assert memory._cursor_view[0] == 9000
+  assert (memory._stamp_view > 9000 - 64).all()
+
+
+def test_a_writer_waits_for_the_previous_lap_to_finish_its_slot():
+  memory = SharedTransitionBuffer(4, state_shape=(4,))
+  for i in range(4):
+    add(memory, i)
+  memory._stamp_view[0] = -1  # Slot 0 still written by serial 0
+
+  writer = threading.Thread(target=add, args=(memory, 4))
+  writer.start()
+  time.sleep(.05)
+  assert memory._cursor_view[0] == 4 and memory.get_transitions([1]).signal[0] == 1
+
+  memory._stamp_view[0] = 1
+  writer.join()
+  assert memory._cursor_view[0] == 5
+  np.testing.assert_array_equal(memory.get_transitions([0]).signal, [4])
+
+
+def test_requested_rows_being_written_are_gathered_again_not_replaced():
+  memory = SharedTransitionBuffer(8, state_shape=(4,))
+  for i in range(8):
+    add(memory, i)
+  memory._stamp_view[2] = -3
+
+  def complete_write():
+    time.sleep(.05)
+    memory._stamp_view[2] = 3
+
+  threading.Thread(target=complete_write).start()
+  np.testing.assert_array_equal(memory.get_transitions([2, 2, 5]).signal, [2, 2, 5])
+
+
+def test_gathering_unwritten_slots_raises():
+  memory = SharedTransitionBuffer(8, state_shape=(4,))
+  add(memory, 0)
+  with pytest.raises(IndexError):
+    memory.get_transitions([3])
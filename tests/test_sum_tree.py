@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+__author__ = 'cnheider'
+
+import numpy as np
+
+from utilities.memory.data_structures.sum_tree import SumTree
+
+
+def test_sum_tree_batch_update_matches_sequential_updates():
+  capacity = 13  # Not a power of two, leaves sit at different depths
+  batched, sequential = SumTree(capacity), SumTree(capacity)
+  for i in range(capacity):
+    batched.add(1., i)
+    sequential.add(1., i)
+
+  indices = np.random.randint(capacity - 1, 2 * capacity - 1, size=30)
+  priorities = np.random.rand(30)
+  batched.batch_update(indices, priorities)
+  for index, priority in zip(indices, priorities):
+    sequential.update(int(index), priority)
+
+  np.testing.assert_allclose(batched._tree, sequential._tree)
+
+
+def test_sum_tree_retrieval_follows_the_priorities():
+  tree = SumTree(8)
+  priorities = [1., 0., 2., 3., 4., 0., 0., 1.]
+  for i, priority in enumerate(priorities):
+    tree.add(priority, i)
+
+  masses = np.array([0.5, 1.5, 2.5, 3.5, 5.5, 9.5, 10.5])
+  data = tree._data[tree._retrieve(masses) - tree._capacity + 1]
+  np.testing.assert_array_equal(data, [0, 2, 2, 3, 3, 4, 7])
+
+
+def test_sum_tree_samples_never_hit_zero_priorities():
+  tree = SumTree(5)
+  priorities = np.array([1., 0., 2., 3., 4.])
+  for i, priority in enumerate(priorities):
+    tree.add(priority, i)
+
+  _, sampled_priorities, sampled_data = tree.sample(64)
+  assert 1 not in sampled_data
+  np.testing.assert_array_equal(sampled_priorities, priorities[sampled_data.astype(np.int64)])
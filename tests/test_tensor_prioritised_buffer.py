@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+__author__ = 'cnheider'
+
+import numpy as np
+import pytest
+import torch
+
+from utilities.memory.tensor_prioritised_buffer import TensorPrioritisedReplayBuffer
+
+
+def filled(capacity=4, num=4, **kwargs):
+  memory = TensorPrioritisedReplayBuffer(capacity, **kwargs)
+  for i in range(num):
+    state = np.full(2, i, np.float32)
+    memory.add_transition(state, i % 2, float(i), state + 1, True)
+  return memory
+
+
+def test_sampling_is_proportional_to_the_priorities():
+  memory = filled(alpha=1., epsilon=0.)
+  memory.batch_update(torch.arange(4), torch.tensor([1., 2., 3., 4.]))
+
+  counts = np.zeros(4)
+  for _ in range(200):
+    indices, batch, _ = memory.sample_transitions(50)
+    np.testing.assert_array_equal(batch.signal, indices.numpy())  # Rows follow the sampled indices
+    counts += np.bincount(indices.numpy(), minlength=4)
+
+  np.testing.assert_allclose(counts / counts.sum(), [.1, .2, .3, .4], atol=.01)
+
+
+def test_importance_weights_correct_for_the_sampling_probabilities():
+  memory = filled(alpha=.5, beta=.4, beta_increment=.1, epsilon=0.)
+  memory.batch_update(torch.arange(4), torch.tensor([1., 4., 9., 16.]))  # Priorities 1, 2, 3, 4
+
+  indices, _, weights = memory.sample_transitions(8)
+  probabilities = (indices.numpy() + 1) / 10
+  expected = (4 * probabilities) ** -.4
+  np.testing.assert_allclose(weights.numpy(), expected / expected.max(), rtol=1e-5)
+  assert memory._beta == pytest.approx(.5)  # Annealed towards 1 by every sample
+
+
+def test_new_transitions_get_the_max_priority_and_zero_priorities_are_never_sampled():
+  memory = filled(capacity=8, num=2, alpha=1., epsilon=0.)
+  memory.batch_update(torch.tensor([0, 1]), torch.tensor([0., 5.]))
+  state = np.zeros(2, np.float32)
+  memory.add_transition(state, 0, 2., state, True)
+
+  np.testing.assert_allclose(memory._priorities[:3].numpy(), [0., 5., 5.])
+  indices, _, _ = memory.sample_transitions(256)
+  assert 0 not in indices.tolist()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+__author__ = 'cnheider'
+
+import numpy as np
+import torch.nn.functional as F
+
+from agents.dqn_agent import DQNAgent
+from utilities.memory.trajectory_store import TrajectoryStore
+
+
+class CountingEnvironment(object):
+  '''Deterministic, starts at its seed and adds the actions, terminates after `episode_length` steps.'''
+
+  steps = 0
+
+  def __init__(self, episode_length=5):
+    self._episode_length = episode_length
+    self._seed = 0
+    self._value = 0.
+    self._t = 0
+
+  def seed(self, seed):
+    self._seed = seed
+
+  def reset(self):
+    self._value, self._t = float(self._seed % 1000), 0
+    return self._observation()
+
+  def step(self, action):
+    CountingEnvironment.steps += 1
+    self._value += action
+    self._t += 1
+    return self._observation(), 1., self._t == self._episode_length, {}
+
+  def close(self):
+    pass
+
+  def _observation(self):
+    return np.full(4, self._value, np.float32)
+
+
+def restore(environment, observation):
+  environment._value = float(observation[0])
+
+
+def record(store, environment, actions, seed, finish=True):
+  state = store.reset_episode(environment, seed=seed)
+  for i, action in enumerate(actions):
+    successor_state, signal, terminated, _ = environment.step(action)
+    store.add_transition(state, action, signal, successor_state, not finish or i + 1 < len(actions))
+    state = successor_state
+
+
+def assert_regenerated(batch):
+  for state, action, successor_state, non_terminal in zip(batch.state,
+                                                          batch.action,
+                                                          batch.successor_state,
+                                                          batch.non_terminal):
+    assert successor_state is None if not non_terminal else successor_state[0] == state[0] + action
+
+
+def test_the_episode_being_recorded_is_never_dropped():
+  store = TrajectoryStore(CountingEnvironment, capacity=10, checkpoint_interval=4)
+  environment = CountingEnvironment(episode_length=100)
+  record(store, environment, [1] * 5, seed=7)
+  record(store, environment, [1] * 25, seed=3, finish=False)
+  assert len(store) == 25 and len(store._episodes) == 1
+  assert_regenerated(store.sample_transitions(32))
+
+  record(store, environment, [1] * 4, seed=5)  # The cut off episode is finished by the next
+  assert len(store) == 4 and store._episodes[0].seed == 5
+
+
+def test_regeneration_starts_from_the_closest_checkpoint():
+  environment = CountingEnvironment(episode_length=100)
+  unrestored = TrajectoryStore(CountingEnvironment, checkpoint_interval=10)
+  restored = TrajectoryStore(CountingEnvironment, checkpoint_interval=10, restore_function=restore)
+
+  steps = []
+  for store in (unrestored, restored):
+    record(store, environment, [2] * 40, seed=1)
+    np.random.seed(0)
+    CountingEnvironment.steps = 0
+    for _ in range(20):
+      batch = store.sample_transitions(1)
+      assert_regenerated(batch)
+      assert batch.state[0][0] % 2 == 1
+    steps.append(CountingEnvironment.steps)
+
+  assert steps[1] <= 20 * 10 < steps[0]
+
+
+def test_agents_reset_their_episodes_through_the_store():
+  store = TrajectoryStore(CountingEnvironment, checkpoint_interval=2)
+  agent = DQNAgent()
+  agent._memory = store
+  agent._batch_size = 1000
+  agent._value_arch_parameters = dict(input_size=None,
+                                      hidden_layers=[16],
+                                      output_size=None,
+                                      activation=F.relu,
+                                      use_bias=True)
+  agent._input_size = (4,)
+  agent._output_size = [2]
+  agent._device = 'cpu'
+  agent._build()
+
+  environment = CountingEnvironment()
+  for _ in range(3):
+    agent.rollout(agent._reset_environment(environment), environment)
+
+  assert len(store) == 15 and len({episode.seed for episode in store._episodes}) == 3
+
+  assert_regenerated(store.sample_transitions(64))
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+__author__ = 'cnheider'
+
+import types
+
+import numpy as np
+import pytest
+
+from utilities.environment_wrappers.vector_environment import (SubprocessVectorEnvironment,
+                                                               SyncVectorEnvironment)
+
+
+class CountingEnvironment(object):
+  '''Observes its step count, terminates after `episode_length` steps.'''
+
+  observation_space = types.SimpleNamespace(shape=(4,), dtype=np.float32)
+  action_space = types.SimpleNamespace(shape=(), n=2)
+
+  def __init__(self, episode_length=3):
+    self._episode_length = episode_length
+    self._t = 0
+
+  def seed(self, seed=None):
+    return seed
+
+  def reset(self):
+    self._t = 0
+    return np.zeros(4, np.float32)
+
+  def step(self, action):
+    self._t += 1
+    return np.full(4, self._t, np.float32), float(action), self._t == self._episode_length, {}
+
+  def render(self, *args, **kwargs):
+    pass
+
+  def close(self):
+    pass
+
+
+def counting_environment_factories(*episode_lengths):
+  return [lambda length=length:CountingEnvironment(length) for length in episode_lengths]
+
+
+@pytest.mark.parametrize('pool', [SyncVectorEnvironment, SubprocessVectorEnvironment])
+def test_pools_reset_terminated_environments(pool):
+  environment = pool(counting_environment_factories(2, 3))
+  try:
+    np.testing.assert_array_equal(environment.reset(), np.zeros((2, 4)))
+
+    environment.step([1, 0])
+    observations, signals, terminated, infos = environment.step([1, 0])
+    np.testing.assert_array_equal(signals, [1, 0])
+    np.testing.assert_array_equal(terminated, [True, False])
+    np.testing.assert_array_equal(observations[:, 0], [0, 2])
+    np.testing.assert_array_equal(infos[0]['terminal_observation'], np.full(4, 2))
+
+    assert environment.seed(7) == [7, 8]
+  finally:
+    environment.close()
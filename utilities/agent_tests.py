@@ -5,6 +5,7 @@ from itertools import count
 from neodroid.wrappers.action_encoding_wrappers import BinaryActionEncodingWrapper
 
 __author__ = 'cnheider'
+import functools
 import glob
 import os
 
@@ -15,7 +16,12 @@ import gym
 
 def regular_train_agent_procedure(agent_type, config, environment=None):
   if not environment:
-    if '-v' in config.ENVIRONMENT_NAME:
+    num_workers = getattr(config, 'NUM_WORKERS', 1)
+    if '-v' in config.ENVIRONMENT_NAME and num_workers > 1 and agent_type.vectorised_training:
+      environment = U.SubprocessVectorEnvironment(
+          [functools.partial(gym.make, config.ENVIRONMENT_NAME)] * num_workers
+          )
+    elif '-v' in config.ENVIRONMENT_NAME:
       environment = gym.make(config.ENVIRONMENT_NAME)
     else:
       environment = BinaryActionEncodingWrapper(name=config.ENVIRONMENT_NAME,
@@ -33,8 +39,10 @@ def regular_train_agent_procedure(agent_type, config, environment=None):
   listener.start()
   try:
     models, stats = agent.train(environment, config.ROLLOUTS, render=config.RENDER_ENVIRONMENT)
+    U.save_agent_experience(agent, config)
   finally:
     listener.stop()
+    agent.close()
 
   identifier = count()
   if isinstance(models, list):
@@ -1,7 +1,9 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import copy
 from abc import ABC
 
+import torch
 from torch import nn
 
 __author__ = 'cnheider'
@@ -11,3 +13,94 @@ class Architecture(nn.Module, ABC):
 
   def __init__(self):
     super().__init__()
+    self._flat_parameters = None
+    self._flat_gradients = None
+    self._flat_ends = None  # First and last parameter, whose storage reveals if the views are intact
+
+  def flatten_parameters(self):
+    '''
+Lays all parameters, and their gradients, out as views into one contiguous buffer each, so updates
+touching every parameter, eg. target network updates and gradient clamping, become single tensor
+operations on `flat_parameters` and `flat_gradients`. The parameter objects are kept, so optimisers
+constructed before flattening stay valid. Parameters must share device and dtype.
+
+Modules holding recurrent layers are left as they are, cuDNN manages the layout of their weights itself.
+
+:return: The flat parameter buffer, None if the module was left as it is
+'''
+    if any(isinstance(module, nn.RNNBase) for module in self.modules()):
+      return None
+
+    parameters = list(self.parameters())
+    self._flat_parameters = torch.cat([parameter.detach().reshape(-1) for parameter in parameters])
+    self._flat_gradients = torch.cat([torch.zeros_like(parameter).reshape(-1) if parameter.grad is None
+                                      else parameter.grad.detach().reshape(-1)
+                                      for parameter in parameters])
+    self._flat_ends = (parameters[0], parameters[-1])
+    self._attach_views(parameters, data=True)
+    return self._flat_parameters
+
+  @property
+  def flat_parameters(self):
+    '''
+The contiguous parameter buffer, None unless flattened or when the parameters no longer are views of it,
+eg. after `parameter.data` was reassigned.
+'''
+    if self._flat_parameters is None or not self._are_views(self._flat_parameters, lambda p:p):
+      return None
+    return self._flat_parameters
+
+  @property
+  def flat_gradients(self):
+    '''
+The contiguous gradient buffer, None unless flattened or when gradients no longer are views of it, eg.
+after an optimiser zeroed them with `set_to_none`. `zero_grad` of the module reattaches them.
+'''
+    if self._flat_gradients is None or not self._are_views(self._flat_gradients, lambda p:p.grad):
+      return None
+    return self._flat_gradients
+
+  def zero_grad(self, set_to_none=True):
+    '''Zeroes the flat gradient buffer in one operation when flattened, keeping the gradient views.'''
+    if self._flat_gradients is None:
+      super().zero_grad(set_to_none=set_to_none)
+      return
+
+    self._flat_gradients.zero_()
+    if self.flat_gradients is None:
+      self._attach_views(self.parameters(), data=False)
+
+  def __deepcopy__(self, memo):
+    '''Copies keep their own flat buffers, a plain deep copy would detach the copied views from them.'''
+    module = type(self).__new__(type(self))
+    memo[id(self)] = module
+    for key, value in self.__dict__.items():
+      module.__dict__[key] = copy.deepcopy(value, memo)
+    if self._flat_parameters is not None:
+      module.flatten_parameters()
+    return module
+
+  def _apply(self, fn, *args, **kwargs):
+    module = super()._apply(fn, *args, **kwargs)
+    if self._flat_parameters is not None:
+      first = next(self.parameters())
+      if first.data_ptr() != self._flat_parameters.data_ptr() or first.dtype != self._flat_parameters.dtype:
+        self.flatten_parameters()  # Moved to another device or dtype, parameters are no longer views
+    return module
+
+  def _are_views(self, buffer, tensor_of):
+    '''Checks the first and last parameter only, so the check stays O(1) in the number of parameters.'''
+    first, last = (tensor_of(parameter) for parameter in self._flat_ends)
+    if first is None or last is None:
+      return False
+    end = buffer.data_ptr() + (buffer.numel() - last.numel()) * buffer.element_size()
+    return first.data_ptr() == buffer.data_ptr() and last.data_ptr() == end
+
+  def _attach_views(self, parameters, data):
+    offset = 0
+    for parameter in parameters:
+      numel = parameter.numel()
+      if data:
+        parameter.data = self._flat_parameters[offset:offset + numel].view_as(parameter)
+      parameter.grad = self._flat_gradients[offset:offset + numel].view_as(parameter)
+      offset += numel
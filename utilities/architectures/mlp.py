@@ -9,7 +9,7 @@ Description: Multi Layer Perceptron
 Author: Christian Heider Nielsen
 '''
 import torch
-from torch import nn, Tensor
+from torch import nn
 from torch.nn import functional as F
 
 
@@ -35,6 +35,7 @@ OOOO hidden_layer_size * (Weights,Biases)
 
     previous_layer_size = self._input_size[0]
 
+    self._layers = []  # Plain list of the registered fc layers, forward does not look them up by name
     self.num_of_layer = len(self._hidden_layers)
     if self.num_of_layer > 0:
       for i in range(1, self.num_of_layer + 1):
@@ -43,6 +44,7 @@ OOOO hidden_layer_size * (Weights,Biases)
             )
         # fan_in_init(layer.weight)
         setattr(self, f'fc{i}', layer)
+        self._layers.append(layer)
         previous_layer_size = self._hidden_layers[i - 1]
 
     self.head = nn.Linear(
@@ -55,18 +57,15 @@ OOOO hidden_layer_size * (Weights,Biases)
 :param x:
 :return output:
 '''
-    assert type(x) is Tensor
-
     # if hasattr(self, 'num_of_layer'): # Safer but slower
     #  for i in range(1, self.num_of_layer + 1):
     #    if hasattr(self, 'fc' + str(i)):
     #      layer = getattr(self, 'fc' + str(i))
     #      x = F.relu(layer(x))
 
-    for i in range(1, self.num_of_layer + 1):
-      layer = getattr(self, f'fc{i}')
-      x = layer(x)
-      x = self._activation(x)
+    activation = self._activation
+    for layer in self._layers:
+      x = activation(layer(x))
 
     return self.head(x)
 
@@ -85,12 +84,14 @@ class MultiHeadedMLP(MLP):
 
     self._heads = heads
 
+    self._subheads = []
     self.num_of_heads = len(self._heads)
     if self.num_of_heads > 0:
       for i in range(self.num_of_heads):
         head = nn.Linear(self._output_size[0], self._heads[i])
         # fan_in_init(layer.weight)
         setattr(self, f'subhead{str(i + 1)}', head)
+        self._subheads.append(head)
     else:
       raise ValueError('Number of head must be >0')
 
@@ -98,8 +99,7 @@ class MultiHeadedMLP(MLP):
     x = super().forward(x, **kwargs)
 
     output = []
-    for i in range(1, self.num_of_heads + 1):
-      head = getattr(self, 'subhead' + str(i))
+    for head in self._subheads:
       sub_res = head(x)
       if type(sub_res) is not list:
         sub_res = [sub_res]
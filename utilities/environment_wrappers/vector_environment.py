@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+__author__ = 'cnheider'
+'''
+Description: Pools of environments stepped together, in-process or in subprocesses
+Author: Christian Heider Nielsen
+'''
+
+import numpy as np
+import torch
+import torch.multiprocessing as MP
+
+
+class VectorEnvironment(object):
+  '''
+Steps `num_envs` gym style environments as one. `reset` returns the stacked observations [N, ...] and
+`step` takes one action per environment and returns the stacked observations, signals [N], terminated
+flags [N] and a list of infos.
+
+Environments are reset as soon as they terminate, the observation returned for a terminated environment
+is the first of its next episode and its last observation is kept in `info['terminal_observation']`.
+'''
+
+  def __init__(self, num_envs, observation_space, action_space):
+    self._num_envs = num_envs
+    self.observation_space = observation_space
+    self.action_space = action_space
+
+  def reset(self):
+    raise NotImplementedError
+
+  def step(self, actions):
+    raise NotImplementedError
+
+  def seed(self, seed=None):
+    '''Seeds environment i with `seed + i`.'''
+    raise NotImplementedError
+
+  def render(self, *args, **kwargs):
+    '''Renders the first environment.'''
+    raise NotImplementedError
+
+  def close(self):
+    raise NotImplementedError
+
+  @property
+  def num_envs(self):
+    return self._num_envs
+
+  def __len__(self):
+    return self._num_envs
+
+
+class SyncVectorEnvironment(VectorEnvironment):
+  '''
+Steps its environments one after the other in the calling process, for environments so cheap to step
+that subprocesses would only add overhead.
+'''
+
+  def __init__(self, environment_factories):
+    '''
+
+:param environment_factories: Callables each constructing one environment
+:type environment_factories: list
+'''
+    self._environments = [factory() for factory in environment_factories]
+    first = self._environments[0]
+    super().__init__(len(self._environments), first.observation_space, first.action_space)
+    self._observations = None
+
+  def reset(self):
+    observations = [np.asarray(environment.reset()) for environment in self._environments]
+    if self._observations is None:
+      self._observations = np.zeros((self._num_envs, *observations[0].shape),
+                                    dtype=_observation_dtype(self.observation_space, observations[0]))
+    for index, observation in enumerate(observations):
+      self._observations[index] = observation
+    return self._observations.copy()
+
+  def step(self, actions):
+    signals = np.zeros(self._num_envs, dtype=np.float32)
+    terminated = np.zeros(self._num_envs, dtype=np.bool_)
+    infos = []
+    for index, (environment, action) in enumerate(zip(self._environments, actions)):
+      observation, signals[index], terminated[index], info = _step_and_reset(environment, action)
+      self._observations[index] = observation
+      infos.append(info)
+
+    return self._observations.copy(), signals, terminated, infos
+
+  def seed(self, seed=None):
+    return [environment.seed(None if seed is None else seed + index)
+            for index, environment in enumerate(self._environments)]
+
+  def render(self, *args, **kwargs):
+    return self._environments[0].render(*args, **kwargs)
+
+  def close(self):
+    for environment in self._environments:
+      environment.close()
+
+
+class SubprocessVectorEnvironment(VectorEnvironment):
+  '''
+Steps every environment in its own process, for environments whose step is expensive compared to a
+round trip through a pipe. Workers write their observations into one shared memory array, so only
+actions, signals, terminated flags and infos are pickled.
+
+Environment factories are sent to the workers, with the 'spawn' start method they must be picklable,
+eg. `functools.partial(gym.make, 'CartPole-v0')`.
+'''
+
+  def __init__(self, environment_factories, start_method=None):
+    '''
+
+:param environment_factories: Callables each constructing one environment
+:type environment_factories: list
+:param start_method: multiprocessing start method of the workers, defaults to the platform default
+:type start_method: str
+'''
+    context = MP.get_context(start_method)
+    self._remotes = []
+    self._processes = []
+    for factory in environment_factories:
+      remote, worker_remote = context.Pipe()
+      process = context.Process(target=_worker, args=(worker_remote, factory), daemon=True)
+      process.start()
+      worker_remote.close()
+      self._remotes.append(remote)
+      self._processes.append(process)
+
+    observation_space, action_space = [remote.recv() for remote in self._remotes][0]
+    super().__init__(len(self._remotes), observation_space, action_space)
+
+    dtype = torch.from_numpy(np.zeros(0, dtype=_observation_dtype(observation_space))).dtype
+    self._shared_observations = torch.zeros((self._num_envs, *observation_space.shape),
+                                            dtype=dtype).share_memory_()
+    self._observations = self._shared_observations.numpy()
+    self._call_all([('buffer', (self._shared_observations, index)) for index in range(self._num_envs)])
+    self._closed = False
+
+  def reset(self):
+    self._call_all([('reset', None)] * self._num_envs)
+    return self._observations.copy()
+
+  def step(self, actions):
+    results = self._call_all([('step', action) for action in actions])
+    signals, terminated, infos = zip(*results)
+    return (self._observations.copy(),
+            np.asarray(signals, dtype=np.float32),
+            np.asarray(terminated, dtype=np.bool_),
+            list(infos))
+
+  def seed(self, seed=None):
+    return self._call_all([('seed', None if seed is None else seed + index)
+                           for index in range(self._num_envs)])
+
+  def render(self, *args, **kwargs):
+    self._remotes[0].send(('render', (args, kwargs)))
+    return self._remotes[0].recv()
+
+  def close(self):
+    if self._closed:
+      return
+    for remote in self._remotes:
+      remote.send(('close', None))
+    for process in self._processes:
+      process.join()
+    self._closed = True
+
+  def _call_all(self, messages):
+    for remote, message in zip(self._remotes, messages):  # Send everything first so workers run in parallel
+      remote.send(message)
+    return [remote.recv() for remote in self._remotes]
+
+
+def _worker(remote, environment_factory):
+  environment = environment_factory()
+  remote.send((environment.observation_space, environment.action_space))
+
+  observations, index = None, None
+  try:
+    while True:
+      command, data = remote.recv()
+      if command == 'step':
+        observation, signal, terminated, info = _step_and_reset(environment, data)
+        observations[index] = observation
+        remote.send((signal, terminated, info))
+      elif command == 'reset':
+        observations[index] = environment.reset()
+        remote.send(None)
+      elif command == 'seed':
+        remote.send(environment.seed(data))
+      elif command == 'render':
+        args, kwargs = data
+        remote.send(environment.render(*args, **kwargs))
+      elif command == 'buffer':
+        shared_observations, index = data
+        observations = shared_observations.numpy()
+        remote.send(None)
+      elif command == 'close':
+        break
+  except KeyboardInterrupt:
+    pass
+  finally:
+    environment.close()
+    remote.close()
+
+
+def _step_and_reset(environment, action):
+  observation, signal, terminated, info = environment.step(action)
+  if terminated:
+    info = {**(info or {}), 'terminal_observation':observation}
+    observation = environment.reset()
+  return observation, signal, terminated, info
+
+
+def _observation_dtype(observation_space, example=None):
+  dtype = getattr(observation_space, 'dtype', None)
+  if dtype is None and example is not None:
+    dtype = example.dtype
+  if dtype is None or np.issubdtype(dtype, np.floating):
+    return np.dtype(np.float32)
+  return np.dtype(dtype)
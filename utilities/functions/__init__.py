@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 __author__ = 'cnheider'
 
+from .discounting import *
 from .generalised_advantage_estimation import *
 
 
@@ -18,12 +19,8 @@ def kl_log_probs(log_p1, log_p2):
 
 
 def _discount_reward(self, signals, value):
-  discounted_r = np.zeros_like(signals)
-  running_add = value
-  for t in reversed(range(0, len(signals))):
-    running_add = running_add * self.gamma + signals[t]
-    discounted_r[t] = running_add
-  return discounted_r
+  discounted_r = discounted_returns(signals, self.gamma, bootstrap=value)
+  return discounted_r.cpu().numpy().astype(np.asarray(signals).dtype)
 
 
 # choose an action based on state with random noise added for exploration in training
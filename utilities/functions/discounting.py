@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+__author__ = 'cnheider'
+'''
+Description: Vectorised discounted return kernel
+Author: Christian Heider Nielsen
+'''
+
+import numpy as np
+import torch
+
+
+def discounted_returns(signals, discount_factor=0.99, non_terminals=None, bootstrap=None, block_size=8):
+  '''
+Computes `G_t = r_t + discount_factor * m_t * G_{t+1}` backwards over the leading time axis, with
+`G_T = bootstrap`. Instead of a Python loop over every step, time is split into blocks of `block_size`
+steps solved in one batched product each, the returns at the block boundaries are solved the same way,
+so T steps take about log_{block_size}(T) batched passes.
+
+:param signals: Signals of shape [T] or [T, ...], eg. [T, N] for N parallel environments
+:param discount_factor: Discount factor
+:param non_terminals: Optional masks broadcastable to the signals, 0 where the episode ended at step t so
+its return does not bootstrap from step t + 1
+:param bootstrap: Optional value estimates of the states following the last step, broadcastable to
+signals[0]
+:param block_size: Number of steps solved together, at least 2
+:return: Discounted returns as a float tensor of the shape of `signals`, on its device
+'''
+  assert block_size >= 2, 'block_size must be at least 2, blocks of one step never shorten the scan'
+  signals = _as_float_tensor(signals)
+  shape = signals.shape
+  device = signals.device
+  T = shape[0]
+  if T == 0:
+    return signals
+  signals = signals.reshape(T, -1)
+  N = signals.shape[1]
+
+  coefficients = torch.full_like(signals, discount_factor)
+  if non_terminals is not None:
+    coefficients = coefficients * _as_float_tensor(non_terminals, device).reshape(T, -1).expand(T, N)
+
+  tail = torch.zeros(N, device=device)
+  if bootstrap is not None:
+    tail = tail + _as_float_tensor(bootstrap, device).reshape(-1)
+
+  return _scan(signals, coefficients, tail, block_size)[:T].reshape(shape)
+
+
+def _scan(signals, coefficients, tail, block_size):
+  '''Solves `G_t = r_t + c_t * G_{t+1}` for [T, N] signals and coefficients with `G_T = tail`.'''
+  T, N = signals.shape
+  B = min(block_size, T)
+  blocks = -(-T // B)
+  padding = blocks * B - T
+  if padding:  # Pad to whole blocks with steps passing the following return through unchanged
+    signals = torch.cat([signals, signals.new_zeros(padding, N)])
+    coefficients = torch.cat([coefficients, coefficients.new_ones(padding, N)])
+  signals = signals.view(blocks, B, N)
+  coefficients = coefficients.view(blocks, B, N)
+
+  # products[b, t, k] = c_t * ... * c_k within block b for k >= t, the discount of G_{k+1} in G_t
+  steps = torch.arange(B, device=signals.device)
+  upper = (steps[None, :] >= steps[:, None])[None, :, :, None]
+  products = torch.where(upper, coefficients[:, None, :, :], coefficients.new_ones(())).cumprod(dim=2)
+  weights = torch.cat([torch.ones_like(products[:, :, :1]), products[:, :, :-1]], dim=2) * upper
+
+  local = torch.einsum('btkn,bkn->btn', weights, signals)  # Returns if every block was followed by zero
+  carry = products[:, :, -1]  # Discount of the return following the block
+
+  # The returns at the block starts follow the same recurrence, one step per block
+  if blocks > 1:
+    starts = _scan(local[:, 0], carry[:, 0], tail, block_size)[:blocks]
+    successors = torch.cat([starts[1:], tail[None]])
+  else:
+    successors = tail[None]
+
+  return (local + carry * successors[:, None, :]).reshape(blocks * B, N)
+
+
+def _as_float_tensor(values, device=None):
+  if isinstance(values, (list, tuple)) and len(values) and torch.is_tensor(values[0]):
+    values = torch.stack(list(values))
+  return torch.as_tensor(values, dtype=torch.float, device=device)
+
+
+if __name__ == '__main__':
+  import time
+
+  def scalar_returns(signals, non_terminals, discount_factor):
+    R = 0
+    returns = []
+    for signal, non_terminal in zip(reversed(signals), reversed(non_terminals)):
+      R = signal + discount_factor * R * non_terminal
+      returns.insert(0, R)
+    return returns
+
+  signals = np.random.rand(10000)
+  non_terminals = np.random.rand(10000) > .001
+
+  start = time.perf_counter()
+  expected = scalar_returns(signals.tolist(), non_terminals.tolist(), .99)
+  scalar = time.perf_counter() - start
+
+  start = time.perf_counter()
+  returns = discounted_returns(signals, .99, non_terminals)
+  vectorised = time.perf_counter() - start
+
+  assert np.allclose(returns.numpy(), expected, rtol=1e-4, atol=1e-3)
+  print(f'10k steps: scalar loop {scalar * 1000:.2f} ms, kernel {vectorised * 1000:.2f} ms')
@@ -6,62 +6,76 @@ __author__ = 'cnheider'
 import numpy as np
 import torch
 
-import utilities as U
+from utilities.functions.discounting import _as_float_tensor, discounted_returns
 
 
-def generalised_advantage_estimate(
-    n_step_summary, discount_factor=0.99, tau=0.95, device='cpu'
-    ):
+def generalised_advantage_estimate(signals,
+                                   value_estimates,
+                                   non_terminals,
+                                   bootstrap=None,
+                                   discount_factor=0.99,
+                                   tau=0.95,
+                                   device='cpu',
+                                   scripted=False):
   '''
-compute GAE(lambda) advantages and discounted returns
-
-  :param n_step_summary:
-  :param device:
-:param use_cuda:
-:type use_cuda:
-:param signals:
-:type signals:
-:param value_estimates:
-:type value_estimates:
-:param non_terminals:
-:type non_terminals:
-:param discount_factor:
-:type discount_factor:
-:param tau:
-:type tau:
-:return:
-:rtype:
+Computes GAE(lambda) advantages and returns over [T] or [T, N] rollouts of N parallel environments in one
+reverse pass. The TD errors `d_t = r_t + discount_factor * m_t * V_{t+1} - V_t` are discounted by
+`discount_factor * tau` with `discounted_returns`, and the returns are the advantages plus the value
+estimates.
+
+:param signals: Signals of shape [T] or [T, N]
+:param value_estimates: Value estimates of the visited states, reshaped to the shape of the signals
+:param non_terminals: Masks of the shape of the signals, 0 where the episode of an environment ended at
+step t
+:param bootstrap: Optional value estimates of the states following the last step, one per environment,
+treated as 0 when omitted
+:param discount_factor: Discount factor
+:param tau: GAE lambda
+:param device: Device of the returned tensors
+:param scripted: Use the TorchScript compiled reverse loop instead of the blocked kernel
+:return: advantages and returns, float tensors of the shape of the signals
+:rtype: tuple
 '''
+  signals = _as_float_tensor(signals, device)
+  shape = signals.shape
+  T = shape[0]
+  signals = signals.reshape(T, -1)
+  value_estimates = _as_float_tensor(value_estimates, device).reshape(signals.shape)
+  non_terminals = _as_float_tensor(non_terminals, device).reshape(signals.shape)
+
+  successor_values = torch.zeros_like(signals)
+  successor_values[:-1] = value_estimates[1:]
+  if bootstrap is not None:
+    successor_values[-1] = _as_float_tensor(bootstrap, device).reshape(-1)
+
+  td_errors = signals + discount_factor * non_terminals * successor_values - value_estimates
+
+  if scripted:
+    advantages = _scripted_gae()(td_errors, non_terminals, discount_factor * tau)
+  else:
+    advantages = discounted_returns(td_errors, discount_factor * tau, non_terminals=non_terminals)
+
+  returns = advantages + value_estimates
+  return advantages.reshape(shape), returns.reshape(shape)
+
+
+def _gae_loop(td_errors: torch.Tensor, non_terminals: torch.Tensor, decay: float) -> torch.Tensor:
+  advantages = torch.empty_like(td_errors)
+  advantage = torch.zeros_like(td_errors[0])
+  for t in range(td_errors.size(0) - 1, -1, -1):
+    advantage = td_errors[t] + decay * non_terminals[t] * advantage
+    advantages[t] = advantage
+  return advantages
 
-  signals = U.to_tensor(n_step_summary.signal, device=device, dtype=torch.float)
-
-  non_terminals = U.to_tensor(n_step_summary.non_terminal, device=device, dtype=torch.float)
-
-  value_estimates = U.to_tensor(n_step_summary.value_estimate, device=device, dtype=torch.float)
-
-  T = signals.size()
-  T = T[0]
-  num_workers = 1
-  # T,num_workers,_  = signals.size()
-
-  advs = torch.zeros(T, num_workers, 1).to(device)
-  advantage_now = torch.zeros(num_workers, 1).to(device)
-
-  for t in reversed(range(T - 1)):
-    signal_now = signals[t]
-    value_future = value_estimates[t + 1]
-    value_now = value_estimates[t]
-    non_terminal_now = non_terminals[t]
-
-    td_error = signal_now + value_future * discount_factor * non_terminal_now - value_now
-
-    advantage_now = advantage_now * discount_factor * tau * non_terminal_now + td_error
 
-    advs[t] = advantage_now
+_scripted_gae_loop = None
 
-  advantages = advs.squeeze()
 
-  return advantages
+def _scripted_gae():
+  global _scripted_gae_loop
+  if _scripted_gae_loop is None:  # Compiled on first use, scripting at import time slows every start up
+    _scripted_gae_loop = torch.jit.script(_gae_loop)
+  return _scripted_gae_loop
 
 
 '''
@@ -129,9 +143,5 @@ def mean_std_groups(x, y, group_size):
 
 
 def compute_returns(next_value, rewards, masks, discount_factor=0.99):
-  R = next_value
-  returns = []
-  for step in reversed(range(len(rewards))):
-    R = rewards[step] + discount_factor * R * masks[step]
-    returns.insert(0, R)
-  return returns
+  returns = discounted_returns(rewards, discount_factor, non_terminals=masks, bootstrap=next_value)
+  return list(returns)
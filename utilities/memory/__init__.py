@@ -5,7 +5,21 @@ __author__ = 'cnheider'
 from utilities.memory.data_structures.segment_tree import *
 from utilities.memory.data_structures.sum_tree import *
 from utilities.memory.transition import *
+from .array_buffer import *
+from .codecs import *
+from .deduplicated_buffer import *
+from .eviction import *
 from .expandable_circular_buffer import *
 from .experience_memory import *
+from .frame_buffer import *
 from .frontier import *
+from .memory_mapped_buffer import *
+from .n_step_buffer import *
+from .prefetching_sampler import *
+from .rank_based_buffer import *
+from .rollout_storage import *
 from .scrap import *
+from .sequence_buffer import *
+from .shared_buffer import *
+from .tensor_prioritised_buffer import *
+from .trajectory_store import *
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+__author__ = 'cnheider'
+'''
+Description: Replay memory storing transitions as preallocated numpy columns
+Author: Christian Heider Nielsen
+'''
+
+import numpy as np
+import torch
+
+from utilities.memory.codecs import ChunkedCompressedColumn
+from utilities.memory.transition import Transition
+
+
+class ArrayTransitionBuffer(object):
+  '''
+Fixed capacity ring buffer storing transitions struct-of-arrays style, one preallocated numpy column per
+field of `Transition`. Columns are allocated on the first insert, when the shapes of the stored values
+are known, and never reallocated afterwards.
+
+Fields can be given a `StorageCodec`, eg. `Uint8Codec` for pixels or `Float16Codec` for low dimensional
+states, values are encoded on insert and sampled batches are decoded as a whole.
+
+Once full, the oldest transition is overwritten unless an `EvictionPolicy` chooses otherwise, subclasses
+that rely on the write order, eg. the hot tail of `MemoryMappedTransitionBuffer` or the n-step windows of
+`NStepTransitionBuffer`, refuse eviction policies. Policies ranking transitions by priority, eg.
+`LowestPriorityEviction`, are fed through `update_priorities`.
+
+Sampled batches are `Transition`s of contiguous arrays, ready for `torch.from_numpy`.
+'''
+
+  _transition_type = Transition
+  _default_dtypes = {'signal':np.float32, 'non_terminal':np.bool_}
+  _shape_aliases = {'successor_state':'state'}  # Terminal successors are None, borrow the shape of state
+
+  def __init__(self, capacity, dtypes=None, codecs=None, eviction=None):
+    '''
+
+:param capacity: Max number of transitions to store, the oldest transitions are overwritten when full
+:type capacity: int
+:param dtypes: Optional mapping of field name to the numpy dtype of its column, floating point fields
+default to float32
+:type dtypes: dict
+:param codecs: Optional mapping of field name to the `StorageCodec` of its column
+:type codecs: dict
+:param eviction: Optional `EvictionPolicy` choosing the transition overwritten when full, defaults to
+the oldest
+:type eviction: EvictionPolicy
+'''
+    self._capacity = capacity
+    self._dtypes = {**self._default_dtypes, **(dtypes or {})}
+    self._codecs = codecs or {}
+    self._eviction = eviction
+    if eviction is not None:
+      eviction.reset(capacity)
+    self._columns = None
+    self._position = 0
+    self._size = 0
+
+  def add_transition(self, *args):
+    self.add(self._transition_type(*args))
+
+  def add(self, transition):
+    '''Saves a transition, returns the index it was written to or None if the eviction policy dropped it.'''
+    index = self._position
+    if self._eviction is not None and self._size == self._capacity:
+      index = self._eviction.select()
+      if index is None:
+        return None
+
+    values = [_as_array(value) for value in transition]
+    if self._columns is None:
+      self._columns = self._allocate(values)
+
+    self._write(index, self._encode(values))
+    if self._eviction is not None:
+      self._eviction.inserted(index, transition)
+
+    self._position = (self._position + 1) % self._capacity
+    self._size = min(self._size + 1, self._capacity)
+    return index
+
+  def extend(self, batch):
+    '''
+Saves a batch of transitions, a namedtuple of equally long sequences. Batches of arrays are written
+with one assignment per column where the memory allows it.
+'''
+    values = list(batch)
+    if not len(values[0]):
+      return
+
+    if not all(isinstance(value, np.ndarray) and value.dtype != np.object_ for value in values):
+      for transition in zip(*values):
+        self.add(self._transition_type(*transition))
+      return
+
+    if self._columns is None and len(values[0]):
+      self.add(self._transition_type(*[value[0] for value in values]))
+      values = [value[1:] for value in values]
+
+    if not self._bulk_writable():
+      for transition in zip(*values):
+        self.add(self._transition_type(*transition))
+      return
+
+    total = len(values[0])
+    count = min(total, self._capacity)  # Only the last `capacity` transitions survive the batch
+    values = [value[total - count:] for value in values]
+    positions = (self._position + total - count + np.arange(count)) % self._capacity
+    for field, value in zip(self._transition_type._fields, self._encode(values)):
+      self._columns[field][positions] = value
+
+    self._position = (self._position + total) % self._capacity
+    self._size = min(self._size + total, self._capacity)
+
+  def export_columns(self, chunk_size=2 ** 20):
+    '''
+Yields the stored transitions in write order, oldest first, as chunks of at most `chunk_size` rows.
+Chunks are dicts of field name to column values in their storage dtype, ie. still encoded by codecs.
+'''
+    if self._columns is None:
+      return
+
+    first = (self._position - self._size) % self._capacity
+    for start in range(0, self._size, chunk_size):
+      indices = (first + np.arange(start, min(start + chunk_size, self._size))) % self._capacity
+      yield {field:_as_array(values)
+             for field, values in zip(self._transition_type._fields, self._gather(indices))}
+
+  def sample_indices(self, num):
+    return np.random.randint(0, self._size, size=num)
+
+  def sample_transitions(self, num):
+    '''Uniformly sample (with replacement) a batch of transitions.'''
+    return self.get_transitions(self.sample_indices(num))
+
+  def get_transitions(self, indices):
+    return self._decode(self._gather(indices))
+
+  def update_priorities(self, indices, priorities):
+    '''
+Feeds the priorities of stored transitions, eg. their absolute TD errors, to an eviction policy ranking
+transitions by priority.
+
+:param indices: Indices of the transitions, eg. from `sample_indices`
+:param priorities: Array, list or tensor of priorities
+'''
+    if self.evicts_by_priority:
+      self._eviction.update(_as_array(indices).reshape(-1), _as_array(priorities).reshape(-1))
+
+  def clear(self):
+    self._position = 0
+    self._size = 0
+    if self._eviction is not None:
+      self._eviction.clear()
+
+  @property
+  def transition_type(self):
+    return self._transition_type
+
+  @property
+  def codecs(self):
+    return self._codecs
+
+  @property
+  def eviction(self):
+    return self._eviction
+
+  @property
+  def evicts_by_priority(self):
+    return hasattr(self._eviction, 'update')
+
+  @property
+  def columns(self):
+    return self._columns
+
+  @property
+  def capacity(self):
+    return self._capacity
+
+  @property
+  def nbytes(self):
+    if self._columns is None:
+      return 0
+    return sum(column.nbytes for column in self._columns.values())
+
+  def __len__(self):
+    return self._size
+
+  def _encode(self, values):
+    return [self._codecs[field].encode(value) if field in self._codecs and value is not None else value
+            for field, value in zip(self._transition_type._fields, values)]
+
+  def _decode(self, values):
+    fields = self._transition_type._fields
+    decoded = [self._codecs[field].decode(value) if field in self._codecs else value
+               for field, value in zip(fields, values)]
+
+    if 'non_terminal' in fields:  # Stored zeros decode to `low` with Uint8Codec, re-zero terminal successors
+      terminal = ~np.asarray(values[fields.index('non_terminal')], dtype=np.bool_)
+      if terminal.any():
+        for field in self._shape_aliases:
+          if field in self._codecs:
+            decoded[fields.index(field)][terminal] = 0
+
+    return self._transition_type(*decoded)
+
+  def _gather(self, indices):
+    return [self._columns[field][indices] for field in self._transition_type._fields]
+
+  def _bulk_writable(self):
+    return (self._eviction is None
+            and type(self).add is ArrayTransitionBuffer.add
+            and type(self)._write is ArrayTransitionBuffer._write
+            and all(type(column) is np.ndarray for column in self._columns.values()))
+
+  def _write(self, index, values):
+    for field, value in zip(self._transition_type._fields, values):
+      column = self._columns[field]
+      if value is None:
+        column[index] = 0
+      else:
+        column[index] = value
+
+  def _allocate(self, values):
+    examples = dict(zip(self._transition_type._fields, values))
+
+    columns = {}
+    for field, value in examples.items():
+      if value is None:
+        value = examples.get(self._shape_aliases.get(field))
+      if value is None:
+        raise ValueError(f'Can not infer the shape of field "{field}" from its first value')
+
+      dtype = self._column_dtype(field, value)
+      if field in self._codecs:
+        dtype = self._codecs[field].storage_dtype(dtype)
+      columns[field] = self._allocate_column(field, value.shape, dtype)
+
+    return columns
+
+  def _allocate_column(self, field, shape, dtype):
+    return np.zeros((self._capacity, *shape), dtype=dtype)
+
+  def _column_dtype(self, field, value):
+    if field in self._dtypes:
+      return np.dtype(self._dtypes[field])
+    if np.issubdtype(value.dtype, np.floating):
+      return np.dtype(np.float32)
+    return value.dtype
+
+
+class CompressedTransitionBuffer(ArrayTransitionBuffer):
+  '''
+An `ArrayTransitionBuffer` whose state columns are chunked, with all but the most recently written chunks
+zlib compressed, see `ChunkedCompressedColumn`. Combines with codecs, which are applied before
+compression.
+'''
+
+  def __init__(self,
+               capacity,
+               compressed_fields=('state', 'successor_state'),
+               chunk_size=16,
+               hot_chunks=2,
+               compression_level=1,
+               **kwargs):
+    super().__init__(capacity, **kwargs)
+    self._compressed_fields = compressed_fields
+    self._chunk_size = chunk_size
+    self._hot_chunks = hot_chunks
+    self._compression_level = compression_level
+
+  def _allocate_column(self, field, shape, dtype):
+    if field not in self._compressed_fields:
+      return super()._allocate_column(field, shape, dtype)
+    return ChunkedCompressedColumn(self._capacity,
+                                   shape,
+                                   dtype,
+                                   chunk_size=self._chunk_size,
+                                   hot_chunks=self._hot_chunks,
+                                   level=self._compression_level)
+
+
+def _as_array(value):
+  if value is None:
+    return None
+  if torch.is_tensor(value):
+    return value.detach().cpu().numpy()
+  return np.asarray(value)
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+__author__ = 'cnheider'
+'''
+Description: Compact storage encodings for replay memory columns
+Author: Christian Heider Nielsen
+'''
+
+import zlib
+from collections import deque
+
+import numpy as np
+
+
+class StorageCodec(object):
+  '''
+Maps the values of a column to a compact storage dtype on write and back on read, `decode` always
+receives whole sampled batches.
+'''
+
+  def storage_dtype(self, dtype):
+    return dtype
+
+  def encode(self, values):
+    return values
+
+  def decode(self, values):
+    return values
+
+
+class Uint8Codec(StorageCodec):
+  '''Quantises values in [low, high], eg. pixels normalised to [0, 1], to 256 levels.'''
+
+  def __init__(self, low=0., high=1.):
+    self._low = low
+    self._scale = (high - low) / 255.
+
+  def storage_dtype(self, dtype):
+    return np.dtype(np.uint8)
+
+  def encode(self, values):
+    return np.clip(np.rint((values - self._low) / self._scale), 0, 255).astype(np.uint8)
+
+  def decode(self, values):
+    return values.astype(np.float32) * np.float32(self._scale) + np.float32(self._low)
+
+
+class Float16Codec(StorageCodec):
+  '''Half precision storage, for low dimensional states.'''
+
+  def storage_dtype(self, dtype):
+    return np.dtype(np.float16)
+
+  def encode(self, values):
+    return np.asarray(values, dtype=np.float16)
+
+  def decode(self, values):
+    return values.astype(np.float32)
+
+
+class ChunkedCompressedColumn(object):
+  '''
+Column of fixed size rows split into chunks of `chunk_size` rows. Chunks are allocated when first written,
+the `hot_chunks` most recently written chunks are kept as plain arrays and the rows of older chunks are
+zlib compressed one by one. Reads only decompress the rows they gather, a cold row costs one
+decompression of a single row, about 12us for an 84x84 uint8 frame, see the measurements of this module.
+'''
+
+  def __init__(self, capacity, shape, dtype, chunk_size=16, hot_chunks=2, level=1):
+    self.shape = (capacity, *shape)
+    self.dtype = np.dtype(dtype)
+
+    self._row_shape = tuple(shape)
+    self._chunk_size = chunk_size
+    self._hot_chunks = hot_chunks
+    self._level = level
+
+    self._chunks = [None] * -(-capacity // chunk_size)  # None, a hot array or a list of compressed rows
+    self._hot = deque()
+
+  def __setitem__(self, index, value):
+    chunk_id, row = divmod(index, self._chunk_size)
+    chunk = self._chunks[chunk_id]
+    if not isinstance(chunk, np.ndarray):
+      chunk = self._make_hot(chunk_id)
+    chunk[row] = value
+
+  def __getitem__(self, indices):
+    indices = np.asarray(indices)
+    chunk_ids, rows = np.divmod(indices, self._chunk_size)
+
+    values = np.zeros((len(indices), *self._row_shape), dtype=self.dtype)
+    for i, (chunk_id, row) in enumerate(zip(chunk_ids.tolist(), rows.tolist())):
+      chunk = self._chunks[chunk_id]
+      if isinstance(chunk, np.ndarray):
+        values[i] = chunk[row]
+      elif chunk is not None:
+        values[i] = np.frombuffer(zlib.decompress(chunk[row]), dtype=self.dtype).reshape(self._row_shape)
+    return values
+
+  @property
+  def nbytes(self):
+    return sum(chunk.nbytes if isinstance(chunk, np.ndarray) else sum(map(len, chunk))
+               for chunk in self._chunks if chunk is not None)
+
+  def _make_hot(self, chunk_id):
+    self._chunks[chunk_id] = chunk = self._load(chunk_id)
+
+    self._hot.append(chunk_id)
+    while len(self._hot) > self._hot_chunks:
+      cold_id = self._hot.popleft()
+      self._chunks[cold_id] = [zlib.compress(row.tobytes(), self._level) for row in self._chunks[cold_id]]
+
+    return chunk
+
+  def _load(self, chunk_id):
+    rows = min(self._chunk_size, self.shape[0] - chunk_id * self._chunk_size)
+    chunk = np.zeros((rows, *self._row_shape), dtype=self.dtype)
+    if self._chunks[chunk_id] is not None:
+      for row, compressed in enumerate(self._chunks[chunk_id]):
+        chunk[row] = np.frombuffer(zlib.decompress(compressed), dtype=self.dtype).reshape(self._row_shape)
+    return chunk
+
+
+if __name__ == '__main__':
+  import time
+
+  from utilities.memory.array_buffer import ArrayTransitionBuffer, CompressedTransitionBuffer
+
+  def atari_like_frames(num, size=84):
+    '''Mostly flat backgrounds with a few moving sprites, compressible like real game screens.'''
+    frames = np.full((num, size, size), .2, dtype=np.float32)
+    frames[:, 60:, :] = .5
+    for t in range(num):
+      x, y = (3 * t) % (size - 8), (5 * t) % (size - 8)
+      frames[t, y:y + 8, x:x + 8] = 1.
+    return frames
+
+  def measure(name, memory, frames, batch_size=32, batches=200):
+    for t in range(len(frames) - 1):
+      memory.add_transition(frames[t], t % 4, 0., frames[t + 1], True)
+
+    start = time.perf_counter()
+    for _ in range(batches):
+      memory.sample_transitions(batch_size)
+    sample_time = (time.perf_counter() - start) / batches
+    return name, memory.nbytes, sample_time
+
+  frames = atari_like_frames(20001)
+  capacity = len(frames) - 1
+  uint8 = {'state':Uint8Codec(), 'successor_state':Uint8Codec()}
+  results = [measure('float32', ArrayTransitionBuffer(capacity), frames),
+             measure('uint8', ArrayTransitionBuffer(capacity, codecs=uint8), frames)]
+  for chunk_size in (16, 1024):
+    memory = CompressedTransitionBuffer(capacity, chunk_size=chunk_size, codecs=uint8)
+    results.append(measure(f'uint8 + zlib/{chunk_size}', memory, frames))
+
+  baseline_bytes, baseline_time = results[0][1], results[0][2]
+  for name, nbytes, sample_time in results:
+    print(f'{name:>19}: {nbytes / 2 ** 20:7.1f} MiB, compression {baseline_bytes / nbytes:5.1f}x, '
+          f'batch of 32 sampled and decoded in {sample_time * 1e6:7.0f} us '
+          f'(+{(sample_time - baseline_time) * 1e6:.0f} us)')
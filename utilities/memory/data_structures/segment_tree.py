@@ -2,7 +2,7 @@
 # -*- coding: utf-8 -*-
 __author__ = 'cnheider'
 
-import operator
+import numpy as np
 
 
 class SegmentTree(object):
@@ -22,12 +22,15 @@ important differences:
        a contiguous subsequence of items in the
        array.
 
+The nodes are kept in a flat numpy array, so items can also be read and written
+for whole arrays of indices at once, eg. `tree[indices] = priorities`.
+
 Parameters
 ---------
 capacity: int
     Total size of the array - must be a power of two.
-operation: lambda obj, obj -> obj
-    and operation for combining elements (eg. sum, max)
+operation: numpy.ufunc
+    and operation for combining elements (eg. np.add, np.minimum)
     must for a mathematical group together with the set of
     possible values for array elements.
 neutral_element: obj
@@ -38,24 +41,11 @@ neutral_element: obj
         capacity > 0 and capacity & (capacity - 1) == 0
     ), 'capacity must be positive and a power of 2.'
     self._capacity = capacity
-    self._value = [neutral_element for _ in range(2 * capacity)]
+    self._depth = capacity.bit_length() - 1
+    self._neutral_element = neutral_element
+    self._value = np.full(2 * capacity, neutral_element, dtype=np.float64)
     self._operation = operation
 
-  def _reduce_helper(self, start, end, node, node_start, node_end):
-    if start == node_start and end == node_end:
-      return self._value[node]
-    mid = (node_start + node_end) // 2
-    if end <= mid:
-      return self._reduce_helper(start, end, 2 * node, node_start, mid)
-    else:
-      if mid + 1 <= start:
-        return self._reduce_helper(start, end, 2 * node + 1, mid + 1, node_end)
-      else:
-        return self._operation(
-            self._reduce_helper(start, mid, 2 * node, node_start, mid),
-            self._reduce_helper(mid + 1, end, 2 * node + 1, mid + 1, node_end),
-            )
-
   def reduce(self, start=0, end=None):
     '''Returns result of applying `self.operation`
 to a contiguous subsequence of the array.
@@ -78,30 +68,53 @@ reduced: obj
       end = self._capacity
     if end < 0:
       end += self._capacity
-    end -= 1
-    return self._reduce_helper(start, end, 1, 0, self._capacity - 1)
+
+    result = self._neutral_element
+    start += self._capacity
+    end += self._capacity
+    while start < end:  # Bottom up over the half open range [start, end)
+      if start & 1:
+        result = self._operation(result, self._value[start])
+        start += 1
+      if end & 1:
+        end -= 1
+        result = self._operation(result, self._value[end])
+      start //= 2
+      end //= 2
+    return float(result)
 
   def __setitem__(self, idx, val):
-    # index of the leaf
-    idx += self._capacity
-    self._value[idx] = val
-    idx //= 2
-    while idx >= 1:
-      self._value[idx] = self._operation(
-          self._value[2 * idx], self._value[2 * idx + 1]
-          )
+    if np.isscalar(idx):
+      # index of the leaf
+      idx += self._capacity
+      self._value[idx] = val
       idx //= 2
+      while idx >= 1:
+        self._value[idx] = self._operation(
+            self._value[2 * idx], self._value[2 * idx + 1]
+            )
+        idx //= 2
+    else:
+      # batched update, every leaf is at the same depth so each pass recomputes one level
+      idx = np.asarray(idx) + self._capacity
+      self._value[idx] = val
+      idx = np.unique(idx // 2)
+      for _ in range(self._depth):
+        self._value[idx] = self._operation(
+            self._value[2 * idx], self._value[2 * idx + 1]
+            )
+        idx = np.unique(idx // 2)
 
   def __getitem__(self, idx):
-    assert 0 <= idx < self._capacity
-    return self._value[self._capacity + idx]
+    assert np.all((0 <= np.asarray(idx)) & (np.asarray(idx) < self._capacity))
+    return self._value[self._capacity + np.asarray(idx)]
 
 
 class SumSegmentTree(SegmentTree):
 
   def __init__(self, capacity):
     super().__init__(
-        capacity=capacity, operation=operator.add, neutral_element=0.0
+        capacity=capacity, operation=np.add, neutral_element=0.0
         )
 
   def sum(self, start=0, end=None):
@@ -117,27 +130,36 @@ if array values are probabilities, this function
 allows to sample indexes according to the discrete
 probability efficiently.
 
+`prefix_sum` may also be an array of upper bounds, in which case all of them descend
+the tree together and an array of indices is returned.
+
 Parameters
 ----------
 :param prefix_sum: upper bound on the sum of array prefix
-:type prefix_sum: float
+:type prefix_sum: float or numpy.ndarray
 '''
-    assert 0 <= prefix_sum <= self.sum() + 1e-5
-    idx = 1
-    while idx < self._capacity:  # while non-leaf
-      if self._value[2 * idx] > prefix_sum:
-        idx = 2 * idx
-      else:
-        prefix_sum -= self._value[2 * idx]
-        idx = 2 * idx + 1
-    return idx - self._capacity
+    scalar = np.isscalar(prefix_sum)
+    prefix_sum = np.array(prefix_sum, dtype=np.float64, ndmin=1)
+    assert np.all((0 <= prefix_sum) & (prefix_sum <= self.sum() + 1e-5))
+
+    idx = np.ones(prefix_sum.shape, dtype=np.int64)
+    for _ in range(self._depth):  # while non-leaf
+      left = self._value[2 * idx]
+      go_right = left <= prefix_sum
+      prefix_sum -= left * go_right
+      idx = 2 * idx + go_right
+
+    idx -= self._capacity
+    if scalar:
+      return int(idx[0])
+    return idx
 
 
 class MinSegmentTree(SegmentTree):
 
   def __init__(self, capacity):
     super().__init__(
-        capacity=capacity, operation=min, neutral_element=float('inf')
+        capacity=capacity, operation=np.minimum, neutral_element=float('inf')
         )
 
   def min(self, start=0, end=None):
@@ -2,39 +2,51 @@
 # -*- coding: utf-8 -*-
 import math
 
+import numpy as np
+
 __author__ = 'cnheider'
 
 
-class SumTree:
+class SumTree(object):
+  '''
+Sum tree laid out in a flat array, leaves at `capacity - 1 ... 2 * capacity - 2`, internal node `i` has
+children `2 * i + 1` and `2 * i + 2`. All walks are iterative and whole arrays of queries or updates are
+processed together.
+'''
 
   def __init__(self, capacity):
     self._capacity = capacity
-    self._updates = 0
+    self._size = 0
     self._write = 0
-    # self.tree = np.zeros(2 * capacity - 1)
-    # self.data = np.zeros(capacity, dtype=object)
-    self._tree = [0 for i in range(2 * capacity - 1)]
-    self._data = [None for i in range(capacity)]
-
-  def __propagate__(self, idx, change):
-    parent = (idx - 1) // 2
-
-    self._tree[parent] += change
-
-    if parent != 0:
-      self.__propagate__(parent, change)
-
-  def _retrieve(self, idx, s):
-    left = 2 * idx + 1
-    right = left + 1
-
-    if left >= len(self._tree):
-      return idx
-
-    if s <= self._tree[left]:
-      return self._retrieve(left, s)
-    else:
-      return self._retrieve(right, s - self._tree[left])
+    self._tree = np.zeros(2 * capacity - 1)
+    self._data = np.empty(capacity, dtype=object)
+
+  def _propagate(self, idx, change):
+    while idx != 0:
+      idx = (idx - 1) // 2
+      self._tree[idx] += change
+
+  def _retrieve(self, s):
+    '''
+Descends from the root for every mass in `s` at once.
+
+:param s: array of masses in [0, total)
+:return: array of leaf indices into the tree
+'''
+    s = np.array(s, dtype=np.float64, ndmin=1)
+    idx = np.zeros(s.shape, dtype=np.int64)
+    leaf_start = self._capacity - 1
+
+    internal = idx < leaf_start
+    while internal.any():  # Leaves are not all at the same depth unless capacity is a power of two
+      left = np.where(internal, 2 * idx + 1, 0)
+      left_value = self._tree[left]
+      go_right = internal & (s > left_value)
+      s = np.where(go_right, s - left_value, s)
+      idx = np.where(internal, left + go_right, idx)
+      internal = idx < leaf_start
+
+    return idx
 
   def total(self):
     return self._tree[0]
@@ -45,42 +57,80 @@ class SumTree:
     self._data[self._write] = data
     self.update(idx, p)
 
-    self._updates += 1
     self._write += 1
     if self._write >= self._capacity:
       self._write = 0
+    self._size = min(self._size + 1, self._capacity)
 
   def update(self, idx, p):
     change = p - self._tree[idx]
 
     self._tree[idx] = p
-    self.__propagate__(idx, change)
+    self._propagate(idx, change)
+
+  def batch_update(self, indices, priorities):
+    '''
+Sets the priorities of a whole vector of tree indices, then recomputes every touched ancestor from its
+children. A node is recomputed again whenever one of its children changed in the previous pass, so the
+last recomputation of each node always sees final child values.
+
+:param indices: tree indices as returned by `get` or `sample`
+:param priorities: new priorities, duplicated indices take the last value
+'''
+    idx = np.asarray(indices, dtype=np.int64)
+    self._tree[idx] = priorities
+
+    idx = np.unique((idx[idx > 0] - 1) // 2)
+    while idx.size:
+      self._tree[idx] = self._tree[2 * idx + 1] + self._tree[2 * idx + 2]
+      idx = np.unique((idx[idx > 0] - 1) // 2)
 
   def get(self, s):
-    idx = self._retrieve(0, s)
-    dataIdx = idx - self._capacity + 1
+    idx = int(self._retrieve(s)[0])
+    data_idx = idx - self._capacity + 1
 
-    return (idx, self._tree[idx], self._data[dataIdx])
+    return (idx, self._tree[idx], self._data[data_idx])
+
+  def sample(self, n):
+    '''
+Stratified sampling, splits the total priority into `n` equal segments and draws one mass uniformly from
+each, all `n` descents run as one vectorised walk.
+
+:param n: number of samples
+:return: tree indices, priorities and data of the samples
+'''
+    segment = self.total() / n
+    s = (np.arange(n) + np.random.uniform(size=n)) * segment
+    idx = self._retrieve(s)
+
+    return idx, self._tree[idx], self._data[idx - self._capacity + 1]
 
   def __len__(self):
-    # return len(self.tree) #TODO: DOES NOT RETURN NUMBER OF ELEMENTS ADDED BUT TREE INDEX SIZE
-    return self._updates
+    return self._size
 
   def max_priority(self):
-    return max(self._tree)
+    return self._tree[self._capacity - 1:].max()
 
 
 class SumTree2(object):
+  '''
+Perfect binary sum tree over `max_size` leaves stored in a numpy array, with batched leaf updates and an
+O(n) rebuild of the internal nodes from the leaves.
+'''
 
   def __init__(self, max_size):
     self.max_size = max_size
     self.tree_level = int(math.ceil(math.log(max_size + 1, 2))) + 1
     self.tree_size = int(2 ** self.tree_level - 1)
-    self.tree = [0 for _ in range(self.tree_size)]
+    self.tree = np.zeros(self.tree_size)
     self.data = [None for _ in range(self.max_size)]
     self.size = 0
     self.cursor = 0
 
+  @property
+  def leaf_offset(self):
+    return 2 ** (self.tree_level - 1) - 1
+
   def add(self, contents, value):
     index = self.cursor
     self.cursor = (self.cursor + 1) % self.max_size
@@ -90,7 +140,7 @@ class SumTree2(object):
     self.val_update(index, value)
 
   def get_val(self, index):
-    tree_index = 2 ** (self.tree_level - 1) - 1 + index
+    tree_index = self.leaf_offset + index
     return self.tree[tree_index], tree_index
 
   def val_update(self, index, value):
@@ -98,11 +148,32 @@ class SumTree2(object):
     diff = value - old_value
     self.reconstruct(tree_index, diff)
 
+  def batch_val_update(self, indices, values):
+    '''Sets the leaves `indices` to `values` and recomputes their ancestors one level at a time.'''
+    tree_indices = self.leaf_offset + np.asarray(indices, dtype=np.int64)
+    self.tree[tree_indices] = values
+
+    tree_indices = np.unique(tree_indices)
+    while tree_indices.size and tree_indices[0] > 0:
+      tree_indices = np.unique((tree_indices - 1) // 2)
+      self.tree[tree_indices] = self.tree[2 * tree_indices + 1] + self.tree[2 * tree_indices + 2]
+
+  def leaves(self):
+    '''View of the values of the filled leaves.'''
+    return self.tree[self.leaf_offset:self.leaf_offset + self.size]
+
+  def rebuild(self):
+    '''Recomputes every internal node from the leaves.'''
+    for level in range(self.tree_level - 2, -1, -1):
+      start = 2 ** level - 1
+      nodes = np.arange(start, 2 * start + 1)
+      self.tree[nodes] = self.tree[2 * nodes + 1] + self.tree[2 * nodes + 2]
+
   def reconstruct(self, tindex, diff):
     self.tree[tindex] += diff
-    if not tindex == 0:
-      tindex = int((tindex - 1) / 2)
-      self.reconstruct(tindex, diff)
+    while tindex != 0:
+      tindex = (tindex - 1) // 2
+      self.tree[tindex] += diff
 
   def find(self, value, norm=True):
     if norm:
@@ -110,17 +181,17 @@ class SumTree2(object):
     return self._find(value, 0)
 
   def _find(self, value, index):
-    i = 2 ** (self.tree_level - 1) - 1
-    if i <= index:
-      idx = index - i
-      return self.data[idx], self.tree[index], idx
-
-    left = self.tree[2 * index + 1]
-
-    if value <= left:
-      return self._find(value, 2 * index + 1)
-    else:
-      return self._find(value - left, 2 * (index + 1))
+    i = self.leaf_offset
+    while index < i:
+      left = self.tree[2 * index + 1]
+      if value <= left:
+        index = 2 * index + 1
+      else:
+        value -= left
+        index = 2 * (index + 1)
+
+    idx = index - i
+    return self.data[idx], self.tree[index], idx
 
   def print_tree(self):
     for k in range(1, self.tree_level + 1):
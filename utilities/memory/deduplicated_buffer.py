@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+__author__ = 'cnheider'
+'''
+Description: Replay memory storing repeated transitions once, with their multiplicity
+Author: Christian Heider Nielsen
+'''
+
+import hashlib
+
+import numpy as np
+
+from utilities.memory.array_buffer import ArrayTransitionBuffer, _as_array
+from utilities.memory.data_structures.segment_tree import SumSegmentTree
+
+
+class DeduplicatedTransitionBuffer(ArrayTransitionBuffer):
+  '''
+An `ArrayTransitionBuffer` for discrete environments where transitions repeat exactly. Inserted
+transitions are hashed, a transition already stored only increments its visit count. Sampling is either
+proportional to the visit counts, which matches sampling a memory holding every copy, or uniform over the
+unique transitions.
+
+`capacity` bounds the number of unique transitions, once full the least recently first seen transition
+is overwritten together with its count. The length of the memory counts stored transitions with their
+repeats, as a memory holding every copy would, `num_unique` counts them once. Exported columns carry the
+counts in a `count` column, which `load_experience` restores.
+'''
+
+  def __init__(self, capacity, proportional=True, **kwargs):
+    '''
+
+:param capacity: Max number of unique transitions to store
+:type capacity: int
+:param proportional: Sample proportionally to visit counts, otherwise uniformly over unique transitions
+:type proportional: bool
+:param kwargs: dtypes and codecs, see `ArrayTransitionBuffer`
+'''
+    super().__init__(capacity, **kwargs)
+    self._proportional = proportional
+
+    tree_capacity = 1
+    while tree_capacity < capacity:
+      tree_capacity *= 2
+    self._counts = SumSegmentTree(tree_capacity)
+
+    self._index = {}  # Digest -> memory index
+    self._digests = [None] * capacity
+
+  def add(self, transition, count=1):
+    '''Saves a transition, or counts another `count` visits of it.'''
+    values = [_as_array(value) for value in transition]
+    digest = self._digest(values)
+
+    index = self._index.get(digest)
+    if index is not None:
+      self._counts[index] = self._counts[index] + count
+      return
+
+    index = self._position
+    if self._digests[index] is not None:
+      del self._index[self._digests[index]]
+    self._index[digest] = index
+    self._digests[index] = digest
+
+    super().add(transition)
+    self._counts[index] = count
+
+  def extend(self, batch, counts=None):
+    '''Saves a batch of transitions, visited `counts` times each when given.'''
+    if counts is None:
+      super().extend(batch)
+      return
+
+    for transition, count in zip(zip(*batch), np.asarray(counts).tolist()):
+      self.add(self._transition_type(*transition), count)
+
+  def export_columns(self, chunk_size=2 ** 20):
+    first = (self._position - self._size) % self._capacity
+    start = 0
+    for chunk in super().export_columns(chunk_size):
+      rows = len(next(iter(chunk.values())))
+      chunk['count'] = self._counts[(first + np.arange(start, start + rows)) % self._capacity]
+      start += rows
+      yield chunk
+
+  def sample_indices(self, num):
+    if not self._proportional:
+      return super().sample_indices(num)
+    return self._counts.find_prefix_sum_idx(np.random.random_sample(num) * self._counts.sum())
+
+  def counts(self, indices=None):
+    '''Visit counts of the stored transitions, or of `indices`.'''
+    if indices is None:
+      indices = np.arange(self._size)
+    return self._counts[indices]
+
+  @property
+  def num_unique(self):
+    '''Number of unique transitions stored.'''
+    return self._size
+
+  def __len__(self):
+    '''Number of stored transitions, repeats included.'''
+    return int(self._counts.sum())
+
+  def clear(self):
+    super().clear()
+    self._counts[np.arange(self._capacity)] = 0.
+    self._index.clear()
+    self._digests = [None] * self._capacity
+
+  @staticmethod
+  def _digest(values):
+    digest = hashlib.blake2b(digest_size=16)
+    for value in values:
+      if value is None:
+        digest.update(b'\x00')
+      else:
+        digest.update(b'\x01')
+        digest.update(str(value.dtype).encode())
+        digest.update(np.ascontiguousarray(value).tobytes())
+    return digest.digest()
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+__author__ = 'cnheider'
+'''
+Description: Policies choosing which transition a full replay memory overwrites
+Author: Christian Heider Nielsen
+'''
+
+import heapq
+import random
+
+import numpy as np
+
+
+class EvictionPolicy(object):
+  '''
+Chooses the slot of a full memory an incoming transition overwrites. Memories call `reset` with their
+capacity once, `inserted` after writing a slot and `select` when full, a `select` returning None drops
+the incoming transition instead.
+'''
+
+  def reset(self, capacity):
+    self._capacity = capacity
+    self.clear()
+
+  def select(self):
+    raise NotImplementedError
+
+  def inserted(self, index, transition):
+    pass
+
+  def clear(self):
+    pass
+
+
+class FIFOEviction(EvictionPolicy):
+  '''Overwrites the oldest transition, the default behaviour of the memories.'''
+
+  def select(self):
+    index = self._oldest
+    self._oldest = (self._oldest + 1) % self._capacity
+    return index
+
+  def clear(self):
+    self._oldest = 0
+
+
+class ReservoirEviction(EvictionPolicy):
+  '''
+Reservoir sampling, Vitter 1985, the memory holds a uniform sample of every transition ever inserted, so
+early experience is retained in proportion to its share of the whole run.
+'''
+
+  def select(self):
+    self._seen += 1
+    index = random.randrange(self._seen)
+    if index < self._capacity:
+      return index
+    return None
+
+  def clear(self):
+    self._seen = 0
+
+  def inserted(self, index, transition):
+    if self._seen < self._capacity:  # Filling up, every transition is kept
+      self._seen += 1
+
+
+class LowestPriorityEviction(EvictionPolicy):
+  '''
+Overwrites the transition of lowest priority, the oldest such transition on ties, so without priority
+feedback the policy behaves like `FIFOEviction`. New transitions get the max priority seen so far, feed
+priorities back with `update`.
+
+The minimum is kept in a tournament tree, every node holds the memory index of the lowest (priority,
+insertion number) pair below it.
+'''
+
+  def reset(self, capacity):
+    tree_capacity = 1
+    while tree_capacity < capacity:
+      tree_capacity *= 2
+    self._tree_capacity = tree_capacity
+    self._depth = tree_capacity.bit_length() - 1
+    self._priorities = np.full(tree_capacity, np.inf)
+    self._insertions = np.zeros(tree_capacity, dtype=np.int64)
+    self._winners = np.zeros(2 * tree_capacity, dtype=np.int64)
+    super().reset(capacity)
+
+  def select(self):
+    return int(self._winners[1])
+
+  def inserted(self, index, transition):
+    self._priorities[index] = self._max_priority
+    self._insertions[index] = self._insertion
+    self._insertion += 1
+
+    node = (index + self._tree_capacity) // 2
+    while node >= 1:
+      left, right = self._winners[2 * node], self._winners[2 * node + 1]
+      self._winners[node] = right if self._precedes(right, left) else left
+      node //= 2
+
+  def update(self, indices, priorities):
+    '''
+
+:param indices: Memory indices of the transitions
+:param priorities: New priorities, eg. absolute TD errors
+'''
+    priorities = np.asarray(priorities, dtype=np.float64).reshape(-1)
+    indices = np.asarray(indices).reshape(-1)
+    self._priorities[indices] = priorities
+    self._max_priority = max(self._max_priority, float(priorities.max()))
+    self._replay(np.unique((indices + self._tree_capacity) // 2))
+
+  def clear(self):
+    self._priorities[:] = np.inf
+    self._insertions[:] = 0
+    self._winners[self._tree_capacity:] = np.arange(self._tree_capacity)
+    self._replay(np.arange(self._tree_capacity // 2, self._tree_capacity))
+    self._max_priority = 1.
+    self._insertion = 0
+
+  def _precedes(self, index, other):
+    return (self._priorities[index], self._insertions[index]) < \
+           (self._priorities[other], self._insertions[other])
+
+  def _replay(self, nodes):
+    '''Recomputes the winners of `nodes`, all on the same level, and of their ancestors.'''
+    while nodes.size and nodes[0] >= 1:
+      left, right = self._winners[2 * nodes], self._winners[2 * nodes + 1]
+      right_lower = self._priorities[right] < self._priorities[left]
+      right_older = self._insertions[right] < self._insertions[left]
+      right_wins = right_lower | ((self._priorities[right] == self._priorities[left]) & right_older)
+      self._winners[nodes] = np.where(right_wins, right, left)
+      nodes = np.unique(nodes // 2)
+
+
+class EpisodeStratifiedEviction(EvictionPolicy):
+  '''
+Keeps every episode represented, overwrites a random transition of the episode holding the most
+transitions, a random such episode on ties. Episodes are delimited by transitions whose
+`non_terminal` is false.
+
+The largest episode is found with a heap of (-size, random tie breaker, episode) entries, an entry is
+stale once its episode changed size and is dropped when it reaches the top.
+'''
+
+  def select(self):
+    while True:
+      negative_size, _, episode = heapq.heappop(self._heap)
+      slots = self._slots.get(episode)
+      if slots is not None and len(slots) == -negative_size:
+        break
+
+    position = random.randrange(len(slots))
+    slots[position], slots[-1] = slots[-1], slots[position]
+    index = slots.pop()
+    if slots:
+      self._push(episode)
+    else:
+      del self._slots[episode]
+    return index
+
+  def inserted(self, index, transition):
+    self._slots.setdefault(self._episode, []).append(index)
+    self._push(self._episode)
+    if not getattr(transition, 'non_terminal', True):
+      self._episode += 1
+
+  def clear(self):
+    self._slots = {}  # Episode number -> memory indices
+    self._heap = []
+    self._episode = 0
+
+  def _push(self, episode):
+    heapq.heappush(self._heap, (-len(self._slots[episode]), random.random(), episode))
+    if len(self._heap) > 2 * len(self._slots) + 64:  # Rebuild without the stale entries
+      self._heap = [(-len(slots), random.random(), e) for e, slots in self._slots.items()]
+      heapq.heapify(self._heap)
@@ -10,10 +10,13 @@ from utilities.memory.transition import TrajectoryTrace, Transition
 class ExpandableCircularBuffer(object):
   '''For storing transitions explored in the environment.'''
 
-  def __init__(self, capacity=0):
+  def __init__(self, capacity=0, eviction=None):
     self._capacity = capacity
     self._memory = []
     self._position = 0
+    self._eviction = eviction
+    if eviction is not None and capacity != 0:
+      eviction.reset(capacity)
 
   def add(self, value):
     '''Saves a transition.'''
@@ -21,9 +24,18 @@ class ExpandableCircularBuffer(object):
       for val in value:
         self.add(val)
     else:
+      position = self._position
       if len(self._memory) < self._capacity or self._capacity == 0:
         self._memory.append(None)
-      self._memory[self._position] = value
+      elif self._eviction is not None:
+        position = self._eviction.select()
+        if position is None:
+          return
+
+      self._memory[position] = value
+      if self._eviction is not None and self._capacity != 0:
+        self._eviction.inserted(position, value)
+
       self._position += 1
       if self._capacity != 0:
         self._position = self._position % self._capacity
@@ -44,6 +56,8 @@ class ExpandableCircularBuffer(object):
   def clear(self):
     del self._memory[:]
     self._position = 0
+    if self._eviction is not None and self._capacity != 0:
+      self._eviction.clear()
 
   def __len__(self):
     '''Return the length of the memory list.'''
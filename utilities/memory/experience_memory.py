@@ -4,7 +4,7 @@ from utilities.memory.data_structures.sum_tree import SumTree2
 
 __author__ = 'cnheider'
 
-import random
+import numpy as np
 
 
 class Experience(object):
@@ -66,26 +66,24 @@ indices:
     if self.tree.filled_size() < self.batch_size:
       return None, None, None
 
-    out = []
-    indices = []
-    weights = []
-    priorities = []
-    for _ in range(self.batch_size):
-      r = random.random()
-      data, priority, index = self.tree.find(r)
-      priorities.append(priority)
-      weights.append(
-          (1. / self.memory_size / priority) ** beta if priority > 1e-16 else 0
-          )
-      indices.append(index)
-      out.append(data)
-      self.priority_update([index], [0])  # To avoid duplicating
+    # Gumbel-top-k, the k largest log priorities perturbed by Gumbel noise are a draw without replacement
+    # with probability proportional to priority, the same distribution as drawing one at a time and zeroing
+    # the priorities of the drawn samples
+    priorities = self.tree.leaves()
+    with np.errstate(divide='ignore'):
+      keys = np.log(priorities) + np.random.gumbel(size=priorities.shape)
+    indices = np.argpartition(-keys, self.batch_size - 1)[:self.batch_size]
 
-    self.priority_update(indices, priorities)  # Revert priorities
+    selected = priorities[indices]
+    weights = np.zeros(self.batch_size)
+    valid = selected > 1e-16
+    weights[valid] = (1. / self.memory_size / selected[valid]) ** beta
 
-    weights /= max(weights)  # Normalize for stability
+    weights /= max(weights.max(), 1e-16)  # Normalize for stability
 
-    return out, weights, indices
+    out = [self.tree.data[index] for index in indices]
+
+    return out, weights, indices.tolist()
 
   def priority_update(self, indices, priorities):
     ''' The methods update samples's priority.
@@ -97,8 +95,7 @@ indices :
     :param indices:
     :param priorities:
 '''
-    for i, p in zip(indices, priorities):
-      self.tree.val_update(i, p ** self.alpha)
+    self.tree.batch_val_update(indices, np.asarray(priorities, dtype=np.float64) ** self.alpha)
 
   def reset_alpha(self, alpha):
     ''' Reset a exponent alpha.
@@ -107,12 +104,9 @@ Parameters
 alpha : float
 '''
     self.alpha, old_alpha = alpha, self.alpha
-    priorities = [
-      self.tree.get_val(i)[0] ** -old_alpha
-      for i in range(self.tree.filled_size())
-      ]
-
-    self.priority_update(range(self.tree.filled_size()), priorities)
+    leaves = self.tree.leaves()
+    leaves **= alpha / old_alpha  # (priority ** old_alpha) ** (alpha / old_alpha)
+    self.tree.rebuild()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+__author__ = 'cnheider'
+'''
+Description: Replay memory storing every observed frame once, for image observations
+Author: Christian Heider Nielsen
+'''
+
+import numpy as np
+
+from utilities.memory.array_buffer import _as_array
+from utilities.memory.transition import Transition
+
+
+class FrameTransitionBuffer(object):
+  '''
+Observation indexed replay memory. Frames are written once into a ring of frames and transitions only
+hold the serial numbers of their state and successor frames. Transitions following a non terminal
+transition continue its episode, their state is the previous successor and reuses that frame instead of
+storing it again. The transition after a terminal one, or after `end_episode`, starts a new episode.
+
+With `history_length > 1` callers push single frames and the state and successor stacks are assembled
+at sample time along a new leading axis, oldest frame first. Frames from before the start of the episode,
+or already overwritten in the ring, are zero-filled.
+
+A `frame_codec`, eg. `Uint8Codec`, stores frames in its compact dtype and decodes sampled stacks.
+'''
+
+  def __init__(self, capacity, history_length=1, frame_capacity=None, frame_dtype=None, frame_codec=None):
+    '''
+
+:param capacity: Max number of transitions to store
+:type capacity: int
+:param history_length: Number of consecutive frames stacked into a state
+:type history_length: int
+:param frame_capacity: Size of the frame ring, a transition is dropped once its state frame is
+overwritten. Defaults to one frame per transition, which suffices when consecutive transitions share
+frames
+:type frame_capacity: int
+:param frame_dtype: numpy dtype of the frame ring, floating point frames default to float32
+:param frame_codec: Optional `StorageCodec` of the frame ring, overrides `frame_dtype`
+:type frame_codec: StorageCodec
+'''
+    self._capacity = capacity
+    self._history_length = history_length
+    self._frame_capacity = frame_capacity or capacity + history_length
+    self._frame_dtype = frame_dtype
+    self._frame_codec = frame_codec
+
+    self._frames = None
+    self._episode_start = np.zeros(self._frame_capacity, dtype=np.bool_)
+    self._frame_count = 0
+
+    self._state_serial = np.zeros(capacity, dtype=np.int64)
+    self._successor_serial = np.zeros(capacity, dtype=np.int64)
+    self._action = None
+    self._signal = np.zeros(capacity, dtype=np.float32)
+    self._non_terminal = np.zeros(capacity, dtype=np.bool_)
+
+    self._last_serial = -1  # Successor frame of the previous transition, -1 when its episode ended
+
+    self._position = 0
+    self._size = 0
+
+  def add_transition(self, state, action, signal, successor_state, non_terminal):
+    if self._last_serial >= 0:
+      state_serial = self._last_serial
+    else:
+      state_serial = self._write_frame(state, episode_start=True)
+
+    successor_serial = -1
+    if successor_state is not None:
+      successor_serial = self._write_frame(successor_state, episode_start=False)
+    self._last_serial = successor_serial if non_terminal else -1
+
+    oldest_live_serial = self._frame_count - self._frame_capacity
+    while self._size and self._state_serial[(self._position - self._size) % self._capacity] < \
+        oldest_live_serial:
+      self._size -= 1
+
+    action = _as_array(action)
+    if self._action is None:
+      self._action = np.zeros((self._capacity, *action.shape), dtype=action.dtype)
+
+    index = self._position
+    self._state_serial[index] = state_serial
+    self._successor_serial[index] = successor_serial
+    self._action[index] = action
+    self._signal[index] = signal
+    self._non_terminal[index] = non_terminal
+
+    self._position = (self._position + 1) % self._capacity
+    self._size = min(self._size + 1, self._capacity)
+
+  def sample_indices(self, num):
+    offsets = np.random.randint(0, self._size, size=num)
+    return (self._position - self._size + offsets) % self._capacity
+
+  def sample_transitions(self, num):
+    return self.get_transitions(self.sample_indices(num))
+
+  def get_transitions(self, indices):
+    return Transition(self._stack(self._state_serial[indices]),
+                      self._action[indices],
+                      self._signal[indices],
+                      self._stack(self._successor_serial[indices]),
+                      self._non_terminal[indices])
+
+  def end_episode(self, successor_state=None):
+    '''
+Starts a new episode with the next transition, eg. after an episode is cut off by a time limit.
+
+:param successor_state: Unused, the last transition of the episode already holds its successor
+'''
+    self._last_serial = -1
+
+  def clear(self):
+    self._position = 0
+    self._size = 0
+    self._last_serial = -1
+
+  @property
+  def frame_count(self):
+    return self._frame_count
+
+  def __len__(self):
+    return self._size
+
+  def _write_frame(self, frame, episode_start):
+    frame = _as_array(frame)
+    if self._frames is None:
+      dtype = self._frame_dtype
+      if dtype is None:
+        dtype = np.float32 if np.issubdtype(frame.dtype, np.floating) else frame.dtype
+      if self._frame_codec is not None:
+        dtype = self._frame_codec.storage_dtype(dtype)
+      self._frames = np.zeros((self._frame_capacity, *frame.shape), dtype=dtype)
+
+    serial = self._frame_count
+    slot = serial % self._frame_capacity
+    self._frames[slot] = frame if self._frame_codec is None else self._frame_codec.encode(frame)
+    self._episode_start[slot] = episode_start
+    self._frame_count += 1
+    return serial
+
+  def _stack(self, serials):
+    '''
+Gathers the frames of `serials`, or the stacks of `history_length` frames ending in them.
+
+:param serials: frame serial numbers, -1 marks a missing (terminal) successor
+'''
+    oldest_live_serial = max(self._frame_count - self._frame_capacity, 0)
+
+    if self._history_length == 1:
+      frames = self._decode(self._frames[serials % self._frame_capacity])
+      frames[serials < oldest_live_serial] = 0
+      return frames
+
+    offsets = np.arange(self._history_length - 1, -1, -1)
+    stack_serials = serials[:, None] - offsets[None, :]
+    slots = stack_serials % self._frame_capacity
+
+    valid = (stack_serials >= oldest_live_serial) & (serials[:, None] >= 0)
+    starts = self._episode_start[slots] & valid
+    later_starts = np.cumsum(starts[:, ::-1], axis=1)[:, ::-1] - starts  # Starts after each column
+    valid &= later_starts == 0
+
+    frames = self._decode(self._frames[slots])
+    frames[~valid] = 0
+    return frames
+
+  def _decode(self, frames):
+    if self._frame_codec is None:
+      return frames
+    return self._frame_codec.decode(frames)
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+__author__ = 'cnheider'
+'''
+Description: Disk backed replay memory for capacities that should not live in RAM
+Author: Christian Heider Nielsen
+'''
+
+import json
+from pathlib import Path
+
+import numpy as np
+
+from utilities.memory.array_buffer import ArrayTransitionBuffer
+
+
+class MemoryMappedTransitionBuffer(ArrayTransitionBuffer):
+  '''
+An `ArrayTransitionBuffer` whose columns are `np.memmap` files in a run directory, so only the rows
+touched by sampling are paged in. A manifest next to the column files records shapes, dtypes and the
+write cursor, with `resume=True` a buffer constructed on a directory holding a manifest reopens and
+resumes it.
+
+The most recent transitions are kept in an in-RAM ring of at most `ram_budget` bytes and are written
+back to the column files as they age out of it, on `flush`, every `flush_interval` inserts and on
+`close`. Rows still in the hot tail when a process dies without flushing are lost.
+'''
+
+  _manifest_name = 'manifest.json'
+
+  def __init__(self, capacity, directory, ram_budget=0, resume=False, flush_interval=None, **kwargs):
+    '''
+
+:param capacity: Max number of transitions to store
+:type capacity: int
+:param directory: Run directory holding the column files and manifest
+:type directory: str or Path
+:param ram_budget: Bytes of RAM the hot tail of recent transitions may use, 0 writes straight to disk
+:type ram_budget: int
+:param resume: Whether to reopen the buffer already in `directory`, without it a directory holding a
+manifest is refused rather than overwritten
+:type resume: bool
+:param flush_interval: Number of inserts between automatic flushes, None only flushes when asked to
+:type flush_interval: int
+:param kwargs: dtypes and codecs, see `ArrayTransitionBuffer`
+'''
+    if kwargs.get('eviction') is not None:
+      raise ValueError('MemoryMappedTransitionBuffer writes back its hot tail in write order, it can not '
+                       'take an eviction policy')
+    super().__init__(capacity, **kwargs)
+    self._directory = Path(directory)
+    self._ram_budget = ram_budget
+    self._flush_interval = flush_interval
+    self._inserts_since_flush = 0
+
+    self._views = None
+    self._hot = None
+    self._hot_capacity = 0
+    self._hot_position = 0
+    self._hot_size = 0
+
+    if (self._directory / self._manifest_name).exists():
+      if not resume:
+        raise FileExistsError(f'{self._directory} already holds a replay memory, pass resume=True to '
+                              f'continue it or use another directory')
+      self._open()
+
+  def add(self, transition):
+    index = super().add(transition)
+    self._inserts_since_flush += 1
+    if self._flush_interval and self._inserts_since_flush >= self._flush_interval:
+      self.flush()
+    return index
+
+  def _gather(self, indices):
+    indices = np.asarray(indices)
+    age = (self._position - 1 - indices) % self._capacity
+    hot = age < self._hot_size
+
+    cold_rows = np.flatnonzero(~hot)
+    cold_indices = indices[cold_rows]
+    order = np.argsort(cold_indices)  # Read the files front to back
+    cold_rows, cold_indices = cold_rows[order], cold_indices[order]
+
+    hot_rows = np.flatnonzero(hot)
+    hot_indices = (self._hot_position - 1 - age[hot_rows]) % max(self._hot_capacity, 1)
+
+    batch = []
+    for field in self._transition_type._fields:
+      column = self._views[field]
+      values = np.empty((len(indices), *column.shape[1:]), dtype=column.dtype)
+      values[cold_rows] = column[cold_indices]
+      if hot_rows.size:
+        values[hot_rows] = self._hot[field][hot_indices]
+      batch.append(values)
+
+    return batch
+
+  def flush(self):
+    '''Writes the hot tail back to the column files and records the cursor in the manifest.'''
+    if self._columns is None:
+      return
+
+    ages = np.arange(self._hot_size)
+    indices = (self._position - 1 - ages) % self._capacity
+    hot_indices = (self._hot_position - 1 - ages) % max(self._hot_capacity, 1)
+    for field, column in self._columns.items():
+      if self._hot_size:
+        column[indices] = self._hot[field][hot_indices]
+      column.flush()
+
+    self._write_manifest()
+    self._inserts_since_flush = 0
+
+  def close(self):
+    self.flush()
+
+  def clear(self):
+    super().clear()
+    self._hot_position = 0
+    self._hot_size = 0
+
+  @property
+  def directory(self):
+    return self._directory
+
+  def _write(self, index, values):
+    if not self._hot_capacity:
+      super()._write(index, values)
+      return
+
+    if self._hot_size == self._hot_capacity:  # Write back the oldest hot row before reusing its slot
+      evicted = (index - self._hot_size) % self._capacity
+      for field, column in self._columns.items():
+        column[evicted] = self._hot[field][self._hot_position]
+
+    for field, value in zip(self._transition_type._fields, values):
+      self._hot[field][self._hot_position] = 0 if value is None else value
+
+    self._hot_position = (self._hot_position + 1) % self._hot_capacity
+    self._hot_size = min(self._hot_size + 1, self._hot_capacity)
+
+  def _allocate(self, values):
+    self._directory.mkdir(parents=True, exist_ok=True)
+    columns = super()._allocate(values)
+    self._allocate_hot(columns)
+    self._columns = columns
+    self._write_manifest()
+    return columns
+
+  def _allocate_column(self, field, shape, dtype):
+    return np.memmap(self._column_path(field), dtype=dtype, mode='w+', shape=(self._capacity, *shape))
+
+  def _allocate_hot(self, columns):
+    self._views = {field:column.view(np.ndarray) for field, column in columns.items()}  # Skips memmap overhead
+
+    row_bytes = sum(column.dtype.itemsize * int(np.prod(column.shape[1:])) for column in columns.values())
+    self._hot_capacity = min(self._capacity, int(self._ram_budget // max(row_bytes, 1)))
+    self._hot = {field:np.zeros((self._hot_capacity, *column.shape[1:]), dtype=column.dtype)
+                 for field, column in columns.items()}
+
+  def _open(self):
+    with open(self._directory / self._manifest_name) as f:
+      manifest = json.load(f)
+
+    if manifest['capacity'] != self._capacity:
+      raise ValueError(f'{self._directory} holds a buffer of capacity {manifest["capacity"]}, '
+                       f'not {self._capacity}')
+
+    self._columns = {
+      field:np.memmap(self._column_path(field),
+                      dtype=np.dtype(spec['dtype']),
+                      mode='r+',
+                      shape=(self._capacity, *spec['shape']))
+      for field, spec in manifest['columns'].items()
+      }
+    self._position = manifest['position']
+    self._size = manifest['size']
+    self._allocate_hot(self._columns)
+
+  def _write_manifest(self):
+    manifest = {
+      'capacity':self._capacity,
+      'position':self._position,
+      'size':    self._size,
+      'columns': {field:{'dtype':column.dtype.str, 'shape':list(column.shape[1:])}
+                  for field, column in self._columns.items()},
+      }
+    with open(self._directory / self._manifest_name, 'w') as f:
+      json.dump(manifest, f)
+
+  def _column_path(self, field):
+    return self._directory / f'{field}.dat'
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+__author__ = 'cnheider'
+'''
+Description: Replay memory folding n-step returns on insert
+Author: Christian Heider Nielsen
+'''
+
+from collections import defaultdict, deque
+
+import numpy as np
+
+from utilities.memory.array_buffer import ArrayTransitionBuffer
+from utilities.memory.transition import NStepTransition
+
+
+class NStepTransitionBuffer(ArrayTransitionBuffer):
+  '''
+An `ArrayTransitionBuffer` of `NStepTransition`s. Each environment feeding the buffer, told apart by
+`env_id`, has a pending window of its last `n_steps` transitions, once the window is full its oldest
+transition is stored with the discounted sum of the window's signals, the latest successor as bootstrap
+state and `discount_factor ** n_steps` as discount. On termination the whole window is stored with
+truncated sums and no bootstrap state, so targets reduce to `signal + discount * max_a Q(successor, a)`.
+'''
+
+  _transition_type = NStepTransition
+  _default_dtypes = {**ArrayTransitionBuffer._default_dtypes, 'discount':np.float32}
+
+  def __init__(self, capacity, n_steps=3, discount_factor=0.99, **kwargs):
+    '''
+
+:param capacity: Max number of transitions to store
+:type capacity: int
+:param n_steps: Number of signals folded into each stored transition
+:type n_steps: int
+:param discount_factor: Discount of the folded signals and of the bootstrap state
+:type discount_factor: float
+:param kwargs: dtypes and codecs, see `ArrayTransitionBuffer`
+'''
+    if kwargs.get('eviction') is not None:
+      raise ValueError('NStepTransitionBuffer stores transitions in write order, it can not take an eviction '
+                       'policy')
+    super().__init__(capacity, **kwargs)
+    self._n_steps = n_steps
+    self._discount_factor = discount_factor
+    self._discounts = discount_factor ** np.arange(n_steps + 1)
+    self._pending = defaultdict(deque)
+
+  def add_transition(self, state, action, signal, successor_state, non_terminal, env_id=0):
+    pending = self._pending[env_id]
+    pending.append((state, action, signal))
+
+    if not non_terminal:
+      while pending:
+        self._fold(pending, None, False)
+      return
+
+    if len(pending) == self._n_steps:
+      self._fold(pending, successor_state, True)
+
+  def flush(self, env_id=None, successor_state=None):
+    '''
+Stores the pending transitions of an environment whose episode was cut short, bootstrapping from
+`successor_state`, the last observed state, with the discount of the shorter windows.
+
+:param env_id: Environment to flush, all environments if None
+:param successor_state: Bootstrap state, if None the pending transitions are treated as terminal
+'''
+    env_ids = list(self._pending) if env_id is None else [env_id]
+    for env_id in env_ids:
+      pending = self._pending.pop(env_id, deque())
+      while pending:
+        self._fold(pending, successor_state, successor_state is not None)
+
+  def end_episode(self, successor_state=None, env_id=0):
+    '''Ends the episode of an environment that was cut short, eg. by a time limit, see `flush`.'''
+    self.flush(env_id, successor_state)
+
+  def clear(self):
+    super().clear()
+    self._pending.clear()
+
+  @property
+  def n_steps(self):
+    return self._n_steps
+
+  @property
+  def discount_factor(self):
+    return self._discount_factor
+
+  def _fold(self, pending, successor_state, non_terminal):
+    signals = np.fromiter((signal for _, _, signal in pending), dtype=np.float64, count=len(pending))
+    state, action, _ = pending.popleft()
+    self.add(NStepTransition(state,
+                             action,
+                             signals @ self._discounts[:len(signals)],
+                             successor_state,
+                             non_terminal,
+                             self._discounts[len(signals)]))
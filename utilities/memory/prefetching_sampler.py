@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+__author__ = 'cnheider'
+'''
+Description: Replay memory wrapper sampling tensor batches ahead of the learner on a background thread
+Author: Christian Heider Nielsen
+'''
+
+import queue
+import threading
+import time
+
+import numpy as np
+import torch
+
+
+class PrefetchingSampler(object):
+  '''
+Wraps a replay memory whose `sample_transitions` returns `Transition`-like namedtuples, and stands in
+for it. A background thread keeps up to `depth` batches of `batch_size` transitions sampled, converted to
+contiguous tensors, optionally pinned and moved to `device`, so `sample_transitions` only dequeues.
+
+Inserts and sampling are serialised by a lock, prefetched batches may therefore miss the transitions
+added after they were sampled. Call `close` to stop the thread.
+'''
+
+  samples_weights = False  # Prefetched batches can not carry the indices and weights of a prioritised memory
+
+  def __init__(self, memory, batch_size, depth=2, device='cpu', pin_memory=False):
+    '''
+
+:param memory: The wrapped replay memory
+:param batch_size: Number of transitions in prefetched batches
+:type batch_size: int
+:param depth: Max number of batches waiting in the queue
+:type depth: int
+:param device: Device the batches are moved to
+:param pin_memory: Pin batches in page-locked memory before moving them, for asynchronous copies to cuda
+:type pin_memory: bool
+'''
+    self._memory = memory
+    self._batch_size = batch_size
+    self._depth = depth
+    self._device = torch.device(device)
+    self._pin_memory = pin_memory
+
+    self._lock = threading.Lock()
+    self._queue = queue.Queue(maxsize=depth)
+    self._stop = threading.Event()
+    self._thread = None
+    self._exception = None
+
+  def add_transition(self, *args, **kwargs):
+    with self._lock:
+      self._memory.add_transition(*args, **kwargs)
+
+  def add(self, *args, **kwargs):
+    with self._lock:
+      self._memory.add(*args, **kwargs)
+
+  def sample_transitions(self, num):
+    '''Returns the next prefetched batch, batches of other sizes are sampled synchronously.'''
+    if num != self._batch_size:
+      return self._sample(num)
+
+    if self._thread is None:
+      self._start()
+
+    while True:
+      if self._exception is not None:
+        raise self._exception
+      try:
+        return self._queue.get(timeout=.1)
+      except queue.Empty:
+        pass
+
+  def close(self):
+    '''Stops and joins the background thread, discarding prefetched batches, and closes the memory.'''
+    if self._thread is not None:
+      self._stop.set()
+      while self._thread.is_alive():
+        try:
+          self._queue.get_nowait()  # Unblock a pending put
+        except queue.Empty:
+          pass
+        self._thread.join(timeout=.1)
+
+      self._thread = None
+      self._queue = queue.Queue(maxsize=self._depth)
+
+    if hasattr(self._memory, 'close'):
+      self._memory.close()
+
+  @property
+  def memory(self):
+    return self._memory
+
+  def __len__(self):
+    return len(self._memory)
+
+  def __getattr__(self, item):
+    if item.startswith('__') or item == '_memory':
+      raise AttributeError(item)
+    return getattr(self._memory, item)
+
+  def __getstate__(self):
+    state = self.__dict__.copy()
+    for key in ('_lock', '_queue', '_stop', '_thread', '_exception'):
+      del state[key]
+    return state
+
+  def __setstate__(self, state):
+    self.__dict__.update(state)
+    self._lock = threading.Lock()
+    self._queue = queue.Queue(maxsize=self._depth)
+    self._stop = threading.Event()
+    self._thread = None
+    self._exception = None
+
+  def _start(self):
+    self._stop.clear()
+    self._thread = threading.Thread(target=self._prefetch, name='PrefetchingSampler', daemon=True)
+    self._thread.start()
+
+  def _prefetch(self):
+    try:
+      while not self._stop.is_set():
+        if len(self._memory) < self._batch_size:
+          time.sleep(.001)
+          continue
+
+        batch = self._sample(self._batch_size)
+        while not self._stop.is_set():
+          try:
+            self._queue.put(batch, timeout=.1)
+            break
+          except queue.Full:
+            pass
+    except Exception as e:
+      self._exception = e
+
+  def _sample(self, num):
+    with self._lock:
+      batch = self._memory.sample_transitions(num)
+    return type(batch)(*[self._to_tensor(values) for values in batch])
+
+  def _to_tensor(self, values):
+    if torch.is_tensor(values):
+      tensor = values
+    else:
+      values = _stack(values)
+      if values.dtype == np.float64:
+        values = values.astype(np.float32)
+      tensor = torch.from_numpy(np.ascontiguousarray(values))
+
+    if self._pin_memory:
+      tensor = tensor.pin_memory()
+    return tensor.to(self._device, non_blocking=self._pin_memory)
+
+
+def _stack(values):
+  if isinstance(values, np.ndarray) and values.dtype != np.object_:
+    return values
+
+  values = list(values)
+  example = next((np.asarray(value) for value in values if value is not None), None)
+  if example is None:
+    return np.zeros(len(values), dtype=np.float32)
+  return np.stack([np.zeros_like(example) if value is None else np.asarray(value) for value in values])
+
+
+if __name__ == '__main__':
+  from torch import nn
+
+  from utilities.memory.array_buffer import ArrayTransitionBuffer
+
+  def benchmark(memory, steps=300, batch_size=128, state_size=4096):
+    model = nn.Sequential(nn.Linear(state_size, 64), nn.ReLU(), nn.Linear(64, 4))
+    optimiser = torch.optim.Adam(model.parameters())
+
+    def add_random_transition():
+      state, successor_state = np.random.rand(2, state_size)
+      memory.add_transition(state, np.random.randint(4), 1., successor_state, True)
+
+    for _ in range(batch_size * 10):
+      add_random_transition()
+
+    latencies = []
+    for _ in range(steps):
+      add_random_transition()
+      start = time.perf_counter()
+      batch = memory.sample_transitions(batch_size)
+      states = torch.as_tensor(batch.state, dtype=torch.float)
+      actions = torch.as_tensor(batch.action, dtype=torch.long).view(-1, 1)
+      loss = (model(states).gather(1, actions) - torch.as_tensor(batch.signal).view(-1, 1)).pow(2).mean()
+      optimiser.zero_grad()
+      loss.backward()
+      optimiser.step()
+      latencies.append(time.perf_counter() - start)
+      time.sleep(.002)  # Stand in for stepping the environment
+
+    return np.median(latencies) * 1000
+
+  synchronous = benchmark(ArrayTransitionBuffer(10000))
+  sampler = PrefetchingSampler(ArrayTransitionBuffer(10000), 128, depth=4)
+  prefetched = benchmark(sampler)
+  sampler.close()
+  print(f'Median learner step: synchronous {synchronous:.3f} ms, prefetched {prefetched:.3f} ms')
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+__author__ = 'cnheider'
+'''
+Description: Rank based prioritised replay memory
+Author: Christian Heider Nielsen
+'''
+
+import numpy as np
+import torch
+
+from utilities.memory.array_buffer import ArrayTransitionBuffer
+
+
+class RankBasedReplayBuffer(ArrayTransitionBuffer):
+  '''
+Rank based prioritised replay, Schaul et al. 2016, transition `i` is sampled with probability proportional
+to `rank(i) ** -alpha`, which makes it insensitive to outlier errors.
+
+Transitions are indexed by an array backed binary max-heap of priorities, which is fully sorted every
+`sort_frequency` inserts so the heap position of a transition approximates its rank. A batch is drawn
+as one rank per segment of equal probability mass, the segment boundaries are computed once per size
+bucket of `capacity // size_buckets` transitions and cached.
+
+`sample_transitions` returns `(indices, batch, weights)`, feed the per sample errors of the batch back
+with `batch_update(indices, errors)`. Sampling is vectorised, but `batch_update` still sifts the heap
+once per index in Python, O(batch * log capacity) steps, a sift depends on the heap the previous one left.
+'''
+
+  samples_weights = True  # Marks the prioritised interface, see `DQNAgent.update`
+
+  def __init__(self,
+               capacity,
+               alpha=0.7,
+               beta=0.5,
+               beta_increment=1e-4,
+               sort_frequency=1000,
+               size_buckets=100,
+               **kwargs):
+    '''
+
+:param capacity: Max number of transitions to store
+:type capacity: int
+:param alpha: How much prioritisation is used, 0 is uniform sampling
+:type alpha: float
+:param beta: Initial importance sampling correction, annealed towards 1 by `beta_increment` per sample
+:type beta: float
+:param sort_frequency: Number of inserts between re-sorts of the heap
+:type sort_frequency: int
+:param size_buckets: Number of memory sizes segment boundaries are computed for, a partially filled
+memory samples from the largest bucket size that fits
+:type size_buckets: int
+:param kwargs: dtypes and codecs, see `ArrayTransitionBuffer`
+'''
+    super().__init__(capacity, **kwargs)
+    self._alpha = alpha
+    self._beta = beta
+    self._beta_increment = beta_increment
+    self._sort_frequency = sort_frequency
+    self._bucket_size = max(capacity // size_buckets, 1)
+
+    self._heap_priorities = np.zeros(capacity, dtype=np.float64)
+    self._heap_slots = np.zeros(capacity, dtype=np.int64)  # Heap position -> transition index
+    self._slot_positions = np.zeros(capacity, dtype=np.int64)  # Transition index -> heap position
+    self._inserts = 0
+
+    self._segments = {}
+
+  def add(self, transition):
+    is_new = self._size < self._capacity
+    max_priority = self._heap_priorities[0] if self._size else 1.
+    index = super().add(transition)
+    if index is None:
+      return None
+
+    if is_new:
+      position = self._size - 1
+      self._heap_slots[position] = index
+      self._slot_positions[index] = position
+      self._heap_priorities[position] = max_priority
+      self._sift_up(position)
+    else:
+      self._update(index, max_priority)
+
+    self._inserts += 1
+    if self._inserts % self._sort_frequency == 0:
+      self.sort()
+    return index
+
+  def sample_transitions(self, num):
+    size = self._size if self._size < self._bucket_size else self._size - self._size % self._bucket_size
+    lows, highs, normaliser = self._segment_boundaries(size, num)
+
+    ranks = lows + (np.random.random_sample(num) * (highs - lows)).astype(np.int64)
+    indices = self._heap_slots[ranks]
+
+    probabilities = (ranks + 1.) ** -self._alpha / normaliser
+    weights = (size * probabilities) ** -self._beta
+    weights /= (size * size ** -self._alpha / normaliser) ** -self._beta  # Weight of the lowest rank
+    self._beta = min(1., self._beta + self._beta_increment)
+
+    return indices, self.get_transitions(indices), weights
+
+  def batch_update(self, indices, errors):
+    '''
+
+:param indices: Indices returned by `sample_transitions`
+:param errors: Per sample errors, eg. absolute TD errors, as an array, list or tensor
+'''
+    if torch.is_tensor(errors):
+      errors = errors.detach().cpu().numpy()
+    priorities = np.abs(np.asarray(errors, dtype=np.float64)).reshape(-1)
+
+    for index, priority in zip(np.asarray(indices).tolist(), priorities.tolist()):
+      self._update(index, priority)
+    self.update_priorities(indices, priorities)
+
+  def sort(self):
+    '''Sorts the heap by priority, a sorted array is also a valid heap.'''
+    order = np.argsort(-self._heap_priorities[:self._size], kind='stable')
+    self._heap_priorities[:self._size] = self._heap_priorities[order]
+    self._heap_slots[:self._size] = self._heap_slots[order]
+    self._slot_positions[self._heap_slots[:self._size]] = np.arange(self._size)
+
+  def clear(self):
+    super().clear()
+    self._inserts = 0
+
+  def _segment_boundaries(self, size, num):
+    key = (size, num)
+    if key not in self._segments:
+      masses = np.arange(1, size + 1, dtype=np.float64) ** -self._alpha
+      cumulative = np.cumsum(masses)
+      normaliser = cumulative[-1]
+
+      edges = np.searchsorted(cumulative / normaliser, np.arange(1, num) / num, side='right')
+      lows = np.minimum(np.concatenate([[0], edges]), size - 1)
+      highs = np.minimum(np.maximum(np.concatenate([edges, [size]]), lows + 1), size)
+      self._segments[key] = lows, highs, normaliser
+
+    return self._segments[key]
+
+  def _update(self, index, priority):
+    position = self._slot_positions[index]
+    old_priority = self._heap_priorities[position]
+    self._heap_priorities[position] = priority
+    if priority > old_priority:
+      self._sift_up(position)
+    else:
+      self._sift_down(position)
+
+  def _sift_up(self, position):
+    priorities, slots = self._heap_priorities, self._heap_slots
+    priority, slot = priorities[position], slots[position]
+    while position > 0:
+      parent = (position - 1) // 2
+      if priorities[parent] >= priority:
+        break
+      self._move(parent, position)
+      position = parent
+    self._place(position, priority, slot)
+
+  def _sift_down(self, position):
+    priorities, slots = self._heap_priorities, self._heap_slots
+    priority, slot = priorities[position], slots[position]
+    while True:
+      child = 2 * position + 1
+      if child >= self._size:
+        break
+      if child + 1 < self._size and priorities[child + 1] > priorities[child]:
+        child += 1
+      if priorities[child] <= priority:
+        break
+      self._move(child, position)
+      position = child
+    self._place(position, priority, slot)
+
+  def _move(self, source, target):
+    self._heap_priorities[target] = self._heap_priorities[source]
+    self._heap_slots[target] = self._heap_slots[source]
+    self._slot_positions[self._heap_slots[target]] = target
+
+  def _place(self, position, priority, slot):
+    self._heap_priorities[position] = priority
+    self._heap_slots[position] = slot
+    self._slot_positions[slot] = position
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+__author__ = 'cnheider'
+'''
+Description: Preallocated on-policy rollout storage for PPO style learners
+Author: Christian Heider Nielsen
+'''
+
+import numpy as np
+import torch
+
+from utilities.functions.generalised_advantage_estimation import generalised_advantage_estimate
+from utilities.memory.transition import AdvantageMemory
+
+
+class RolloutStorage(object):
+  '''
+Stores a rollout of `num_steps` steps of `num_envs` parallel environments as [T, N, ...] tensors, one per
+field of `AdvantageMemory`, plus the signals and done masks of the steps. Columns are allocated on the
+first insert, when the shapes of the stored values are known, and are reused by every following rollout.
+A rollout longer than `num_steps`, eg. an episode of unbounded length, doubles the columns.
+
+Advantages and returns are computed in place with `compute_advantages`, `minibatches` then yields
+shuffled minibatches of the flattened rollout by indexing the columns with a random permutation.
+'''
+
+  _scalar_fields = ('value_estimate', 'signal', 'non_terminal', 'advantage', 'discounted_return')
+
+  def __init__(self, num_steps, num_envs=1, device='cpu'):
+    '''
+
+:param num_steps: Number of steps of the rollout preallocated
+:type num_steps: int
+:param num_envs: Number of parallel environments, every inserted value has a leading axis of this size
+:type num_envs: int
+:param device: Device of the columns
+'''
+    self._num_steps = num_steps
+    self._num_envs = num_envs
+    self._device = device
+    self._columns = None
+    self._step = 0
+
+  def insert(self, state, action, action_prob, value_estimate, signal, non_terminal):
+    '''Saves one step of every environment.'''
+    values = {
+      'state':         state,
+      'action':        action,
+      'action_prob':   action_prob,
+      'value_estimate':value_estimate,
+      'signal':        signal,
+      'non_terminal':  non_terminal,
+      }
+    values = {field:self._as_rows(field, value) for field, value in values.items()}
+
+    if self._columns is None:
+      self._columns = self._allocate(values)
+    elif self._step == self._capacity:
+      self._grow()
+
+    for field, value in values.items():
+      self._columns[field][self._step] = value
+    self._step += 1
+
+  def compute_advantages(self, bootstrap=None, discount_factor=0.99, tau=0.95, scripted=False):
+    '''
+Computes the GAE(lambda) advantages and returns of the stored steps in place.
+
+:param bootstrap: Optional value estimates of the states following the last step, one per environment
+'''
+    T = self._step
+    advantages, returns = generalised_advantage_estimate(self._columns['signal'][:T],
+                                                         self._columns['value_estimate'][:T],
+                                                         self._columns['non_terminal'][:T],
+                                                         bootstrap=bootstrap,
+                                                         discount_factor=discount_factor,
+                                                         tau=tau,
+                                                         device=self._device,
+                                                         scripted=scripted)
+    self._columns['advantage'][:T] = advantages
+    self._columns['discounted_return'][:T] = returns
+
+  def minibatches(self, batch_size, epochs=1):
+    '''
+Yields `epochs` passes of shuffled minibatches over the stored steps, as `AdvantageMemory`s of
+[batch_size, ...] tensors. Every step is visited once per epoch.
+'''
+    size = len(self)
+    if not size:
+      return
+
+    flat = [self._columns[field][:self._step].reshape(size, *self._columns[field].shape[2:])
+            for field in AdvantageMemory._fields]
+    for _ in range(epochs):
+      permutation = torch.randperm(size, device=self._device)
+      for start in range(0, size, batch_size):
+        indices = permutation[start:start + batch_size]
+        yield AdvantageMemory(*[column[indices] for column in flat])
+
+  def clear(self):
+    self._step = 0
+
+  @property
+  def columns(self):
+    return self._columns
+
+  @property
+  def num_envs(self):
+    return self._num_envs
+
+  def __len__(self):
+    return self._step * self._num_envs
+
+  @property
+  def _capacity(self):
+    return self._columns['signal'].shape[0]
+
+  def _as_rows(self, field, value):
+    if torch.is_tensor(value):
+      value = value.detach().to(self._device, dtype=torch.float)
+    else:
+      value = torch.as_tensor(np.asarray(value), dtype=torch.float, device=self._device)
+
+    if field in self._scalar_fields:
+      return value.reshape(self._num_envs)
+    return value.reshape(self._num_envs, *value.shape[1:])
+
+  def _allocate(self, values):
+    shapes = {field:value.shape[1:] for field, value in values.items()}
+    shapes.update(advantage=(), discounted_return=())
+    return {field:torch.zeros((self._num_steps, self._num_envs, *shape), device=self._device)
+            for field, shape in shapes.items()}
+
+  def _grow(self):
+    self._columns = {field:torch.cat([column, torch.zeros_like(column)])
+                     for field, column in self._columns.items()}
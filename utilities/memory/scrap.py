@@ -35,18 +35,7 @@ class PrioritisedReplayMemory(object):  # Has cuda issues
     self.tree.add(p, Transition(*args))
 
   def sample_transitions(self, n):
-    indices = []
-    transitions = []
-    segment = self.tree.total() / n
-
-    for i in range(n):
-      a = segment * i
-      b = segment * (i + 1)
-
-      s = random.uniform(a, b)
-      (idx, p, transition) = self.tree.get(s)
-      indices.append(idx)
-      transitions.append(transition)
+    indices, priorities, transitions = self.tree.sample(n)
 
     batch = Transition(*zip(*transitions))
     # the * operator unpacks
@@ -55,8 +44,9 @@ class PrioritisedReplayMemory(object):  # Has cuda issues
     return indices, batch
 
   def batch_update(self, indices, errors):
-    for (idx, error) in zip(indices, errors):
-      self.update(idx, error)
+    errors = np.asarray(errors, dtype=np.float64)
+    self.max_error = max(self.max_error, errors.max())
+    self.tree.batch_update(indices, (errors + self.e) ** self.a)
 
   def update(self, idx, error):
     p = self.__getPriority__(error)
@@ -162,7 +152,7 @@ class ReplayBuffer3(object):
     return batch
 
 
-class PrioritizedReplayBuffer(ReplayBuffer3):
+class PrioritizedReplayBuffer(ReplayBuffer2):
 
   def __init__(self, size, alpha):
     '''Create Prioritized Replay buffer.
@@ -200,13 +190,9 @@ ReplayBuffer.__init__
     self._it_min[idx] = self._max_priority ** self._alpha
 
   def _sample_proportional(self, batch_size):
-    res = []
-    for _ in range(batch_size):
-      # TODO(szymon): should we ensure no repeats?
-      mass = random.random() * self._it_sum.sum(0, len(self._storage) - 1)
-      idx = self._it_sum.find_prefix_sum_idx(mass)
-      res.append(idx)
-    return res
+    # TODO(szymon): should we ensure no repeats?
+    masses = np.random.random(batch_size) * self._it_sum.sum(0, len(self._storage) - 1)
+    return self._it_sum.find_prefix_sum_idx(masses)
 
   def sample(self, batch_size, beta):
     '''Sample a batch of experiences.
@@ -248,15 +234,11 @@ idxes: np.array
 
     idxes = self._sample_proportional(batch_size)
 
-    weights = []
     p_min = self._it_min.min() / self._it_sum.sum()
     max_weight = (p_min * len(self._storage)) ** (-beta)
 
-    for idx in idxes:
-      p_sample = self._it_sum[idx] / self._it_sum.sum()
-      weight = (p_sample * len(self._storage)) ** (-beta)
-      weights.append(weight / max_weight)
-    weights = np.array(weights)
+    p_samples = self._it_sum[idxes] / self._it_sum.sum()
+    weights = (p_samples * len(self._storage)) ** (-beta) / max_weight
     encoded_sample = self._encode_sample(idxes)
     return tuple(list(encoded_sample) + [weights, idxes])
 
@@ -275,11 +257,12 @@ priorities: [float]
     transitions at the sampled idxes denoted by
     variable `idxes`.
 '''
+    idxes = np.asarray(idxes)
+    priorities = np.asarray(priorities, dtype=np.float64)
     assert len(idxes) == len(priorities)
-    for idx, priority in zip(idxes, priorities):
-      assert priority > 0
-      assert 0 <= idx < len(self._storage)
-      self._it_sum[idx] = priority ** self._alpha
-      self._it_min[idx] = priority ** self._alpha
+    assert np.all(priorities > 0)
+    assert np.all((0 <= idxes) & (idxes < len(self._storage)))
+    self._it_sum[idxes] = priorities ** self._alpha
+    self._it_min[idxes] = priorities ** self._alpha
 
-      self._max_priority = max(self._max_priority, priority)
+    self._max_priority = max(self._max_priority, priorities.max())
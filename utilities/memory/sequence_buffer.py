@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+__author__ = 'cnheider'
+'''
+Description: Replay memory of fixed length transition sequences for recurrent models
+Author: Christian Heider Nielsen
+'''
+
+from collections import defaultdict
+
+import numpy as np
+
+from utilities.memory.array_buffer import ArrayTransitionBuffer, _as_array
+from utilities.memory.transition import TransitionSequence
+
+
+class SequenceReplayBuffer(ArrayTransitionBuffer):
+  '''
+Stores episodes as overlapping windows of `burn_in + sequence_length` transitions, together with the
+recurrent state the model had before the first transition of the window. A new window starts every
+`stride` transitions, windows cut short by the end of an episode are padded and masked.
+
+Sampled batches are time-major `TransitionSequence`s, `[T, B, ...]` for the per step fields and
+`[B, ...]` for `hidden_state`, so a learner can run one batched recurrent pass over the first `burn_in`
+steps to refresh the hidden state and train on the remaining `sequence_length` steps where `mask` is set.
+'''
+
+  _transition_type = TransitionSequence
+  _default_dtypes = {**ArrayTransitionBuffer._default_dtypes, 'mask':np.bool_}
+  _step_fields = TransitionSequence._fields[:5]
+
+  def __init__(self, capacity, sequence_length, burn_in=0, stride=None, **kwargs):
+    '''
+
+:param capacity: Max number of sequences to store
+:type capacity: int
+:param sequence_length: Number of trained on transitions in a sequence
+:type sequence_length: int
+:param burn_in: Number of transitions preceding the trained on part, only used to warm up the hidden state
+:type burn_in: int
+:param stride: Number of transitions between the starts of consecutive windows of an episode, defaults
+to half the sequence length
+:type stride: int
+:param kwargs: dtypes and codecs, see `ArrayTransitionBuffer`
+'''
+    super().__init__(capacity, **kwargs)
+    self._sequence_length = sequence_length
+    self._burn_in = burn_in
+    self._window = burn_in + sequence_length
+    self._stride = stride or max(sequence_length // 2, 1)
+    assert 0 < self._stride <= self._window
+
+    self._pending = defaultdict(list)  # env_id -> [(transition, hidden_state)]
+    self._unstored = defaultdict(int)  # env_id -> number of pending transitions not in a stored window
+    self._hidden_is_tuple = False
+
+  def add_transition(self, state, action, signal, successor_state, non_terminal, hidden_state=None,
+                     env_id=0):
+    '''
+
+:param hidden_state: Recurrent state of the model before it acted on `state`, an array, tensor or a
+tuple of them, eg. (h, c) of an LSTM
+:param env_id: Identifies the episode stream of parallel environments feeding the buffer
+'''
+    pending = self._pending[env_id]
+    pending.append(((state, action, signal, successor_state, non_terminal), hidden_state))
+    self._unstored[env_id] += 1
+
+    if not non_terminal:
+      self.flush(env_id)
+    elif len(pending) == self._window:
+      self._store(pending)
+      del pending[:self._stride]
+      self._unstored[env_id] = 0
+
+  def flush(self, env_id=None):
+    '''Stores the pending transitions of an ended or cut short episode as a padded window.'''
+    env_ids = list(self._pending) if env_id is None else [env_id]
+    for env_id in env_ids:
+      pending = self._pending.pop(env_id, [])
+      if self._unstored.pop(env_id, 0) and pending:
+        self._store(pending)
+
+  def get_transitions(self, indices):
+    batch = super().get_transitions(indices)
+    hidden_state = batch.hidden_state
+    if hidden_state.size == 0:
+      hidden_state = None
+    elif self._hidden_is_tuple:
+      hidden_state = tuple(np.moveaxis(hidden_state, 1, 0))
+
+    return batch._replace(**{field:np.ascontiguousarray(np.swapaxes(value, 0, 1))
+                             for field, value in zip(batch._fields, batch)
+                             if field != 'hidden_state'},
+                          hidden_state=hidden_state)
+
+  def clear(self):
+    super().clear()
+    self._pending.clear()
+    self._unstored.clear()
+
+  @property
+  def burn_in(self):
+    return self._burn_in
+
+  @property
+  def sequence_length(self):
+    return self._sequence_length
+
+  def _store(self, pending):
+    transitions = [[_as_array(value) for value in transition] for transition, _ in pending]
+    state = transitions[0][0]
+    padding = self._window - len(transitions)
+
+    steps = []
+    for i, field in enumerate(self._step_fields):
+      values = [transition[i] if transition[i] is not None else np.zeros_like(state)
+                for transition in transitions]
+      values = np.stack(values)
+      if padding:
+        values = np.concatenate([values, np.zeros((padding, *values.shape[1:]), dtype=values.dtype)])
+      steps.append(values)
+
+    mask = np.arange(self._window) < len(transitions)
+    self.add(TransitionSequence(*steps, mask, self._hidden_array(pending[0][1])))
+
+  def _hidden_array(self, hidden_state):
+    if hidden_state is None:
+      return np.zeros(0, dtype=np.float32)
+    if isinstance(hidden_state, (tuple, list)):
+      self._hidden_is_tuple = True
+      return np.stack([_as_array(component) for component in hidden_state])
+    return _as_array(hidden_state)
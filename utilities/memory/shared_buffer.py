@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+__author__ = 'cnheider'
+'''
+Description: Replay memory in shared memory, written by several actor processes and sampled by a learner
+Author: Christian Heider Nielsen
+'''
+
+import time
+
+import numpy as np
+import torch
+import torch.multiprocessing as MP
+
+from utilities.memory.array_buffer import ArrayTransitionBuffer, _as_array
+
+
+class SharedTransitionBuffer(ArrayTransitionBuffer):
+  '''
+An `ArrayTransitionBuffer` whose columns are `share_memory_()` tensors, allocated up front so the buffer
+can be handed to `torch.multiprocessing` processes and written and sampled from all of them without
+pickling transitions.
+
+Writers only hold a lock to reserve a serial number from the shared cursor and claim its slot, the write
+itself runs unlocked. Every slot has a stamp, the serial number of its last completed write, negated
+while a write is in progress. A writer claims its slot by swapping the stamp of a completed write for
+its own negated serial, when the buffer wraps onto a slot still being written by the previous lap it
+waits for that write to complete, so two writers never share a slot. Readers gather rows without locking
+and check the stamps before and after, sampled rows that were written to during the gather are redrawn
+and explicitly requested ones are gathered again.
+'''
+
+  def __init__(self, capacity, state_shape, action_shape=(), dtypes=None, codecs=None):
+    '''
+
+:param capacity: Max number of transitions to store
+:type capacity: int
+:param state_shape: Shape of states and successor states
+:type state_shape: tuple
+:param action_shape: Shape of actions, scalar actions are stored as int64 unless `dtypes` say otherwise
+:type action_shape: tuple
+:param dtypes: Optional mapping of field name to the numpy dtype of its column
+:type dtypes: dict
+:param codecs: Optional mapping of field name to the `StorageCodec` of its column
+:type codecs: dict
+'''
+    super().__init__(capacity, dtypes, codecs)
+    shapes = {'state':          tuple(state_shape),
+              'action':         tuple(action_shape),
+              'signal':         (),
+              'successor_state':tuple(state_shape),
+              'non_terminal':   ()}
+    default_dtypes = {'action':np.int64 if shapes['action'] == () else np.float32}
+
+    self._tensors = {}
+    for field in self._transition_type._fields:
+      dtype = np.dtype(self._dtypes.get(field, default_dtypes.get(field, np.float32)))
+      if field in self._codecs:
+        dtype = self._codecs[field].storage_dtype(dtype)
+      self._tensors[field] = _shared_zeros((capacity, *shapes[field]), dtype)
+
+    self._stamps = _shared_zeros((capacity,), np.int64)
+    self._cursor = _shared_zeros((1,), np.int64)  # Number of reserved writes
+    self._lock = MP.Lock()
+
+    self._columns = None
+    self._map_columns()
+
+  def add(self, transition):
+    '''Saves a transition, safe to call from several processes.'''
+    values = self._encode([_as_array(value) for value in transition])
+
+    while True:
+      with self._lock:  # Compare-and-swap of the stamp, a negative stamp is a write still in progress
+        serial = int(self._cursor_view[0])
+        index = serial % self._capacity
+        if self._stamp_view[index] >= 0:
+          self._stamp_view[index] = -(serial + 1)
+          self._cursor_view[0] = serial + 1
+          break
+      time.sleep(0)
+
+    self._write(index, values)
+    self._stamp_view[index] = serial + 1
+
+  def sample_indices(self, num):
+    return np.random.randint(0, len(self), size=num)
+
+  def sample_transitions(self, num):
+    '''Uniformly sample (with replacement) a batch of transitions, redrawing rows written meanwhile.'''
+    return self._decode(self._gather(self.sample_indices(num), redraw=True))
+
+  def _gather(self, indices, redraw=False):
+    indices = np.asarray(indices).copy()
+    if (self._stamp_view[indices] == 0).any():
+      raise IndexError('Gathering slots that were never written')
+
+    batch = None
+    rows = np.arange(len(indices))
+    while True:
+      stamps = self._stamp_view[indices[rows]]
+      gathered = super()._gather(indices[rows])
+      if batch is None:
+        batch = gathered
+      else:
+        for column, values in zip(batch, gathered):
+          column[rows] = values
+
+      rows = rows[(stamps < 0) | (stamps != self._stamp_view[indices[rows]])]
+      if not len(rows):
+        return batch
+      if redraw:
+        indices[rows] = self.sample_indices(len(rows))
+      else:
+        time.sleep(0)  # Let the writers complete before gathering their rows again
+
+  def export_columns(self, chunk_size=2 ** 20):
+    '''
+Yields the transitions written before the call in write order, oldest first, see `ArrayTransitionBuffer`.
+Actors may keep writing meanwhile, rows being written are gathered again once their writes complete.
+'''
+    cursor = int(self._cursor_view[0])
+    for start in range(cursor - min(cursor, self._capacity), cursor, chunk_size):
+      indices = np.arange(start, min(start + chunk_size, cursor)) % self._capacity
+      yield {field:_as_array(values)
+             for field, values in zip(self._transition_type._fields, self._gather(indices))}
+
+  def clear(self):
+    with self._lock:
+      self._cursor_view[0] = 0
+      self._stamp_view[:] = 0
+
+  @property
+  def tensors(self):
+    return self._tensors
+
+  def __len__(self):
+    return int(min(self._cursor_view[0], self._capacity))
+
+  def __getstate__(self):
+    state = self.__dict__.copy()
+    for key in ('_columns', '_stamp_view', '_cursor_view'):  # Views would be pickled as copies
+      del state[key]
+    return state
+
+  def __setstate__(self, state):
+    self.__dict__.update(state)
+    self._map_columns()
+
+  def _map_columns(self):
+    self._columns = {field:tensor.numpy() for field, tensor in self._tensors.items()}
+    self._stamp_view = self._stamps.numpy()
+    self._cursor_view = self._cursor.numpy()
+
+
+def _shared_zeros(shape, dtype):
+  return torch.from_numpy(np.zeros(shape, dtype=dtype)).share_memory_()
+
+
+def _actor(memory, actor_id, steps):
+  for step in range(steps):
+    state = np.full(4, actor_id, dtype=np.float32)
+    memory.add_transition(state, step % 2, float(actor_id), state, True)
+
+
+if __name__ == '__main__':
+  memory = SharedTransitionBuffer(10000, state_shape=(4,))
+
+  actors = [MP.Process(target=_actor, args=(memory, actor_id, 5000)) for actor_id in range(1, 4)]
+  for actor in actors:
+    actor.start()
+  for actor in actors:
+    actor.join()
+
+  batch = memory.sample_transitions(512)
+  assert (batch.state[:, 0] == batch.signal).all()
+  print(f'{len(memory)} transitions, signals sampled from actors {np.unique(batch.signal)}')
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+__author__ = 'cnheider'
+'''
+Description: Proportional prioritised replay memory kept entirely in tensors on one device
+Author: Christian Heider Nielsen
+'''
+
+import numpy as np
+import torch
+
+from utilities.memory.array_buffer import ArrayTransitionBuffer
+
+
+class TensorPrioritisedReplayBuffer(ArrayTransitionBuffer):
+  '''
+Proportional prioritised replay, Schaul et al. 2016, with transitions, priorities, sampling and importance
+sampling weights all living in tensors on `device`. Sampling is stratified over a cumulative sum of the
+priorities, so a batch is drawn, weighted and reprioritised without synchronising with the host.
+
+`sample_transitions` returns `(indices, batch, weights)`, feed the per sample errors of the batch back
+with `batch_update(indices, errors)`.
+'''
+
+  samples_weights = True  # Marks the prioritised interface, see `DQNAgent.update`
+
+  def __init__(self,
+               capacity,
+               alpha=0.6,
+               beta=0.4,
+               beta_increment=1e-4,
+               epsilon=1e-6,
+               device='cpu',
+               dtypes=None,
+               eviction=None):
+    '''
+
+:param capacity: Max number of transitions to store
+:type capacity: int
+:param alpha: How much prioritisation is used, 0 is uniform sampling
+:type alpha: float
+:param beta: Initial importance sampling correction, annealed towards 1 by `beta_increment` per sample
+:type beta: float
+:param epsilon: Added to errors so no transition has zero priority
+:type epsilon: float
+:param device: Device of the stored transitions and priorities
+:param dtypes: Optional mapping of field name to the numpy dtype of its column
+:type dtypes: dict
+:param eviction: Optional `EvictionPolicy`, see `ArrayTransitionBuffer`
+:type eviction: EvictionPolicy
+'''
+    super().__init__(capacity, dtypes, eviction=eviction)
+    self._alpha = alpha
+    self._beta = beta
+    self._beta_increment = beta_increment
+    self._epsilon = epsilon
+    self._device = torch.device(device)
+
+    self._priorities = torch.zeros(capacity, device=self._device)
+    self._max_priority = torch.ones((), device=self._device)
+
+  def add(self, transition):
+    index = super().add(transition)
+    if index is not None:
+      self._priorities[index] = self._max_priority
+    return index
+
+  def _sample_proportional(self, num):
+    priorities = self._priorities[:self._size]
+    cumulative = torch.cumsum(priorities, 0)
+    total = cumulative[-1]
+
+    segments = torch.arange(num, device=self._device, dtype=cumulative.dtype)
+    masses = (segments + torch.rand(num, device=self._device)) * (total / num)
+    indices = torch.searchsorted(cumulative, masses).clamp_(max=self._size - 1)
+    return indices, priorities[indices] / total
+
+  def sample_transitions(self, num):
+    indices, probabilities = self._sample_proportional(num)
+
+    weights = (self._size * probabilities) ** -self._beta
+    weights /= weights.max()
+    self._beta = min(1., self._beta + self._beta_increment)
+
+    return indices, self.get_transitions(indices), weights
+
+  def batch_update(self, indices, errors):
+    '''
+
+:param indices: Indices returned by `sample_transitions`
+:param errors: Tensor of per sample errors, eg. absolute TD errors
+'''
+    priorities = (errors.detach().abs().view(-1).to(self._priorities) + self._epsilon) ** self._alpha
+    self._priorities[indices] = priorities
+    self._max_priority = torch.max(self._max_priority, priorities.max())
+    self.update_priorities(indices, priorities)
+
+  def clear(self):
+    super().clear()
+    self._priorities.zero_()
+    self._max_priority.fill_(1.)
+
+  @property
+  def device(self):
+    return self._device
+
+  def _write(self, index, values):
+    for field, value in zip(self._transition_type._fields, values):
+      column = self._columns[field]
+      if value is None:
+        column[index] = 0
+      else:
+        column[index] = torch.from_numpy(np.asarray(value, dtype=_numpy_dtype(column.dtype)))
+
+  def _allocate_column(self, field, shape, dtype):
+    return torch.zeros((self._capacity, *shape), dtype=_torch_dtype(dtype), device=self._device)
+
+
+def _torch_dtype(dtype):
+  return torch.from_numpy(np.zeros(0, dtype=dtype)).dtype
+
+
+def _numpy_dtype(dtype):
+  return torch.zeros(0, dtype=dtype).numpy().dtype
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+__author__ = 'cnheider'
+'''
+Description: Replay memory regenerating observations of deterministic environments from seeds and actions
+Author: Christian Heider Nielsen
+'''
+
+import multiprocessing
+from collections import deque
+
+import numpy as np
+
+from utilities.memory.transition import Transition
+
+
+def reset_environment(environment, seed, reset_configuration=None):
+  '''Default reset of `TrajectoryStore` episodes, seeds and resets, then applies the configuration.'''
+  environment.seed(seed)
+  state = environment.reset()
+  if reset_configuration is not None:
+    state, _ = environment.configure(reset_configuration)
+  return state
+
+
+class TrajectoryStore(object):
+  '''
+Replay memory for deterministic environments trading memory for compute. Per episode only the seed, the
+reset configuration, the actions, signals and terminal flags are kept, plus an observation checkpoint
+every `checkpoint_interval` steps. Sampled observations are rematerialised by resetting an environment
+the same way and replaying the actions, one replay per sampled episode, on a pool of `num_workers`
+processes or in process. Required observations that were checkpointed are not replayed, the replay stops
+at the last one that was not, and with a `restore_function` it starts from the closest checkpoint before
+the first one instead of the reset. Checkpoints passed during a replay are compared to the regenerated
+observations, a mismatch raises as the environment is not deterministic.
+
+Reset the environment of every episode with `reset_episode`, or call `begin_episode` with the values it
+was reset with, before its first `add_transition`, the rest of the interface matches `TransitionBuffer`.
+The oldest finished episodes are dropped beyond `capacity`, the episode being recorded never is, so an
+episode longer than `capacity` is held whole until it ends.
+'''
+
+  def __init__(self,
+               environment_factory,
+               capacity=100000,
+               checkpoint_interval=50,
+               num_workers=0,
+               reset_function=reset_environment,
+               restore_function=None):
+    '''
+
+:param environment_factory: Callable constructing an environment, must be picklable with workers
+:param capacity: Max number of transitions to store, the oldest episodes are dropped beyond it
+:type capacity: int
+:param checkpoint_interval: Number of steps between stored observations
+:type checkpoint_interval: int
+:param num_workers: Number of regeneration processes, 0 regenerates in process
+:type num_workers: int
+:param reset_function: Callable (environment, seed, reset_configuration) -> initial observation
+:param restore_function: Optional callable (environment, observation) setting the environment to the state
+of a checkpointed observation, fully observed environments only
+'''
+    self._environment_factory = environment_factory
+    self._capacity = capacity
+    self._checkpoint_interval = checkpoint_interval
+    self._num_workers = num_workers
+    self._reset_function = reset_function
+    self._restore_function = restore_function
+
+    self._episodes = deque()
+    self._recording = None
+    self._size = 0
+    self._starts = None  # Cumulative episode lengths, rebuilt lazily
+
+    self._environment = None
+    self._pool = None
+
+  def begin_episode(self, seed, reset_configuration=None):
+    '''Opens a new episode, its environment must have been reset by `reset_function` with these values.'''
+    self._recording = _Episode(seed, reset_configuration)
+    self._episodes.append(self._recording)
+    self._starts = None
+    self._drop_oldest()
+
+  def reset_episode(self, environment, seed=None, reset_configuration=None):
+    '''
+Resets `environment` with `reset_function` and opens a new episode.
+
+:param environment: Environment to reset
+:param seed: Seed of the episode, drawn from numpy when None
+:type seed: int
+:param reset_configuration: Optional reset configuration passed on to `reset_function`
+:return: The initial observation
+'''
+    if seed is None:
+      seed = int(np.random.randint(2 ** 31 - 1))
+    state = self._reset_function(environment, seed, reset_configuration)
+    self.begin_episode(seed, reset_configuration)
+    return state
+
+  def add_transition(self, state, action, signal, successor_state, non_terminal):
+    episode = self._recording
+    if episode is None:
+      raise ValueError('begin_episode must be called before the first transition of an episode')
+
+    step = len(episode.actions)
+    if step % self._checkpoint_interval == 0:
+      episode.checkpoints[step] = np.array(state)
+
+    episode.actions.append(action)
+    episode.signals.append(signal)
+    episode.non_terminals.append(non_terminal)
+    self._size += 1
+    self._starts = None
+
+    if not non_terminal:
+      self._recording = None
+
+    self._drop_oldest()
+
+  def sample_transitions(self, num):
+    if self._starts is None:
+      self._starts = np.cumsum([0] + [len(episode.actions) for episode in self._episodes])
+
+    samples = np.random.randint(0, self._size, size=num)
+    episode_ids = np.searchsorted(self._starts, samples, side='right') - 1
+    steps = samples - self._starts[episode_ids]
+
+    tasks = {}
+    for episode_id, step in zip(episode_ids.tolist(), steps.tolist()):
+      episode = self._episodes[episode_id]
+      task = tasks.setdefault(episode_id, (episode, set()))
+      task[1].add(step)
+      if episode.non_terminals[step]:
+        task[1].add(step + 1)
+
+    observations = dict(zip(tasks, self._regenerate([(episode, sorted(required))
+                                                     for episode, required in tasks.values()])))
+
+    transitions = []
+    for episode_id, step in zip(episode_ids.tolist(), steps.tolist()):
+      episode, episode_observations = self._episodes[episode_id], observations[episode_id]
+      non_terminal = episode.non_terminals[step]
+      transitions.append(Transition(episode_observations[step],
+                                    episode.actions[step],
+                                    episode.signals[step],
+                                    episode_observations[step + 1] if non_terminal else None,
+                                    non_terminal))
+
+    return Transition(*zip(*transitions))
+
+  def clear(self):
+    self._episodes.clear()
+    self._recording = None
+    self._size = 0
+    self._starts = None
+
+  def close(self):
+    if self._pool is not None:
+      self._pool.terminate()
+      self._pool = None
+    if self._environment is not None:
+      self._environment.close()
+      self._environment = None
+
+  @property
+  def nbytes(self):
+    '''Approximate bytes held by the checkpoints.'''
+    return sum(checkpoint.nbytes for episode in self._episodes for checkpoint in episode.checkpoints.values())
+
+  def __len__(self):
+    return self._size
+
+  def __getstate__(self):
+    state = self.__dict__.copy()
+    state['_environment'], state['_pool'] = None, None
+    return state
+
+  def _drop_oldest(self):
+    while self._size > self._capacity and self._episodes[0] is not self._recording:
+      self._size -= len(self._episodes.popleft().actions)
+      self._starts = None
+
+  def _regenerate(self, tasks):
+    tasks = [(episode.seed,
+              episode.reset_configuration,
+              episode.actions[:required[-1]],
+              required,
+              episode.checkpoints) for episode, required in tasks]
+
+    if self._num_workers:
+      if self._pool is None:
+        self._pool = multiprocessing.Pool(self._num_workers,
+                                          initializer=_initialise_worker,
+                                          initargs=(self._environment_factory,
+                                                    self._reset_function,
+                                                    self._restore_function))
+      return self._pool.map(_replay_worker, tasks)
+
+    if self._environment is None:
+      self._environment = self._environment_factory()
+    return [_replay(self._environment, self._reset_function, self._restore_function, *task) for task in tasks]
+
+
+class _Episode(object):
+  __slots__ = ('seed', 'reset_configuration', 'actions', 'signals', 'non_terminals', 'checkpoints')
+
+  def __init__(self, seed, reset_configuration):
+    self.seed = seed
+    self.reset_configuration = reset_configuration
+    self.actions = []
+    self.signals = []
+    self.non_terminals = []
+    self.checkpoints = {}  # Step -> observation before the action of the step
+
+
+def _replay(environment,
+            reset_function,
+            restore_function,
+            seed,
+            reset_configuration,
+            actions,
+            required,
+            checkpoints):
+  '''Returns the observations of the steps in `required`, step `len(actions)` being the last.'''
+  observations = {step:checkpoints[step] for step in required if step in checkpoints}
+  missing = {step for step in required if step not in checkpoints}
+  if not missing:
+    return observations
+
+  state = reset_function(environment, seed, reset_configuration)
+  start, stop = 0, max(missing)
+  if restore_function is not None:
+    start = max((step for step in checkpoints if step < min(missing)), default=0)
+    if start:
+      state = checkpoints[start]
+      restore_function(environment, state)
+
+  for step in range(start, stop + 1):
+    if step in checkpoints and not np.allclose(checkpoints[step], state):
+      raise ValueError(f'Regenerated observation of step {step} differs from its checkpoint, '
+                       f'the environment is not deterministic')
+    if step in missing:
+      observations[step] = np.array(state)
+    if step < stop:
+      state, *_ = environment.step(actions[step])
+
+  return observations
+
+
+_worker_environment = None
+_worker_reset_function = None
+_worker_restore_function = None
+
+
+def _initialise_worker(environment_factory, reset_function, restore_function):
+  global _worker_environment, _worker_reset_function, _worker_restore_function
+  _worker_environment = environment_factory()
+  _worker_reset_function = reset_function
+  _worker_restore_function = restore_function
+
+
+def _replay_worker(task):
+  return _replay(_worker_environment, _worker_reset_function, _worker_restore_function, *task)
@@ -22,6 +22,29 @@ Transition = namedtuple(
       )
     )
 
+NStepTransition = namedtuple(
+    'NStepTransition', (
+      'state',
+      'action',
+      'signal',
+      'successor_state',
+      'non_terminal',
+      'discount'
+      )
+    )
+
+TransitionSequence = namedtuple(
+    'TransitionSequence', (
+      'state',
+      'action',
+      'signal',
+      'successor_state',
+      'non_terminal',
+      'mask',
+      'hidden_state'
+      )
+    )
+
 ValuedTransition = namedtuple(
     'ValuedTransition', (
       'state',
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+__author__ = 'cnheider'
+'''
+Description: Chunked columnar export and import of replay memories for offline reuse
+Author: Christian Heider Nielsen
+'''
+
+import json
+import pickle
+from pathlib import Path
+
+import numpy as np
+
+from utilities.memory import transition as transition_types
+
+_manifest_name = 'manifest.json'
+_codecs_name = 'codecs.pkl'
+
+
+def save_experience(memory, directory, chunk_size=2 ** 20):
+  '''
+Writes the transitions of a replay memory to `directory` as one `.npy` file per field and chunk of
+`chunk_size` rows, plus a manifest. Memories with `export_columns`, the `ArrayTransitionBuffer` family,
+are written in their storage dtypes together with their codecs, and a `DeduplicatedTransitionBuffer` with
+the visit counts of its transitions. Anything else is expected to be a batch namedtuple of sequences, eg.
+`TransitionBuffer.sample_transitions(None)`, where missing (terminal) successors are written as zeros.
+
+:param memory: Replay memory or batch of transitions
+:param directory: Directory to write to, created if missing
+:param chunk_size: Max number of rows per chunk file
+:return: Number of transitions written
+'''
+  directory = Path(directory)
+  directory.mkdir(parents=True, exist_ok=True)
+
+  codecs = {}
+  if hasattr(memory, 'export_columns'):
+    transition_type = memory.transition_type
+    chunks = memory.export_columns(chunk_size)
+    codecs = memory.codecs
+  else:
+    transition_type = type(memory)
+    chunks = _batch_chunks(memory, chunk_size)
+
+  manifest = {'transition_type':transition_type.__name__,
+              'fields':         list(transition_type._fields),
+              'chunks':         []}
+  size = 0
+  for chunk_id, chunk in enumerate(chunks):
+    files = {}
+    for field, values in chunk.items():
+      files[field] = f'{field}.{chunk_id:05d}.npy'
+      np.save(directory / files[field], np.ascontiguousarray(values))
+    rows = len(next(iter(chunk.values())))
+    manifest['chunks'].append({'rows':rows, 'files':files})
+    size += rows
+
+  manifest['size'] = size
+  with open(directory / _manifest_name, 'w') as f:
+    json.dump(manifest, f)
+
+  if codecs:
+    with open(directory / _codecs_name, 'wb') as f:
+      pickle.dump(codecs, f)
+
+  return size
+
+
+def save_agent_experience(agent, config):
+  '''Saves the replay memory of `agent` to the EXPERIENCE_DIRECTORY of `config`, if set.'''
+  directory = getattr(config, 'EXPERIENCE_DIRECTORY', None)
+  memory = getattr(agent, '_memory', None)
+  if directory is not None and hasattr(memory, 'export_columns'):
+    save_experience(memory, directory)
+
+
+def load_experience(directory, memory=None, mmap=True, chunk_size=2 ** 16):
+  '''
+Opens experience written by `save_experience`. Without `memory` an `ExperienceDataset` over the chunk
+files is returned, memory mapped by default so opening is independent of the number of transitions.
+With `memory` the transitions are poured into it, through `extend` where available, and it is returned.
+Visit counts of deduplicated experience are restored into memories keeping counts, and otherwise dropped.
+
+:param directory: Directory written by `save_experience`
+:param memory: Optional replay memory to warm-start
+:param mmap: Memory map the chunk files instead of reading them
+:param chunk_size: Number of transitions per `extend` when filling a memory
+'''
+  dataset = ExperienceDataset(directory, mmap=mmap)
+  if memory is None:
+    return dataset
+
+  start = 0
+  for batch in dataset.batches(chunk_size):
+    rows = len(batch[0])
+    if dataset.counted and hasattr(memory, 'counts'):
+      memory.extend(batch, counts=dataset.counts(np.arange(start, start + rows)))
+    elif hasattr(memory, 'extend'):
+      memory.extend(batch)
+    else:
+      for transition in zip(*batch):
+        memory.add_transition(*transition)
+    start += rows
+  return memory
+
+
+class ExperienceDataset(object):
+  '''
+Read only replay memory over experience written by `save_experience`, usable in place of a replay memory
+for offline training. Sampled rows are gathered chunk by chunk and decoded by the codecs of the exported
+memory. Rows of a deduplicated memory are sampled proportionally to their visit counts.
+'''
+
+  def __init__(self, directory, mmap=True):
+    self._directory = Path(directory)
+    with open(self._directory / _manifest_name) as f:
+      manifest = json.load(f)
+
+    self._transition_type = getattr(transition_types, manifest['transition_type'])
+    mmap_mode = 'r' if mmap else None
+    self._chunks = [{field:np.load(self._directory / file, mmap_mode=mmap_mode)
+                     for field, file in chunk['files'].items()}
+                    for chunk in manifest['chunks']]
+    self._starts = np.cumsum([0] + [chunk['rows'] for chunk in manifest['chunks']])
+    self._size = manifest['size']
+
+    self._counts = None
+    if manifest['chunks'] and 'count' in manifest['chunks'][0]['files']:
+      self._counts = np.concatenate([chunk['count'] for chunk in self._chunks])
+      self._count_sums = np.cumsum(self._counts)
+
+    self._codecs = {}
+    if (self._directory / _codecs_name).exists():
+      with open(self._directory / _codecs_name, 'rb') as f:
+        self._codecs = pickle.load(f)
+
+  def sample_transitions(self, num):
+    if self._counts is None:
+      return self.get_transitions(np.random.randint(0, self._size, size=num))
+
+    indices = np.searchsorted(self._count_sums, np.random.random_sample(num) * self._count_sums[-1], 'right')
+    return self.get_transitions(np.minimum(indices, self._size - 1))
+
+  def counts(self, indices=None):
+    '''Visit counts of the rows, or of `indices`, ones unless exported by a deduplicated memory.'''
+    if indices is None:
+      indices = np.arange(self._size)
+    if self._counts is None:
+      return np.ones(len(indices))
+    return self._counts[indices]
+
+  def get_transitions(self, indices):
+    indices = np.asarray(indices)
+    chunk_ids = np.searchsorted(self._starts, indices, side='right') - 1
+    rows = indices - self._starts[chunk_ids]
+
+    batch = []
+    for field in self._transition_type._fields:
+      example = self._chunks[0][field]
+      values = np.empty((len(indices), *example.shape[1:]), dtype=example.dtype)
+      for chunk_id in np.unique(chunk_ids):
+        selected = chunk_ids == chunk_id
+        chunk_rows = rows[selected]
+        order = np.argsort(chunk_rows)  # Read the files front to back
+        values[np.flatnonzero(selected)[order]] = self._chunks[chunk_id][field][chunk_rows[order]]
+      if field in self._codecs:
+        values = self._codecs[field].decode(values)
+      batch.append(values)
+
+    return self._transition_type(*batch)
+
+  def batches(self, batch_size):
+    '''Yields every transition in order, as decoded batches of at most `batch_size` transitions.'''
+    for start in range(0, self._size, batch_size):
+      yield self.get_transitions(np.arange(start, min(start + batch_size, self._size)))
+
+  @property
+  def chunks(self):
+    return self._chunks
+
+  @property
+  def counted(self):
+    return self._counts is not None
+
+  def __len__(self):
+    return self._size
+
+
+def _batch_chunks(batch, chunk_size):
+  fields = list(batch)
+  size = len(fields[0])
+  for start in range(0, size, chunk_size):
+    yield {field:_stack(values[start:start + chunk_size]) for field, values in zip(batch._fields, fields)}
+
+
+def _stack(values):
+  example = next((np.asarray(value) for value in values if value is not None), None)
+  if example is None:
+    return np.zeros(len(values), dtype=np.float32)
+  return np.stack([np.zeros_like(example) if value is None else np.asarray(value) for value in values])
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 from utilities.sampling.bounded_triangle_sample import bounded_triangle_sample
+from utilities.sampling.gumbel_max_sample import gumbel_max_sample
 
 __author__ = 'cnheider'
 
@@ -0,0 +1,17 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+__author__ = 'cnheider'
+import torch
+
+
+def gumbel_max_sample(logits):
+  '''
+Samples one category per row of `logits` (unnormalised log probabilities) with the Gumbel-max trick,
+the argmax of the logits perturbed by Gumbel noise, without constructing a distribution object.
+
+:param logits: [batch, categories]
+:return: [batch] int64 sampled categories
+'''
+  gumbel_noise = torch.empty_like(logits).exponential_().log_()  # -log(Exp(1)) is Gumbel distributed
+  return (logits - gumbel_noise).argmax(-1)
@@ -4,3 +4,4 @@
 __author__ = 'cnheider'
 from .copying import *
 from .soft_update import *
+from .gradient_clamping import *
@@ -4,13 +4,33 @@
 __author__ = 'cnheider'
 import torch
 
+from .soft_update import _flat_parameters
+
 
 def copy_parameters(target: torch.nn.Module, source: torch.nn.Module) -> torch.nn.Module:
-  for target_param, param in zip(target.parameters(), source.parameters()):
-    target_param.data.copy_(param.data)
+  target_flat, source_flat = _flat_parameters(target), _flat_parameters(source)
+  with torch.no_grad():
+    if target_flat is not None and source_flat is not None and target_flat.shape == source_flat.shape:
+      target_flat.copy_(source_flat)
+    else:
+      torch._foreach_copy_([param.data for param in target.parameters()],
+                           [param.data for param in source.parameters()])
   return target
 
 
 def copy_state(target: torch.nn.Module, source: torch.nn.Module) -> torch.nn.Module:
-  target.load_state_dict(source.state_dict())
+  '''
+Copies parameters and buffers, eg. batch norm statistics, of `source` into `target`. Flattened models,
+see `Architecture.flatten_parameters`, copy their parameters with one copy over the flat buffers.
+'''
+  target_flat, source_flat = _flat_parameters(target), _flat_parameters(source)
+  if target_flat is None or source_flat is None or target_flat.shape != source_flat.shape:
+    target.load_state_dict(source.state_dict())
+    return target
+
+  with torch.no_grad():
+    target_flat.copy_(source_flat)
+    target_buffers, source_buffers = list(target.buffers()), list(source.buffers())
+    if target_buffers:
+      torch._foreach_copy_(target_buffers, source_buffers)
   return target
@@ -0,0 +1,22 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+__author__ = 'cnheider'
+import torch
+
+
+def clamp_gradients(model: torch.nn.Module, low: float = -1, high: float = 1) -> torch.nn.Module:
+  '''
+Clamps every gradient of `model` to [low, high] in place, with one clamp over the flat gradient buffer
+when the model is flattened, see `Architecture.flatten_parameters`, otherwise with fused foreach clamps.
+'''
+  flat_gradients = getattr(model, 'flat_gradients', None)
+  if flat_gradients is not None:
+    flat_gradients.clamp_(low, high)
+    return model
+
+  gradients = [param.grad for param in model.parameters() if param.grad is not None]
+  if gradients:
+    torch._foreach_clamp_min_(gradients, low)
+    torch._foreach_clamp_max_(gradients, high)
+  return model
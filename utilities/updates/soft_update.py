@@ -6,10 +6,23 @@ import torch
 
 
 def soft_update(target: torch.nn.Module, source: torch.nn.Module, tau: float) -> torch.nn.Module:
+  '''
+Polyak averages the parameters of `source` into `target`, target = (1 - tau) * target + tau * source.
+One lerp over the flat parameter buffers when both models are flattened, see
+`Architecture.flatten_parameters`, otherwise one fused foreach lerp over the parameter lists.
+'''
   assert 0 <= tau <= 1
-  for target_param, param in zip(target.parameters(), source.parameters()):
-    target_param.data.copy_(
-        target_param.data * (1.0 - tau) + param.data * tau
-        )
+  target_flat, source_flat = _flat_parameters(target), _flat_parameters(source)
+  with torch.no_grad():
+    if target_flat is not None and source_flat is not None and target_flat.shape == source_flat.shape:
+      target_flat.lerp_(source_flat, tau)
+    else:
+      torch._foreach_lerp_([param.data for param in target.parameters()],
+                           [param.data for param in source.parameters()],
+                           tau)
 
   return target
+
+
+def _flat_parameters(model):
+  return getattr(model, 'flat_parameters', None)